@@ -0,0 +1,63 @@
+"""
+Measures the import time of tts_arranger for different workflows.
+
+The reader-only / JSON export path should stay cheap, as heavy backends (TTS, piper, scipy, ffmpeg, PIL) are only loaded on first use.
+
+Usage: python benchmarks/import_time_benchmark.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ['TTS', 'torch', 'piper', 'onnxruntime', 'scipy', 'ffmpeg', 'PIL']
+
+WORKFLOWS = {
+    'reader': 'from tts_arranger import TTS_EPUB_Reader, TTS_HTML_Reader, save_tts_project_to_json',
+    'processor': 'from tts_arranger import TTS_Processor',
+    'writer': 'from tts_arranger import TTS_Writer, TTS_Simple_Writer',
+    'json_processor': 'from tts_arranger import JSON_Processor',
+}
+
+SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+{statement}
+duration = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(duration)
+print(','.join(heavy))
+'''
+
+
+def run_workflow(statement: str) -> tuple[float, list[str]]:
+    env = dict(os.environ)
+    src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+    env['PYTHONPATH'] = os.pathsep.join([src_dir, env.get('PYTHONPATH', '')])
+
+    output = subprocess.run([sys.executable, '-c', SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)], env=env, capture_output=True, text=True)
+
+    if output.returncode != 0:
+        raise RuntimeError(output.stderr.strip().splitlines()[-1])
+
+    duration, heavy = (output.stdout.splitlines() + [''])[:2]
+    return float(duration), [module for module in heavy.split(',') if module]
+
+
+def main(runs: int = 5) -> None:
+    for name, statement in WORKFLOWS.items():
+        try:
+            durations: list[float] = []
+            heavy: list[str] = []
+
+            for _ in range(runs):
+                duration, heavy = run_workflow(statement)
+                durations.append(duration)
+
+            print(f'{name:<16} median {statistics.median(durations) * 1000:8.1f}ms  heavy modules loaded: {", ".join(heavy) or "none"}')
+        except RuntimeError as e:
+            print(f'{name:<16} failed: {e}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
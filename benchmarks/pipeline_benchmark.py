@@ -0,0 +1,85 @@
+"""
+Benchmarks the complete pipeline (parsing, preprocessing, buffering, encoding and muxing) using the fake synthesis backend, so no models are needed.
+
+Usage: python benchmarks/pipeline_benchmark.py [--input book.epub|page.html] [--chapters 20] [--latency-per-char 0.0005] [--profile stats.prof]
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import tempfile
+import time
+
+from tts_arranger import (Backend, TTS_Chapter, TTS_EPUB_Reader,
+                          TTS_HTML_Reader, TTS_Item, TTS_Project, TTS_Writer)
+
+PARAGRAPH = 'It was a bright cold day in April, and the clocks were striking thirteen. Winston Smith, his chin nuzzled into his breast in an effort to escape the vile wind, slipped quickly through the glass doors (of Victory Mansions), though not quickly enough to prevent a swirl of gritty dust from entering along with him. '
+
+
+def synthetic_project(chapters: int, paragraphs: int) -> TTS_Project:
+    tts_chapters: list[TTS_Chapter] = []
+
+    for c in range(chapters):
+        items: list[TTS_Item] = [TTS_Item(f'Chapter {c + 1}', 1), TTS_Item(length=1000)]
+
+        for p in range(paragraphs):
+            items.append(TTS_Item(PARAGRAPH, p % 2))
+            items.append(TTS_Item(length=500))
+
+        tts_chapters.append(TTS_Chapter(items, f'Chapter {c + 1}'))
+
+    return TTS_Project(tts_chapters, 'Pipeline Benchmark', author='TTS Arranger')
+
+
+def load_project(filename: str) -> TTS_Project:
+    reader = TTS_EPUB_Reader() if filename.endswith('.epub') else TTS_HTML_Reader()
+    reader.load(filename)
+    return reader.get_project()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', help='EPUB or HTML file to use instead of a synthetic project')
+    parser.add_argument('--chapters', type=int, default=20)
+    parser.add_argument('--paragraphs', type=int, default=30)
+    parser.add_argument('--latency-per-char', type=float, default=0.0, help='Simulated inference time per character in seconds')
+    parser.add_argument('--output-format', default='m4b')
+    parser.add_argument('--profile', help='Write cProfile statistics to this file')
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+
+    if profiler:
+        profiler.enable()
+
+    start = time.perf_counter()
+
+    project = load_project(args.input) if args.input else synthetic_project(args.chapters, args.paragraphs)
+
+    parsed = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        writer = TTS_Writer(project, temp_dir, args.output_format, backend=Backend.FAKE, backend_options={'latency_per_char': args.latency_per_char})
+        writer.synthesize_and_write('benchmark', optimize=True)
+
+        output_size = sum(os.path.getsize(os.path.join(path, f)) for path, _, files in os.walk(temp_dir) for f in files)
+
+    finished = time.perf_counter()
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+    characters = sum(len(item.text) for chapter in project.tts_chapters for item in chapter.tts_items)
+
+    print(f'Chapters:   {len(project.tts_chapters)}')
+    print(f'Characters: {characters}')
+    print(f'Parsing:    {parsed - start:.2f}s')
+    print(f'Writing:    {finished - parsed:.2f}s')
+    print(f'Total:      {finished - start:.2f}s ({characters / (finished - start):.0f} characters/s)')
+    print(f'Output:     {output_size / 1024 / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Compares a Piper voice with its int8 quantized variant: real-time factor (synthesis time / audio duration, lower is faster) and the difference of the generated audio.
+
+Noise is disabled for both models, so the remaining difference is caused by the quantization only. The audio difference is the mean absolute difference of the log-magnitude spectrograms in dB, plus the difference in duration.
+
+Usage: python benchmarks/quantized_voice_benchmark.py voice.onnx [--runs 3] [--threads 0]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from tts_arranger.piper_loader import load_piper_voice
+from tts_arranger.utils.threads import ThreadBudget
+
+SENTENCES = [
+    'It was a bright cold day in April, and the clocks were striking thirteen.',
+    'Winston Smith, his chin nuzzled into his breast in an effort to escape the vile wind, slipped quickly through the glass doors of Victory Mansions.',
+    'The hallway smelt of boiled cabbage and old rag mats.',
+    'Outside, even through the shut window-pane, the world looked cold.',
+]
+
+FFT_SIZE = 1024
+HOP_SIZE = 256
+
+
+def synthesize(voice, text: str) -> np.ndarray:
+    audio = b''.join(voice.synthesize_stream_raw(text, noise_scale=0.0, noise_w=0.0))
+    return np.frombuffer(audio, dtype=np.int16).astype(np.float32) / np.iinfo(np.int16).max
+
+
+def log_spectrogram(audio: np.ndarray) -> np.ndarray:
+    if len(audio) < FFT_SIZE:
+        audio = np.pad(audio, (0, FFT_SIZE - len(audio)))
+
+    window = np.hanning(FFT_SIZE).astype(np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(audio, FFT_SIZE)[::HOP_SIZE] * window
+
+    return 20 * np.log10(np.abs(np.fft.rfft(frames, axis=-1)) + 1e-5)
+
+
+def spectral_difference(reference: np.ndarray, audio: np.ndarray) -> float:
+    reference_spectrogram = log_spectrogram(reference)
+    spectrogram = log_spectrogram(audio)
+
+    frames = min(len(reference_spectrogram), len(spectrogram))
+
+    return float(np.mean(np.abs(reference_spectrogram[:frames] - spectrogram[:frames])))
+
+
+def measure(voice, sample_rate: int, runs: int) -> tuple[float, list[np.ndarray]]:
+    # Warm up, the first inference includes allocations
+    synthesize(voice, SENTENCES[0])
+
+    outputs: list[np.ndarray] = []
+    duration = 0.0
+    start = time.perf_counter()
+
+    for _ in range(runs):
+        outputs = [synthesize(voice, sentence) for sentence in SENTENCES]
+        duration += sum(len(output) for output in outputs) / sample_rate
+
+    return (time.perf_counter() - start) / duration, outputs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', help='ONNX model file of the voice, the config is expected next to it')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=0, help='Intra-op threads, 0 for the onnxruntime default')
+    args = parser.parse_args()
+
+    thread_budget = ThreadBudget(intra_op=args.threads)
+
+    float_voice = load_piper_voice(args.model, thread_budget=thread_budget)
+    quantized_voice = load_piper_voice(args.model, thread_budget=thread_budget, quantized=True)
+    sample_rate = float_voice.config.sample_rate
+
+    float_rtf, float_outputs = measure(float_voice, sample_rate, args.runs)
+    quantized_rtf, quantized_outputs = measure(quantized_voice, sample_rate, args.runs)
+
+    differences = [spectral_difference(reference, output) for reference, output in zip(float_outputs, quantized_outputs)]
+    float_duration = sum(len(output) for output in float_outputs) / sample_rate
+    quantized_duration = sum(len(output) for output in quantized_outputs) / sample_rate
+
+    print(f'RTF float:           {float_rtf:.3f}')
+    print(f'RTF int8:            {quantized_rtf:.3f} ({float_rtf / quantized_rtf:.2f}x)')
+    print(f'Spectral difference: {np.mean(differences):.2f} dB (max {np.max(differences):.2f} dB)')
+    print(f'Duration:            {float_duration:.2f}s float, {quantized_duration:.2f}s int8')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,36 @@
-from .tts_processor import *
-from .tts_writer import *
-from .tts_simple_writer import *
+import importlib
+
+from .items.tts_chapter import TTS_Chapter
+from .items.tts_item import TTS_Item
+from .items.tts_project import TTS_Project
+from .preview import Preview
+from .json_export import *
 from .tts_reader import *
 from .tts_html_converter import *
-from .json_processor import *
\ No newline at end of file
+
+# Names from modules pulling in heavy dependencies (TTS, piper, scipy, ffmpeg, PIL), these are only imported on first access
+_LAZY_ATTRIBUTES = {
+    'Backend': '.tts_processor',
+    'SynthesisError': '.tts_processor',
+    'TTS_Processor': '.tts_processor',
+    'TTS_Synthesis_Worker': '.tts_synthesis_worker',
+    'WorkerLimits': '.tts_synthesis_worker',
+    'TTS_Writer': '.tts_writer',
+    'TTS_Simple_Writer': '.tts_simple_writer',
+    'JSON_Processor': '.json_processor',
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+
+        # Cache on the package so this hook is only hit once per name
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+from .items.tts_chapter import TTS_Chapter
+
+
+def chapter_hash(chapter: TTS_Chapter, settings: dict) -> str:
+    """
+    Get a hash identifying the synthesized audio of a chapter, based on its items and all settings affecting synthesis (voice, preprocessing etc.).
+
+    :param chapter: The chapter (before optimizing and preprocessing).
+    :type chapter: TTS_Chapter
+
+    :param settings: Settings affecting the synthesized audio, must be JSON serializable.
+    :type settings: dict
+
+    :return: The hash as hex string.
+    :rtype: str
+    """
+    content = {
+        'settings': settings,
+        'items': [[tts_item.text, tts_item.speaker_idx, tts_item.length] for tts_item in chapter.tts_items],
+    }
+
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class Chapter_Manifest:
+    """
+    Manifest of completed chapters in a work directory, keyed by chapter hash (see chapter_hash()). Allows resuming an interrupted synthesis, as chapters already in the manifest don't need to be synthesized again.
+    """
+
+    VERSION = 1
+
+    def __init__(self, work_dir: str) -> None:
+        """
+        Loads the manifest of the given work directory, if it exists.
+
+        :param work_dir: The work directory.
+        :type work_dir: str
+
+        :return: None
+        """
+        self.work_dir = work_dir
+        self.filename = os.path.join(work_dir, 'manifest.json')
+        self.chapters: dict[str, dict] = {}
+
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as manifest_file:
+                    manifest = json.load(manifest_file)
+
+                if manifest.get('version') == self.VERSION:
+                    self.chapters = manifest.get('chapters', {})
+            except (OSError, ValueError):
+                # Corrupt manifest, start over
+                self.chapters = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Get a completed chapter.
+
+        :param key: The chapter hash.
+        :type key: str
+
+        :return: The chapter entry (with "file" relative to the work directory and "duration" in nanoseconds), or None if the chapter is not completed or its file is missing.
+        :rtype: Optional[dict]
+        """
+        entry = self.chapters.get(key)
+
+        if entry and os.path.exists(self.path(entry['file'])):
+            return entry
+        return None
+
+    def path(self, filename: str) -> str:
+        """
+        Get the absolute path of a file in the work directory.
+
+        :param filename: Filename relative to the work directory.
+        :type filename: str
+
+        :return: The absolute path.
+        :rtype: str
+        """
+        return os.path.join(self.work_dir, filename)
+
+    def add(self, key: str, filename: str, duration: int) -> None:
+        """
+        Mark a chapter as completed and save the manifest right away.
+
+        :param key: The chapter hash.
+        :type key: str
+
+        :param filename: The chapter's audio file, relative to the work directory.
+        :type filename: str
+
+        :param duration: Duration of the chapter's audio in nanoseconds.
+        :type duration: int
+
+        :return: None
+        """
+        self.chapters[key] = {'file': filename, 'duration': duration}
+        self.save()
+
+    def save(self) -> None:
+        """
+        Save the manifest, replacing the previous one atomically so an interruption never leaves a corrupt manifest.
+
+        :return: None
+        """
+        temp_filename = f'{self.filename}.tmp'
+
+        with open(temp_filename, 'w', encoding='utf-8') as manifest_file:
+            json.dump({'version': self.VERSION, 'chapters': self.chapters}, manifest_file, indent=2)
+
+        os.replace(temp_filename, self.filename)
@@ -0,0 +1,295 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .utils.log import LOG_TYPE, log
+
+# Used for voices without recorded timings, roughly the pace of natural speech and real-time synthesis
+DEFAULT_SECONDS_PER_CHAR = 0.06
+DEFAULT_RTF = 1.0
+
+# Weight of previously recorded timings when recording a new run, so recent runs (hardware, settings) dominate
+TIMINGS_DECAY = 0.5
+
+# Typical bitrates of the encoded output in bits per second, uncompressed 16 bit mono otherwise
+OUTPUT_BITRATES = {
+    'm4b': 128000,
+    'm4a': 128000,
+    'mp3': 128000,
+    'opus': 96000,
+    'ogg': 96000,
+    'flac': 200000,
+}
+
+
+def default_timings_filename() -> str:
+    """
+    Get the default location of the recorded timings, in the user's cache directory.
+
+    :return: The filename.
+    :rtype: str
+    """
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'tts_arranger', 'timings.json')
+
+
+class Timing_Store:
+    """
+    Synthesis timings recorded per voice by previous runs, used for calibrating estimates (see Project_Estimate).
+    Voices are identified by a key like "piper:en_US-lessac-medium", the quantized variant of a voice is recorded separately.
+    """
+
+    def __init__(self, filename: Optional[str] = None) -> None:
+        """
+        :param filename: JSON file of the recorded timings, defaults to "timings.json" in the user's cache directory. The file is read on first use.
+        :type filename: Optional[str]
+
+        :return: None
+        """
+        self.filename = filename or default_timings_filename()
+        self._voices: Optional[dict[str, dict]] = None
+
+    @property
+    def voices(self) -> dict[str, dict]:
+        """
+        The recorded timings of all voices, keyed by voice with the accumulated "chars", "audio_seconds" and "wall_seconds".
+
+        :rtype: dict[str, dict]
+        """
+        if self._voices is None:
+            self._voices = {}
+
+            if os.path.exists(self.filename):
+                try:
+                    with open(self.filename, 'r', encoding='utf-8') as timings_file:
+                        self._voices = json.load(timings_file).get('voices', {})
+                except (OSError, ValueError):
+                    log(LOG_TYPE.WARNING, f'Ignoring invalid timings file "{self.filename}".')
+
+        return self._voices
+
+    def record(self, voice: str, chars: int, audio_seconds: float, wall_seconds: float) -> None:
+        """
+        Record the timings of synthesizing with a voice and save them right away. Previous timings of the voice are weighted down.
+
+        :param voice: The voice key.
+        :type voice: str
+
+        :param chars: Number of synthesized characters.
+        :type chars: int
+
+        :param audio_seconds: Duration of the synthesized audio in seconds.
+        :type audio_seconds: float
+
+        :param wall_seconds: Time spent synthesizing in seconds.
+        :type wall_seconds: float
+
+        :return: None
+        """
+        if chars <= 0 or audio_seconds <= 0:
+            return
+
+        previous = self.voices.get(voice, {})
+
+        self.voices[voice] = {
+            'chars': previous.get('chars', 0) * TIMINGS_DECAY + chars,
+            'audio_seconds': previous.get('audio_seconds', 0) * TIMINGS_DECAY + audio_seconds,
+            'wall_seconds': previous.get('wall_seconds', 0) * TIMINGS_DECAY + wall_seconds,
+        }
+
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+
+            # Replace atomically, parallel runs may record at the same time
+            temp_filename = f'{self.filename}.{os.getpid()}.tmp'
+            with open(temp_filename, 'w', encoding='utf-8') as timings_file:
+                json.dump({'voices': self.voices}, timings_file, indent=2)
+            os.replace(temp_filename, self.filename)
+        except OSError as e:
+            log(LOG_TYPE.WARNING, f'Could not save timings: {e}.')
+
+    def is_calibrated(self, voice: str) -> bool:
+        """
+        Check if timings of a voice have been recorded.
+
+        :param voice: The voice key.
+        :type voice: str
+
+        :rtype: bool
+        """
+        return self.voices.get(voice, {}).get('chars', 0) > 0
+
+    def seconds_per_char(self, voice: str) -> float:
+        """
+        Get the recorded duration of synthesized audio per character.
+
+        :param voice: The voice key.
+        :type voice: str
+
+        :return: Seconds per character, DEFAULT_SECONDS_PER_CHAR if not calibrated.
+        :rtype: float
+        """
+        if not self.is_calibrated(voice):
+            return DEFAULT_SECONDS_PER_CHAR
+
+        timings = self.voices[voice]
+        return timings['audio_seconds'] / timings['chars']
+
+    def rtf(self, voice: str) -> float:
+        """
+        Get the recorded real-time factor (synthesis time divided by audio duration).
+
+        :param voice: The voice key.
+        :type voice: str
+
+        :return: The real-time factor, DEFAULT_RTF if not calibrated.
+        :rtype: float
+        """
+        if not self.is_calibrated(voice):
+            return DEFAULT_RTF
+
+        timings = self.voices[voice]
+        return timings['wall_seconds'] / timings['audio_seconds']
+
+
+@dataclass
+class Chapter_Estimate():
+    """
+    Statistics and estimates for a single chapter, after optimizing and preprocessing.
+
+    :param title: The chapter title.
+    :type title: str
+
+    :param chars: Number of characters to synthesize.
+    :type chars: int
+
+    :param items: Number of items to synthesize (pauses excluded).
+    :type items: int
+
+    :param pauses: Number of pauses.
+    :type pauses: int
+
+    :param speakers: Number of characters per speaker.
+    :type speakers: dict[str, int]
+
+    :param duration: Estimated duration of the audio in seconds.
+    :type duration: float
+
+    :param wall_time: Estimated synthesis time in seconds.
+    :type wall_time: float
+    """
+    title: str = ''
+    chars: int = 0
+    items: int = 0
+    pauses: int = 0
+    speakers: dict[str, int] = field(default_factory=dict)
+    duration: float = 0
+    wall_time: float = 0
+
+    def add_item(self, timings: Timing_Store, voice: str, speaker: str, text: str, length: int) -> None:
+        """
+        Add an item to the chapter statistics and estimates.
+
+        :param timings: The recorded timings.
+        :type timings: Timing_Store
+
+        :param voice: Key of the voice synthesizing the item.
+        :type voice: str
+
+        :param speaker: Name of the speaker.
+        :type speaker: str
+
+        :param text: The item text.
+        :type text: str
+
+        :param length: The minimum length of the item in milliseconds.
+        :type length: int
+
+        :return: None
+        """
+        text = text.strip()
+
+        if not text:
+            if length > 0:
+                self.pauses += 1
+                self.duration += length / 1000
+            return
+
+        speech_seconds = len(text) * timings.seconds_per_char(voice)
+
+        self.items += 1
+        self.chars += len(text)
+        self.speakers[speaker] = self.speakers.get(speaker, 0) + len(text)
+        self.duration += max(speech_seconds, length / 1000)
+        self.wall_time += speech_seconds * timings.rtf(voice)
+
+
+@dataclass
+class Project_Estimate():
+    """
+    Result of a dry run: statistics and estimates of all chapters, without synthesizing anything.
+
+    :param title: The project title.
+    :type title: str
+
+    :param chapters: The chapter estimates.
+    :type chapters: list[Chapter_Estimate]
+
+    :param output_format: Format of the output, for estimating its size.
+    :type output_format: str
+
+    :param uncalibrated_voices: Voices without recorded timings, estimated with default values.
+    :type uncalibrated_voices: list[str]
+    """
+    title: str = ''
+    chapters: list[Chapter_Estimate] = field(default_factory=list)
+    output_format: str = 'm4b'
+    uncalibrated_voices: list[str] = field(default_factory=list)
+
+    @property
+    def chars(self) -> int:
+        return sum(chapter.chars for chapter in self.chapters)
+
+    @property
+    def duration(self) -> float:
+        return sum(chapter.duration for chapter in self.chapters)
+
+    @property
+    def wall_time(self) -> float:
+        return sum(chapter.wall_time for chapter in self.chapters)
+
+    @property
+    def output_bytes(self) -> int:
+        """
+        Estimated size of the output in bytes.
+
+        :rtype: int
+        """
+        return int(self.duration * OUTPUT_BITRATES.get(self.output_format, 22050 * 16) / 8)
+
+    def report(self) -> str:
+        """
+        Get a human readable report of the estimates.
+
+        :return: The report, one line per chapter and a summary.
+        :rtype: str
+        """
+        lines = [f'Dry run for "{self.title}":']
+
+        for i, chapter in enumerate(self.chapters):
+            speakers = ', '.join(f'{speaker}: {chars}' for speaker, chars in chapter.speakers.items())
+            lines.append(f'{i + 1:>4}. {chapter.title[:40]:<40} {chapter.chars:>8} chars {chapter.items:>5} items {chapter.pauses:>5} pauses {_format_seconds(chapter.duration):>9} audio {_format_seconds(chapter.wall_time):>9} synthesis  [{speakers}]')
+
+        lines.append(f'Total: {self.chars} chars, {_format_seconds(self.duration)} audio, {_format_seconds(self.wall_time)} synthesis, {self.output_bytes / 1024 / 1024:.1f} MB {self.output_format}')
+
+        if self.uncalibrated_voices:
+            lines.append(f'No recorded timings for {", ".join(self.uncalibrated_voices)}, using defaults.')
+
+        return '\n'.join(lines)
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}'
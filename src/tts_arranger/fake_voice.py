@@ -0,0 +1,85 @@
+import threading
+import time
+import wave
+import zlib
+from typing import Optional
+
+import numpy as np  # type: ignore
+
+
+class FakeVoice:
+    """
+    Synthetic voice generating deterministic audio instead of speech, used by Backend.FAKE for benchmarking and tests.
+
+    Implements the same synthesize() interface as piper's PiperVoice, so it can be used everywhere a Piper voice is expected.
+    """
+
+    def __init__(self, sample_rate: int = 22050, seconds_per_char: float = 0.06, latency_per_char: float = 0.0, num_speakers: int = 4, hang_above_chars: int = 0) -> None:
+        """
+        :param sample_rate: Sample rate of the generated audio.
+        :type sample_rate: int
+
+        :param seconds_per_char: Duration of generated audio per character of text, defaults to 0.06 (roughly the pace of natural speech).
+        :type seconds_per_char: float
+
+        :param latency_per_char: Simulated inference time in seconds per character of text, defaults to 0.
+        :type latency_per_char: float
+
+        :param num_speakers: Number of available speakers.
+        :type num_speakers: int
+
+        :param hang_above_chars: Simulate a hanging model, texts longer than this never finish generating, defaults to 0 (never hang).
+        :type hang_above_chars: int
+        """
+        self.sample_rate = sample_rate
+        self.seconds_per_char = seconds_per_char
+        self.latency_per_char = latency_per_char
+        self.speaker_id_map = {f'fake_{i}': i for i in range(num_speakers)}
+        self.hang_above_chars = hang_above_chars
+
+    def generate(self, text: str, speaker_id=None, length_scale: Optional[float] = None) -> np.ndarray:
+        """
+        Generate deterministic audio for the given text, the duration scales linearly with the text length.
+
+        :param text: Text to generate audio for.
+        :type text: str
+
+        :param speaker_id: Speaker used to vary the generated audio.
+
+        :param length_scale: Optional factor for the duration of the generated audio.
+        :type length_scale: Optional[float]
+
+        :return: Float32 audio samples in the range [-1, 1].
+        :rtype: np.ndarray
+        """
+        if self.hang_above_chars > 0 and len(text) > self.hang_above_chars:
+            # Blocks until the process is killed
+            threading.Event().wait()
+
+        if self.latency_per_char > 0:
+            time.sleep(len(text) * self.latency_per_char)
+
+        num_samples = int(len(text) * self.seconds_per_char * (length_scale or 1.0) * self.sample_rate)
+
+        # Base tone depends on the speaker, modulation on the text, so identical input always results in identical audio
+        seed = zlib.crc32(f'{speaker_id}\0{text}'.encode('utf-8'))
+        frequency = 100 + zlib.crc32(str(speaker_id).encode('utf-8')) % 200
+        modulation = 2 + seed % 5
+
+        t = np.arange(num_samples, dtype=np.float32) / self.sample_rate
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * modulation * t)
+
+        return (0.5 * envelope * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+    def synthesize(self, text: str, wav_file: wave.Wave_write, speaker_id=None, length_scale: Optional[float] = None, noise_scale: Optional[float] = None, noise_w: Optional[float] = None, sentence_silence: float = 0.0) -> None:
+        """
+        Generate audio for the given text and write it to a WAV file (16 bit mono), mirrors PiperVoice.synthesize().
+        """
+        wav_file.setframerate(self.sample_rate)
+        wav_file.setsampwidth(2)
+        wav_file.setnchannels(1)
+
+        audio = self.generate(text, speaker_id, length_scale)
+        audio = np.concatenate((audio, np.zeros(int(sentence_silence * self.sample_rate), dtype=np.float32)))
+
+        wav_file.writeframes((audio * np.iinfo(np.int16).max).astype(np.int16).tobytes())
@@ -6,8 +6,6 @@ from dataclasses import dataclass, field
 from dateutil import parser
 from pytz import utc
 
-import requests  # type: ignore
-
 from ..utils.log import LOG_TYPE, log
 from .tts_chapter import TTS_Chapter  # type: ignore
 from .tts_item import TTS_Item  # type: ignore
@@ -170,6 +168,9 @@ class TTS_Project():
         :return: None
         """
         if image_url:
+            # Only needed here, so don't slow down importing the project classes
+            import requests  # type: ignore
+
             # Identify as browser to avoid problems with servers like wikimedia
             headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'}
             self.image_bytes = base64.b64encode(requests.get(image_url, headers=headers).content)
@@ -200,18 +201,28 @@ class TTS_Project():
 
         # Remove empty chapters
         for chapter in self.tts_chapters:
-            final_items = []
-            for item in chapter.tts_items:
-                if item.text.strip() != '' or (item.speaker_idx == -1 and item.length > 0):
-                    final_items.append(item)
-            
-            # Check if remaining items are all pauses
-            if len(final_items) > 1:
-                if not self._check_empty_chapter(TTS_Chapter(final_items)):
-                    final_chapters.append(chapter)
+            if self.has_content(chapter):
+                final_chapters.append(chapter)
 
         self.tts_chapters = final_chapters
 
+    def has_content(self, chapter: TTS_Chapter) -> bool:
+        """
+        Checks if a chapter is kept when removing empty chapters (see clean_empty_chapters()).
+
+        :param chapter: The chapter to check.
+        :type chapter: TTS_Chapter
+
+        :return: A boolean indicating whether the chapter contains text to synthesize.
+        """
+        final_items = []
+        for item in chapter.tts_items:
+            if item.text.strip() != '' or (item.speaker_idx == -1 and item.length > 0):
+                final_items.append(item)
+
+        # Check if remaining items are all pauses
+        return len(final_items) > 1 and not self._check_empty_chapter(TTS_Chapter(final_items))
+
     def optimize(self, max_pause_duration=0) -> None:
         """
         Merge similar items for smoother synthesizing and avoiding unwanted pauses
@@ -0,0 +1,93 @@
+import base64
+import json
+import os
+
+from .items.tts_project import TTS_Project  # type: ignore
+
+
+def new_item(
+    text: str,
+    min_length: float = 0.0,
+    speaker_id=None,
+):
+    return {
+        "text": text,
+        "min_length": min_length,
+        "speaker_id": speaker_id,
+    }
+
+
+def new_pause_item(duration: float):
+    return {
+        "min_length": duration,
+    }
+
+
+def save_tts_project_to_json(tts_project: TTS_Project, output_filename: str):
+    # Get path from filename
+    output_path = os.path.dirname(output_filename)
+
+    # Create directory if needed
+    os.makedirs(output_path, exist_ok=True)
+
+    with open(output_filename, "w") as file:
+        json.dump(tts_project_to_json(tts_project, output_path), file, indent=4)
+
+
+def tts_project_to_json(
+    tts_project: TTS_Project,
+    output_path: str,
+    backend: str = "piper",
+    model_id: str = "",
+    speaker_id_mapping: dict = {},
+) -> dict:
+    # Save image
+    image_path = None
+    if tts_project.image_bytes:
+        image_path = os.path.join(output_path, "cover.jpg")
+        image_bytes = base64.b64decode(tts_project.image_bytes)
+
+        with open(image_path, "wb") as image_file:
+            image_file.write(image_bytes)
+
+    chapters_dict = []
+
+    for chapter in tts_project.tts_chapters:
+        items_dict = []
+
+        for item in chapter.tts_items:
+            item_dict: dict = {}
+            if item.text:
+                item_dict = new_item(
+                    text=item.text,
+                    min_length=item.length,
+                    speaker_id=str(item.speaker_idx),
+                )
+            elif item.length:
+                item_dict = new_pause_item(item.length)
+
+            items_dict.append(item_dict)
+
+        chapters_dict.append({"title": chapter.title, "items": items_dict})
+
+    project = {
+        "title": tts_project.title,
+        "subtitle": tts_project.subtitle,
+        "author": tts_project.author,
+        "date": tts_project.date.isoformat(),
+        "chapters": chapters_dict,
+        "backend": {},
+    }
+
+    if image_path:
+        project["cover_image"] = image_path
+
+    if backend in ("piper", "fake"):
+        backend_dict: dict = {
+            "backend_id": backend,
+            "speaker_id_mapping": speaker_id_mapping,
+        }
+
+        project["backend"] = backend_dict
+
+    return project
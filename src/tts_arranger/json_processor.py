@@ -6,25 +6,35 @@ import math
 import os
 import subprocess
 import tempfile
+import time
 import wave
 import srt
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 import ffmpeg  # type: ignore
 import numpy as np
 import scipy  # type: ignore
 from pathvalidate import sanitize_filename
 from PIL import Image
-from piper import PiperVoice  # type: ignore
-from piper.download import find_voice, get_voices  # type: ignore
 
 from .items.tts_project import TTS_Project  # type: ignore
+from .estimator import Chapter_Estimate, Project_Estimate, Timing_Store  # type: ignore
+from .json_export import (new_item, new_pause_item,  # type: ignore
+                          save_tts_project_to_json, tts_project_to_json)
+from .piper_loader import load_piper_voice  # type: ignore
+from .preview import Preview, estimate_seconds  # type: ignore
+from .tts_processor import MAX_CHARS_BACKEND, MAX_CHARS_MODEL, Backend  # type: ignore
+from .utils.text import split_text  # type: ignore
 from .utils.log import LOG_TYPE, bcolors, log  # type: ignore
+from .utils.threads import ThreadBudget  # type: ignore
+
+if TYPE_CHECKING:
+    from piper import PiperVoice  # type: ignore
 
 
 class JSON_Processor:
-    def __init__(self, base_path: str, output_format="m4b"):
+    def __init__(self, base_path: str, output_format="m4b", thread_budget: Optional[ThreadBudget] = None, timings: Optional[Timing_Store] = None, record_timings: bool = True):
         self.NANOSECONDS_IN_ONE_SECOND = 1e9
 
         self.download_dir = "/usr/share/piper-voices/"
@@ -35,6 +45,11 @@ class JSON_Processor:
         self.project_path = base_path
         self.output_format = output_format
         self.backend_properties: dict = {}
+        self.thread_budget = thread_budget
+
+        # Synthesis timings are recorded for calibrating estimates (see estimate_project()), to the user's cache directory by default
+        self.timings = timings or Timing_Store()
+        self.record_timings = record_timings
 
     def load_json(self, json_path: str) -> dict:
         with open(json_path, "r") as file:
@@ -44,35 +59,67 @@ class JSON_Processor:
     def get_chapters(self, json_data) -> list[dict]:
         return json_data.get("chapters", [])
 
-    def get_model_info(self, json_data) -> dict:
+    def get_model_info(self, json_data, speaker_ids: Optional[set] = None) -> dict:
         model_ids: dict = {}
         self.backend_properties = json_data.get("backend", {})
         backend_id: str = self.backend_properties.get("backend_id", "")
         speaker_id_mapping: dict = self.backend_properties.get("speaker_id_mapping", {})
 
-        for _, model in speaker_id_mapping.items():
+        for speaker_id, model in speaker_id_mapping.items():
+            if speaker_ids is not None and speaker_id not in speaker_ids:
+                # Voice not needed (for previews), don't load it
+                continue
             if backend_id not in model_ids:
                 model_ids[backend_id] = []
             if model not in model_ids[backend_id]:
                 model_ids[backend_id].append(model)
         return model_ids
 
+    def _voice_key(self, speaker_mapping: dict) -> str:
+        # Quantized and float variants of the same model are loaded as separate voices
+        model_id = speaker_mapping.get("model_id", "")
+        return f"{model_id}.int8" if speaker_mapping.get("quantized", False) else model_id
+
+    def _timing_key(self, item: dict) -> str:
+        # Identifies the voice of an item for recorded timings, unmapped speakers fall back to the first model
+        speaker_id_mapping: dict = self.backend_properties.get("speaker_id_mapping", {})
+        mapped_speaker_id = speaker_id_mapping.get(item.get("speaker_id")) or next(iter(speaker_id_mapping.values()), {})
+        return f"{self.backend_properties.get('backend_id', '')}:{self._voice_key(mapped_speaker_id)}"
+
     def load_models(self, model_ids) -> dict:
         voices = {}
         for backend in model_ids:
-            if backend == "piper":
+            if backend in ("piper", "fake"):
                 for model_id in model_ids[backend]:
-                    model_id_value = model_id["model_id"]
-                    voices[model_id_value] = self.load_model(backend, model_id_value)
+                    voice_key = self._voice_key(model_id)
+                    if voice_key not in voices:
+                        voices[voice_key] = self.load_model(backend, model_id["model_id"], model_id.get("quantized", False))
         return voices
 
-    def load_model(self, backend, model_id) -> PiperVoice:
+    def load_model(self, backend, model_id, quantized: bool = False) -> "PiperVoice":
+        if backend == "fake":
+            # Synthetic voice generating deterministic audio, for benchmarking and tests
+            from .fake_voice import FakeVoice
+
+            voice = FakeVoice(**self.backend_properties.get("backend_options", {}))
+            log(LOG_TYPE.INFO, f"Loaded fake voice {model_id}")
+            if voice.sample_rate > self.sample_rate:
+                self.sample_rate = voice.sample_rate
+            return voice
+
+        # Import backend on first use only
+        from piper.download import find_voice, get_voices  # type: ignore
+
         voices_info = get_voices(self.download_dir, update_voices=False)
         file = self.download_dir + list(voices_info[model_id]["files"].keys())[0]
         dir = Path(str(file)).parent
         model_id_path, config = find_voice(model_id, [dir])
-        voice = PiperVoice.load(model_id_path, config_path=config, use_cuda=False)
-        log(LOG_TYPE.INFO, f"Loaded voice {model_id} from {config}")
+        backend_options = dict(self.backend_properties.get("backend_options", {}))
+        if quantized:
+            # Speakers may opt into the int8 variant individually
+            backend_options["quantized"] = True
+        voice = load_piper_voice(model_id_path, config_path=config, use_cuda=False, thread_budget=self.thread_budget, **backend_options)
+        log(LOG_TYPE.INFO, f"Loaded {'quantized ' if backend_options.get('quantized') else ''}voice {model_id} from {config}")
         with open(config, "r", encoding="utf-8") as config_file:
             config_dict = json.load(config_file)
             sample_rate = config_dict["audio"]["sample_rate"]
@@ -80,7 +127,7 @@ class JSON_Processor:
                 self.sample_rate = sample_rate
         return voice
 
-    def synthesize_chapters(self, chapters: list[dict], voices, temp_dir="/tmp"):
+    def synthesize_chapters(self, chapters: list[dict], voices, temp_dir="/tmp", max_seconds: float = 0):
         # total_items = sum(len(chapter.get("items", [])) for chapter in chapters)
 
         temp_format = "wav"
@@ -98,22 +145,39 @@ class JSON_Processor:
             numpy_segments = np.array([0], dtype=np.float32)
             filename = os.path.join(temp_dir, f"tts_part_{c}.{temp_format}")
             items = chapter.get("items", [])
+            # Synthesized characters, samples and time per voice
+            timings: dict[str, list] = {}
             for i, item in enumerate(items):
                 log(
                     LOG_TYPE.INFO,
                     f"Processing item {i+1} of {len(items)} [Speaker: {item.get('speaker_id', '(Pause)')}]",
                 )
 
+                start = time.perf_counter()
                 numpy_segment = self.process_item(item, voices)
                 numpy_segments = np.concatenate((numpy_segments, numpy_segment))
 
+                if item.get("text", "").strip():
+                    voice_timings = timings.setdefault(self._timing_key(item), [0, 0, 0.0])
+                    voice_timings[0] += len(item["text"].strip())
+                    voice_timings[1] += len(numpy_segment)
+                    voice_timings[2] += time.perf_counter() - start
+
                 # Get length of numpy segment in nanoseconds
                 segment_length = len(numpy_segment) / self.sample_rate * 1e9
 
                 self.item_data.append((segment_length, item.get("text", "")))
 
+                if max_seconds > 0 and len(numpy_segments) >= max_seconds * self.sample_rate:
+                    log(LOG_TYPE.INFO, f"Preview limit of {max_seconds:g}s reached after {i+1} of {len(items)} items")
+                    break
+
             scipy.io.wavfile.write(filename, self.sample_rate, numpy_segments)
 
+            for voice, (chars, samples, wall_seconds) in timings.items():
+                if self.record_timings:
+                    self.timings.record(voice, chars, samples / self.sample_rate, wall_seconds)
+
             num_zeros = len(str(len(self.temp_files)))
             title = chapter.get("title", "Chapter")
             chapter_title = f"{c + 1:0{num_zeros}} - {title}"
@@ -155,8 +219,22 @@ class JSON_Processor:
 
         return final_items
 
+    def _get_max_chars(self, item: dict) -> int:
+        # Project setting first, then model and backend specific limits
+        if "max_chars" in self.backend_properties:
+            return self.backend_properties["max_chars"]
+
+        mapped_speaker_id = self.backend_properties.get("speaker_id_mapping", {}).get(item.get("speaker_id"), {})
+        model_id = mapped_speaker_id.get("model_id", "")
+
+        if model_id in MAX_CHARS_MODEL:
+            return MAX_CHARS_MODEL[model_id]
+
+        backend = Backend.__members__.get(self.backend_properties.get("backend_id", "").upper())
+        return MAX_CHARS_BACKEND.get(backend, 0) if backend else 0
+
     def preprocess(self, tts_items: list[dict]) -> list[dict]:
-        # final_items: list[dict] = []
+        final_items: list[dict] = []
         for item in tts_items:
             if item.get("text"):
                 # Replace hyphen variants with standard hyphen
@@ -176,7 +254,18 @@ class JSON_Processor:
                 # Make sure each item ends with space
                 item["text"] = item["text"].strip() + " "
 
-        return tts_items
+                # Break items if too long (memory consumption and latency)
+                chunks = split_text(item["text"], self._get_max_chars(item))
+
+                if len(chunks) > 1:
+                    for idx, chunk in enumerate(chunks):
+                        # Keep the minimum length on the last part only
+                        final_items.append({**item, "text": chunk + " ", "min_length": item.get("min_length", 0) if idx == len(chunks) - 1 else 0})
+                    continue
+
+            final_items.append(item)
+
+        return final_items
 
     def optimize(self, tts_items: list[dict], max_pause_duration=0) -> list[dict]:
         """
@@ -268,7 +357,7 @@ class JSON_Processor:
                 synthesize_args["speaker_id"] = mapped_speaker_id.get(
                     "speaker_id", None
                 )
-                model = mapped_speaker_id.get("model_id", "")
+                model = self._voice_key(mapped_speaker_id)
                 volume_factor = mapped_speaker_id.get("volume_factor", 1.0)
             else:
                 # Speaker ID not mapped, fall back to first model
@@ -299,6 +388,59 @@ class JSON_Processor:
 
         return numpy_wav
 
+    def _prepare_chapters(self, project: dict, max_pause_duration=1500, preview: Optional[Preview] = None) -> list[dict]:
+        chapters = self.get_chapters(project)
+
+        if preview:
+            # Limit before preprocessing, so only the previewed part is processed at all
+            chapters = preview.select(chapters)
+            for chapter in chapters:
+                chapter["items"] = preview.limit_items(
+                    chapter.get("items", []),
+                    lambda item: estimate_seconds(item.get("text", ""), item.get("min_length", 0)),
+                )
+
+        for chapter in chapters:
+            chapter["items"] = self.optimize(
+                chapter.get("items", []), max_pause_duration=max_pause_duration
+            )
+            chapter["items"] = self.preprocess(chapter.get("items", []))
+
+        return chapters
+
+    def estimate_project(self, json_path: str, max_pause_duration=1500, preview: Optional[Preview] = None) -> Project_Estimate:
+        """
+        Dry run: optimize and preprocess the project like synthesize_project() without loading any voices, and estimate the duration, synthesis time and output size.
+        Estimates are based on the timings recorded by previous runs per voice, default values are used until a voice has been used once.
+
+        :param json_path: Path of the project JSON file.
+        :type json_path: str
+
+        For the other parameters, see synthesize_project().
+
+        :return: The estimates per chapter.
+        :rtype: Project_Estimate
+        """
+        project = self.load_json(json_path)
+        self.backend_properties = project.get("backend", {})
+
+        estimate = Project_Estimate(project.get("title", "Untitled Project"), output_format=self.output_format)
+
+        for c, chapter in enumerate(self._prepare_chapters(project, max_pause_duration, preview)):
+            chapter_estimate = Chapter_Estimate(chapter.get("title", f"Chapter {c + 1}"))
+
+            for item in chapter["items"]:
+                voice = self._timing_key(item)
+
+                if item.get("text", "").strip() and not self.timings.is_calibrated(voice) and voice not in estimate.uncalibrated_voices:
+                    estimate.uncalibrated_voices.append(voice)
+
+                chapter_estimate.add_item(self.timings, voice, str(item.get("speaker_id", "")), item.get("text", ""), item.get("min_length", 0))
+
+            estimate.chapters.append(chapter_estimate)
+
+        return estimate
+
     def synthesize_project(
         self,
         json_path: str,
@@ -306,20 +448,33 @@ class JSON_Processor:
         temp_dir_prefix: str | None = "",
         max_pause_duration=1500,
         subtitles: bool = False,
+        preview: Optional[Preview] = None,
+        dry_run: bool = False,
     ):
+        if dry_run:
+            # Statistics and estimates only, nothing is loaded or synthesized
+            log(LOG_TYPE.INFO, self.estimate_project(json_path, max_pause_duration, preview).report())
+            return
+
         log(LOG_TYPE.INFO, f'Loading project from "{json_path}"')
         project = self.load_json(json_path)
 
         log(LOG_TYPE.INFO, "Preparing TTS")
-        chapters = self.get_chapters(project)
+        chapters = self._prepare_chapters(project, max_pause_duration, preview)
+        speaker_ids: Optional[set] = None
+        max_seconds: float = 0
 
-        for chapter in chapters:
-            chapter["items"] = self.optimize(
-                chapter.get("items", []), max_pause_duration=max_pause_duration
-            )
-            chapter["items"] = self.preprocess(chapter.get("items", []))
+        if preview:
+            # Only load voices for the previewed part, saved separately from the complete output
+            speaker_ids = {item.get("speaker_id") for chapter in chapters for item in chapter["items"]}
+            max_seconds = preview.max_seconds
+            title = f"{title or project.get('title', 'Untitled Project')}.preview"
+
+        model_ids = self.get_model_info(project, speaker_ids)
 
-        model_ids = self.get_model_info(project)
+        if not model_ids:
+            # No mapped speakers in the preview, unmapped speakers fall back to the first model
+            model_ids = self.get_model_info(project)
         voices = self.load_models(model_ids)
 
         # Make sure temp prefix exists
@@ -333,7 +488,7 @@ class JSON_Processor:
         log(LOG_TYPE.INFO, f"Synthesizing project \"{project['title']}\"")
         with tempfile.TemporaryDirectory(dir=temp_dir_prefix) as temp_dir:
             try:
-                self.synthesize_chapters(chapters, voices, temp_dir)
+                self.synthesize_chapters(chapters, voices, temp_dir, max_seconds)
             except Exception as e:
                 log(LOG_TYPE.ERROR, f"Error synthesizing project: {e}")
                 return
@@ -614,91 +769,3 @@ class JSON_Processor:
                     loglevel="error",
                 ).run(overwrite_output=True)
             )
-
-
-def new_item(
-    text: str,
-    min_length: float = 0.0,
-    speaker_id=None,
-):
-    return {
-        "text": text,
-        "min_length": min_length,
-        "speaker_id": speaker_id,
-    }
-
-
-def new_pause_item(duration: float):
-    return {
-        "min_length": duration,
-    }
-
-
-def save_tts_project_to_json(tts_project: TTS_Project, output_filename: str):
-    # Get path from filename
-    output_path = os.path.dirname(output_filename)
-
-    # Create directory if needed
-    os.makedirs(output_path, exist_ok=True)
-
-    with open(output_filename, "w") as file:
-        json.dump(tts_project_to_json(tts_project, output_path), file, indent=4)
-
-
-def tts_project_to_json(
-    tts_project: TTS_Project,
-    output_path: str,
-    backend: str = "piper",
-    model_id: str = "",
-    speaker_id_mapping: dict = {},
-) -> dict:
-    # Save image
-    image_path = None
-    if tts_project.image_bytes:
-        image_path = os.path.join(output_path, "cover.jpg")
-        image_bytes = base64.b64decode(tts_project.image_bytes)
-
-        with open(image_path, "wb") as image_file:
-            image_file.write(image_bytes)
-
-    chapters_dict = []
-
-    for chapter in tts_project.tts_chapters:
-        items_dict = []
-
-        for item in chapter.tts_items:
-            item_dict: dict = {}
-            if item.text:
-                item_dict = new_item(
-                    text=item.text,
-                    min_length=item.length,
-                    speaker_id=str(item.speaker_idx),
-                )
-            elif item.length:
-                item_dict = new_pause_item(item.length)
-
-            items_dict.append(item_dict)
-
-        chapters_dict.append({"title": chapter.title, "items": items_dict})
-
-    project = {
-        "title": tts_project.title,
-        "subtitle": tts_project.subtitle,
-        "author": tts_project.author,
-        "date": tts_project.date.isoformat(),
-        "chapters": chapters_dict,
-        "backend": {},
-    }
-
-    if image_path:
-        project["cover_image"] = image_path
-
-    if backend == "piper":
-        backend_dict: dict = {
-            "backend_id": backend,
-            "speaker_id_mapping": speaker_id_mapping,
-        }
-
-        project["backend"] = backend_dict
-
-    return project
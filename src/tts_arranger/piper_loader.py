@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import platform
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+
+from .utils.log import LOG_TYPE, log
+from .utils.threads import ThreadBudget
+
+if TYPE_CHECKING:
+    from piper import PiperVoice  # type: ignore
+
+
+def _file_hash(filename: Union[str, Path]) -> str:
+    """
+    Get the SHA256 hash of a file's content.
+    """
+    sha256 = hashlib.sha256()
+
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def optimized_model_path(model_path: Union[str, Path], cache_dir: Union[str, Path], use_cuda: bool = False) -> Path:
+    """
+    Get the path of the cached optimized graph for a model. The key depends on the model file content, the onnxruntime version, the execution provider and the machine, as optimized graphs are only valid for the setup they were created with.
+
+    :param model_path: Path of the original ONNX model file.
+    :type model_path: Union[str, Path]
+
+    :param cache_dir: Directory of the optimized model cache.
+    :type cache_dir: Union[str, Path]
+
+    :param use_cuda: Whether the CUDA execution provider is used.
+    :type use_cuda: bool
+
+    :return: Path of the (possibly not yet existing) optimized model file.
+    :rtype: Path
+    """
+    import onnxruntime  # type: ignore
+
+    key_source = "\0".join([_file_hash(model_path), onnxruntime.__version__, "cuda" if use_cuda else "cpu", platform.machine()])
+    key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()[:16]
+
+    return Path(cache_dir) / f"{Path(model_path).stem}-{key}.ort.onnx"
+
+
+def quantized_model_path(model_path: Union[str, Path]) -> Path:
+    """
+    Get the path of the int8 quantized variant of a model, which is stored next to the original.
+
+    :param model_path: Path of the original ONNX model file.
+    :type model_path: Union[str, Path]
+
+    :return: Path of the (possibly not yet existing) quantized model file.
+    :rtype: Path
+    """
+    model_path = Path(model_path)
+    return model_path.with_name(f"{model_path.stem}.int8{model_path.suffix}")
+
+
+def quantize_voice(model_path: Union[str, Path], force: bool = False) -> Path:
+    """
+    Create a dynamically quantized int8 copy of a voice model for faster inference on the CPU. The copy is cached next to the original and only created if it doesn't exist yet.
+
+    :param model_path: Path of the original ONNX model file.
+    :type model_path: Union[str, Path]
+
+    :param force: Recreate the quantized model even if it already exists.
+    :type force: bool
+
+    :return: Path of the quantized model file.
+    :rtype: Path
+    """
+    output_path = quantized_model_path(model_path)
+
+    if output_path.exists() and not force:
+        return output_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic  # type: ignore
+
+    log(LOG_TYPE.INFO, f"Quantizing {model_path}...")
+
+    # Write to a temporary file first, so parallel workers never load a partially written model
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    quantize_dynamic(str(model_path), temp_path, weight_type=QuantType.QInt8)
+    os.replace(temp_path, output_path)
+
+    log(LOG_TYPE.SUCCESS, f"Quantized model saved as {output_path}.")
+
+    return output_path
+
+
+def load_piper_voice(model_path: Union[str, Path], config_path: Optional[Union[str, Path]] = None, use_cuda: bool = False, thread_budget: Optional[ThreadBudget] = None, cache_dir: Optional[Union[str, Path]] = None, quantized: bool = False) -> "PiperVoice":
+    """
+    Load a Piper voice, like PiperVoice.load() but with control over the onnxruntime session.
+
+    :param model_path: Path of the ONNX model file.
+    :type model_path: Union[str, Path]
+
+    :param config_path: Path of the voice config JSON file, defaults to the model path with ".json" appended.
+    :type config_path: Optional[Union[str, Path]]
+
+    :param use_cuda: Use the CUDA execution provider instead of the CPU.
+    :type use_cuda: bool
+
+    :param thread_budget: Optional thread budget for the onnxruntime session.
+    :type thread_budget: Optional[ThreadBudget]
+
+    :param cache_dir: Optional directory for persisting the graph optimized by onnxruntime. Later loads use the cached graph and skip parsing and optimizing the original model. If the directory can't be created, the model is loaded without cache.
+    :type cache_dir: Optional[Union[str, Path]]
+
+    :param quantized: Use the int8 quantized variant of the model (see quantize_voice), which is created on first use. Trades a little audio quality for CPU throughput.
+    :type quantized: bool
+
+    :return: The loaded voice.
+    :rtype: PiperVoice
+    """
+    import onnxruntime  # type: ignore
+    from piper import PiperVoice  # type: ignore
+    from piper.config import PiperConfig  # type: ignore
+
+    if config_path is None:
+        config_path = f"{model_path}.json"
+
+    with open(config_path, "r", encoding="utf-8") as config_file:
+        config_dict = json.load(config_file)
+
+    if quantized:
+        model_path = quantize_voice(model_path)
+
+    session_options = onnxruntime.SessionOptions()
+
+    if thread_budget:
+        thread_budget = thread_budget.limited()
+
+        if thread_budget.intra_op > 0:
+            session_options.intra_op_num_threads = thread_budget.intra_op
+        if thread_budget.inter_op > 0:
+            session_options.inter_op_num_threads = thread_budget.inter_op
+        if thread_budget.workers > 1:
+            # Don't let idle threads spin and steal cycles from other workers
+            session_options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+
+    session_model_path = Path(model_path)
+    cache_path: Optional[Path] = None
+
+    if cache_dir:
+        cache_path = optimized_model_path(model_path, cache_dir, use_cuda)
+
+        if cache_path.exists():
+            # Already optimized, don't optimize again
+            session_model_path = cache_path
+            session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+            except OSError as e:
+                # Caching is an optimization only, load the original model if the directory can't be created
+                log(LOG_TYPE.WARNING, f"Can't use cache directory {cache_dir}, loading without cache: {e}")
+                cache_path = None
+            else:
+                # Write to a temporary file first, so parallel workers never load a partially written model
+                session_options.optimized_model_filepath = f"{cache_path}.{os.getpid()}.tmp"
+                session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    session = onnxruntime.InferenceSession(
+        str(session_model_path),
+        sess_options=session_options,
+        providers=["CUDAExecutionProvider"] if use_cuda else ["CPUExecutionProvider"],
+    )
+
+    if cache_path and session_model_path != cache_path:
+        temp_path = session_options.optimized_model_filepath
+
+        if os.path.exists(temp_path):
+            os.replace(temp_path, cache_path)
+            log(LOG_TYPE.INFO, f"Optimized model saved as {cache_path}.")
+    elif cache_path:
+        log(LOG_TYPE.INFO, f"Loaded optimized model from {cache_path}.")
+
+    return PiperVoice(config=PiperConfig.from_dict(config_dict), session=session)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create int8 quantized variants of Piper voice models.")
+    parser.add_argument("models", nargs="+", help="ONNX model files to quantize")
+    parser.add_argument("--force", action="store_true", help="Recreate existing quantized models")
+    args = parser.parse_args()
+
+    for model in args.models:
+        quantize_voice(model, force=args.force)
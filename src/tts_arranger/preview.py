@@ -0,0 +1,108 @@
+import copy
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
+from .items.tts_chapter import TTS_Chapter
+
+T = TypeVar('T')
+
+# Fast speech, so estimated durations rather fall short and enough items are kept for the time budget
+CHARS_PER_SECOND = 20
+
+
+def estimate_seconds(text: str, length: int = 0) -> float:
+    """
+    Roughly estimate the duration of an item before synthesizing it.
+
+    :param text: The text of the item.
+    :type text: str
+
+    :param length: The minimum length of the item in milliseconds.
+    :type length: int
+
+    :return: The estimated duration in seconds, on the short side.
+    :rtype: float
+    """
+    return max(len(text.strip()) / CHARS_PER_SECOND, length / 1000)
+
+
+@dataclass(frozen=True)
+class Preview():
+    """
+    Defines a partial rendering for quickly checking checkers, speakers and voices. The selected part runs through the regular pipeline, but parsing, preprocessing and synthesizing are limited to it.
+
+    :param chapter_range: Start and stop index of the chapters to render (0-based, stop excluded, like a slice), defaults to all chapters.
+    :type chapter_range: Optional[tuple[int, int]]
+
+    :param max_seconds: Render only the first seconds of each chapter, 0 to render complete chapters. Synthesizing stops after the item reaching the limit, so items are never cut off.
+    :type max_seconds: float
+    """
+    chapter_range: Optional[tuple[int, int]] = None
+    max_seconds: float = 0
+
+    @property
+    def max_chapters(self) -> int:
+        """
+        Number of chapters needed from the start of the source, for stopping parsing early.
+
+        :return: The number of chapters, 0 if all chapters are needed.
+        :rtype: int
+        """
+        return self.chapter_range[1] if self.chapter_range else 0
+
+    def select(self, chapters: list[T]) -> list[T]:
+        """
+        Get the chapters within the chapter range.
+
+        :param chapters: All chapters.
+        :type chapters: list
+
+        :return: The selected chapters.
+        :rtype: list
+        """
+        if not self.chapter_range:
+            return list(chapters)
+
+        start, stop = self.chapter_range
+        return chapters[start:stop]
+
+    def limit_items(self, items: list[T], estimate: Callable[[T], float]) -> list[T]:
+        """
+        Get the leading items of a chapter which are likely needed for the time budget, so later items are neither preprocessed nor synthesized.
+
+        :param items: The items of the chapter.
+        :type items: list
+
+        :param estimate: Function returning the estimated duration of an item in seconds (see estimate_seconds()).
+        :type estimate: Callable
+
+        :return: The leading items.
+        :rtype: list
+        """
+        if self.max_seconds <= 0:
+            return list(items)
+
+        seconds = 0.0
+
+        for i, item in enumerate(items):
+            seconds += estimate(item)
+
+            if seconds >= self.max_seconds:
+                return items[:i + 1]
+
+        return list(items)
+
+    def apply(self, chapters: list[TTS_Chapter]) -> list[TTS_Chapter]:
+        """
+        Get copies of the selected chapters with their items limited, the original chapters are left unchanged for rendering them again.
+
+        :param chapters: All chapters of the project.
+        :type chapters: list[TTS_Chapter]
+
+        :return: The chapters to render.
+        :rtype: list[TTS_Chapter]
+        """
+        return [
+            TTS_Chapter([copy.copy(tts_item) for tts_item in self.limit_items(chapter.tts_items, lambda tts_item: estimate_seconds(tts_item.text, tts_item.length))], chapter.title)
+            for chapter in self.select(chapters)
+        ]
@@ -2,7 +2,9 @@ from abc import ABC, abstractmethod
 from typing import Optional
 
 from .items.tts_item import TTS_Item  # type: ignore
-from .tts_processor import Backend  # type: ignore
+from .tts_processor import Backend, TTS_Processor  # type: ignore
+from .tts_synthesis_worker import TTS_Synthesis_Worker, WorkerLimits  # type: ignore
+from .utils.threads import ThreadBudget  # type: ignore
 from .utils.log import LOG_TYPE, bcolors, log  # type: ignore
 
 
@@ -16,7 +18,11 @@ class TTS_Abstract_Writer(ABC):
         preferred_speakers: Optional[list[str]] = None,
         model: str = "",
         backend: Backend = Backend.COQUI,
-        lang: str = 'en'
+        lang: str = 'en',
+        backend_options: Optional[dict] = None,
+        thread_budget: Optional[ThreadBudget] = None,
+        max_chars: Optional[int] = None,
+        worker_limits: Optional[WorkerLimits] = None
     ) -> None:
         """
         Initialize a new TTS_Abstract_Writer instance.
@@ -25,6 +31,18 @@ class TTS_Abstract_Writer(ABC):
                                 If set to None, the default speaker(s) will be used.
         :type preferred_speakers: Optional[list[str]]
 
+        :param backend_options: Optional keyword arguments passed on to the backend voice (see TTS_Processor).
+        :type backend_options: Optional[dict]
+
+        :param thread_budget: Optional number of inference threads (see TTS_Processor).
+        :type thread_budget: Optional[ThreadBudget]
+
+        :param max_chars: Optional maximum number of characters per synthesized item (see TTS_Processor).
+        :type max_chars: Optional[int]
+
+        :param worker_limits: Run the model in a supervised worker process, which is restarted when exceeding these limits (see TTS_Synthesis_Worker).
+        :type worker_limits: Optional[WorkerLimits]
+
         :return: None
         """
         self.preferred_speakers = preferred_speakers or []
@@ -32,6 +50,28 @@ class TTS_Abstract_Writer(ABC):
         self.model = model
         self.backend = backend
         self.lang = lang
+        self.backend_options = backend_options or {}
+        self.thread_budget = thread_budget
+        self.max_chars = max_chars
+        self.worker_limits = worker_limits
+
+    def _new_processor(self, vocoder: str, lang: str) -> TTS_Processor:
+        """
+        Create a TTS processor with the settings of this writer, running in a supervised worker process if worker limits are set.
+
+        :param vocoder: Name of the vocoder to use.
+        :type vocoder: str
+
+        :param lang: Language code.
+        :type lang: str
+
+        :return: The TTS processor (not initialized yet).
+        :rtype: TTS_Processor
+        """
+        if self.worker_limits:
+            return TTS_Synthesis_Worker(self.model, vocoder, self.preferred_speakers, self.backend, lang, self.backend_options, self.thread_budget, self.max_chars, self.worker_limits)
+
+        return TTS_Processor(self.model, vocoder, self.preferred_speakers, self.backend, lang, self.backend_options, self.thread_budget, self.max_chars)
 
     def print_progress(self, current_nr: int, max_nr: int, current_item: TTS_Item):
         """
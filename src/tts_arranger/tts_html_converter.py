@@ -1,17 +1,28 @@
-import copy
+import dataclasses
 import json
 import os
 from enum import Enum, auto
 from html.parser import HTMLParser
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
+from tts_arranger.items.tts_chapter import TTS_Chapter  # type: ignore
 from tts_arranger.items.tts_item import TTS_Item  # type: ignore
-from tts_arranger.tts_writer import TTS_Chapter, TTS_Project  # type: ignore
+from tts_arranger.items.tts_project import TTS_Project  # type: ignore
 
 from tts_arranger.tts_reader.checker import (CHECK_SPEAKER_RESULT, CHECKER_SIGNAL, Checker,
-                                             CheckerItemProperties, Condition, ConditionClass,
-                                             ConditionID, ConditionName, Element)
+                                             CheckerIndex, CheckerItemProperties, Condition,
+                                             ConditionClass, ConditionID, ConditionName,
+                                             ConditionSelector, Element)
+from tts_arranger.tts_reader.checker_profile import Checker_Profile
+
+
+# Elements without end tag, these never enter skip mode
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+# Checkers read from JSON files by filename, with the modification time of the file they were read from (see add_checkers_from_json())
+# Checkers are never modified, so converters share them instead of reading and compiling the same files again
+_checkers_files_cache: dict[str, tuple[int, list[Checker]]] = {}
 
 
 class CONVERSION_MODE(Enum):
@@ -25,7 +36,7 @@ class TTS_HTML_Converter(HTMLParser):
     """
     project: TTS_Project
 
-    def __init__(self, *, convert_charrefs: bool = True, default_properties=CheckerItemProperties(pause_after=250), custom_checkers: Optional[list[Checker]] = None, custom_checkers_files: Optional[list[str]] = None, ignore_default_checkers: bool = False) -> None:
+    def __init__(self, *, convert_charrefs: bool = True, default_properties=CheckerItemProperties(pause_after=250), custom_checkers: Optional[list[Checker]] = None, custom_checkers_files: Optional[list[str]] = None, ignore_default_checkers: bool = False, coalesce_text: bool = True, profile_checkers: bool = False, profile_file: Optional[str] = None) -> None:
         """
         Initializes a TTS_HTML_Converter object.
 
@@ -37,10 +48,20 @@ class TTS_HTML_Converter(HTMLParser):
 
         :param default_properties: An optional CheckerItemProperties object that represents the default properties for all HTML elements.
         :type default_properties: CheckerItemProperties
+
+        :param coalesce_text: Append text to the previous item of the same speaker instead of adding an item per text node, and drop whitespace-only text which can't be appended. Disable to get one item per text node.
+        :type coalesce_text: bool
+
+        :param profile_checkers: Record per checker how often it matches, how often it is evaluated and the time spent, and report it (see write_profile_report()). Statistics are accumulated over all documents.
+        :type profile_checkers: bool
+
+        :param profile_file: Write the profiling report to this file instead of printing it, enables profiling.
+        :type profile_file: Optional[str]
         """
         super().__init__(convert_charrefs=convert_charrefs)
 
         self.default_properties = default_properties
+        self.coalesce_text = coalesce_text
         self.last_signal = CHECKER_SIGNAL.NO_SIGNAL
 
         # Initialize list with custom checkers so they have the highest priority
@@ -51,6 +72,29 @@ class TTS_HTML_Converter(HTMLParser):
 
         self.checker_results_stack: list[tuple[CHECK_SPEAKER_RESULT, CHECKER_SIGNAL, Optional[CheckerItemProperties]]] = []
 
+        # Compiled from the checkers on first use (see _check_elem())
+        self.checker_index: Optional[CheckerIndex] = None
+
+        # Checker statistics, only recorded when profiling
+        self.checker_profile: Optional[Checker_Profile] = Checker_Profile() if profile_checkers or profile_file else None
+        self.profile_file = profile_file
+
+        # Names of the open elements, in the same order as their entries in the results stack
+        self.open_tags: list[str] = []
+
+        # The open elements themselves and the number of elements started within each (the first entry for the document), for selector conditions
+        self.open_elements: list[Element] = []
+        self._child_counts: list[int] = [0]
+
+        # Names of the ignored element being skipped and the elements open within it, these have no entries in the results stack
+        self.skip_tags: list[str] = []
+
+        # Chapter title candidates of the current document by kind ("heading", "paragraph" or "title", see get_chapter_title())
+        # Candidates are kept with their position in the document, the first started element wins even if nested elements end before it
+        self.title_candidates: dict[str, tuple[int, str]] = {}
+        self._title_collectors: list[tuple[str, str, int, list[str]]] = []
+        self._title_elements = 0
+
         # Add checkers from custom files
         if custom_checkers_files:
             for custom_checkers_file in custom_checkers_files:
@@ -87,14 +131,16 @@ class TTS_HTML_Converter(HTMLParser):
         for attr in attrs:
             match attr[0]:
                 case 'id':
-                    elem.id = attr[1]
+                    elem.id = attr[1] or ''
                 case 'class':
-                    elem.classes = attr[1].split()
+                    elem.classes = (attr[1] or '').split()
+
+            elem.attrs[attr[0]] = attr[1] or ''
         return elem
 
     def handle_starttag(self, name: str, attrs: list) -> None:
         """
-        Handles the start of an HTML tag.
+        Handles the start of an HTML tag. Void elements (like "br") are closed right away, as they have no end tag.
 
         :param name: The name of the HTML tag.
         :type name: str
@@ -102,31 +148,119 @@ class TTS_HTML_Converter(HTMLParser):
         :param attrs: The attributes of the HTML tag.
         :type attrs: list
         """
+        if self._start_element(name, attrs) and name in VOID_ELEMENTS:
+            self._end_element(name)
+
+    def handle_startendtag(self, name: str, attrs: list) -> None:
+        """
+        Handles a self-closing HTML tag (like "<br/>").
+
+        :param name: The name of the HTML tag.
+        :type name: str
+
+        :param attrs: The attributes of the HTML tag.
+        :type attrs: list
+        """
+        opened = self._start_element(name, attrs, self_closing=True)
+        self._end_title_candidate(name)
+
+        if opened:
+            self._end_element(name)
+
+    def _start_title_candidate(self, name: str, attrs: list) -> None:
+        # Same candidates as looked up for chapter titles before: headings, paragraphs with a heading class ("h1", "h2" etc.) and the title tag
+        kind = ''
+
+        if name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            kind = 'heading'
+        elif name == 'p':
+            classes = (dict(attrs).get('class') or '').split()
+            if classes and classes[0].startswith('h'):
+                kind = 'paragraph'
+        elif name == 'title':
+            kind = 'title'
+
+        if kind and kind not in self.title_candidates:
+            self._title_collectors.append((kind, name, self._title_elements, []))
+            self._title_elements += 1
+
+    def _end_title_candidate(self, name: str) -> None:
+        for i in range(len(self._title_collectors) - 1, -1, -1):
+            kind, collector_name, position, parts = self._title_collectors[i]
+
+            if collector_name == name:
+                del self._title_collectors[i]
+                text = ''.join(parts).strip()
+
+                # Only the first title tag counts, but the first non-empty heading or paragraph
+                if (text or kind == 'title') and position < self.title_candidates.get(kind, (self._title_elements, ''))[0]:
+                    self.title_candidates[kind] = (position, text)
+                break
+
+    def get_chapter_title(self) -> str:
+        """
+        Get the chapter title of the last converted document: the first non-empty heading, otherwise the first non-empty paragraph with a heading class ("h1", "h2" etc.), otherwise the title tag.
+
+        :return: The chapter title, an empty string if none was found.
+        :rtype: str
+        """
+        for kind in ('heading', 'paragraph', 'title'):
+            _, title = self.title_candidates.get(kind, (0, ''))
+            if title:
+                return title
+        return ''
+
+    def _start_element(self, name: str, attrs: list, self_closing: bool = False) -> bool:
+        # Returns if the element was opened (has an entry in the results stack)
+        self._start_title_candidate(name, attrs)
+
+        if self.skip_tags:
+            # Inside an ignored element, only track nesting until it is closed
+            if name not in VOID_ELEMENTS and not self_closing:
+                self.skip_tags.append(name)
+            return False
+
+        elem = self.tag_to_element(name, attrs)
+        elem.parent = self.open_elements[-1] if self.open_elements else None
+        elem.index = self._child_counts[-1]
+        self._child_counts[-1] += 1
+
         # Ignore script, style tags, etc.
         if name in ['script', 'style', 'meta']:
             result = CHECK_SPEAKER_RESULT.MATCHED
             signal = CHECKER_SIGNAL.IGNORE
             properties = None
         else:
-            result, signal, properties = copy.deepcopy(self._check_elem(self.tag_to_element(name, attrs), self.checkers))
+            # Properties are immutable and shared, modified properties are replaced instead of changed
+            result, signal, properties = self._check_elem(elem, self.checkers)
 
             if result != CHECK_SPEAKER_RESULT.MATCHED:
                 # If there are no specific properties for this tag, continue to use parent tag's speaker properties (but no pause)
-                _, signal, properties = copy.deepcopy(self.checker_results_stack[-1])
+                _, signal, properties = self.checker_results_stack[-1]
 
                 if properties:
-                    properties.pause_after = self.default_properties.pause_after
+                    if properties.pause_after != self.default_properties.pause_after:
+                        properties = dataclasses.replace(properties, pause_after=self.default_properties.pause_after)
                     result = CHECK_SPEAKER_RESULT.NOT_MATCHED
 
         if properties:
             # Only apply speaker index if its above the parent tag (for nested tags)
-            _, _, parent_properties = copy.deepcopy(self.checker_results_stack[-1])
+            _, _, parent_properties = self.checker_results_stack[-1]
 
             if parent_properties:
                 if properties.speaker_idx < parent_properties.speaker_idx:
-                    properties.speaker_idx = parent_properties.speaker_idx
+                    properties = dataclasses.replace(properties, speaker_idx=parent_properties.speaker_idx)
+
+        if signal == CHECKER_SIGNAL.IGNORE and name not in VOID_ELEMENTS and not self_closing:
+            # Skip all content until the element is closed, its entry is removed by the end tag
+            self.skip_tags = [name]
 
         self.checker_results_stack.append((result, signal, properties))
+        self.open_tags.append(name)
+        self.open_elements.append(elem)
+        self._child_counts.append(0)
+
+        return True
 
     def handle_data(self, data: str) -> None:
         """
@@ -135,6 +269,13 @@ class TTS_HTML_Converter(HTMLParser):
         :param data: The data between two HTML tags.
         :type data: str.
         """
+        # Title candidates include all text, even of ignored elements
+        for _, _, _, parts in self._title_collectors:
+            parts.append(data)
+
+        if self.skip_tags:
+            return
+
         (_, signal, properties) = self.checker_results_stack[-1]
 
         match signal:
@@ -146,16 +287,74 @@ class TTS_HTML_Converter(HTMLParser):
                 self.project.tts_chapters.append(self.current_chapter)
 
         if properties:
+            if self.coalesce_text:
+                last_item = self.current_chapter.tts_items[-1] if self.current_chapter.tts_items else None
+
+                # Same result as merging the items when optimizing the chapter, but without an item per text node
+                if last_item and last_item.speaker_idx == properties.speaker_idx:
+                    last_item.text += data
+                    self.current_item = last_item
+                    return
+
+                # Whitespace between items of other speakers or pauses is removed when optimizing anyway
+                if not data.strip():
+                    return
+
             self.current_item = TTS_Item(data, properties.speaker_idx)
             self.current_chapter.tts_items.append(self.current_item)
 
     def handle_endtag(self, name: str) -> None:
         """
-        Handles the end of an HTML tag.
+        Handles the end of an HTML tag. Elements left open within the closed element are closed as well, end tags without an open element are ignored.
 
         :param name: The name of the HTML tag.
         :type name: str
         """
+        if name in VOID_ELEMENTS:
+            # Already closed by the start tag
+            return
+
+        self._end_title_candidate(name)
+
+        if self.skip_tags:
+            if name in self.skip_tags:
+                while self.skip_tags.pop() != name:
+                    pass
+
+                if not self.skip_tags:
+                    # The ignored element itself is closed
+                    self._end_element(name)
+                return
+
+            if name not in self.open_tags:
+                return
+
+            # An enclosing element is closed, so the ignored element (left open) is closed as well
+            self.skip_tags = []
+
+        if name not in self.open_tags:
+            return
+
+        while self.open_tags[-1] != name:
+            self._end_element(self.open_tags[-1])
+
+        self._end_element(name)
+
+    def _close_open_elements(self) -> None:
+        # Close all elements left open at the end of a document
+        while self._title_collectors:
+            self._end_title_candidate(self._title_collectors[-1][1])
+
+        self.skip_tags = []
+
+        while self.open_tags:
+            self._end_element(self.open_tags[-1])
+
+    def _end_element(self, name: str) -> None:
+        # Close the element on top of the stack
+        self.open_tags.pop()
+        self.open_elements.pop()
+        self._child_counts.pop()
         (result, signal, properties) = self.checker_results_stack.pop()
 
         add_pause = False
@@ -195,6 +394,14 @@ class TTS_HTML_Converter(HTMLParser):
 
         :return: A tuple of the CHECK_SPEAKER_RESULT, CHECKER_SIGNAL, and CheckerItemProperties objects representing the result of the check.
         """
+        if checkers is self.checkers:
+            # Recompile if checkers were added
+            if self.checker_index is None or len(self.checker_index.checkers) != len(self.checkers):
+                self.checker_index = CheckerIndex(self.checkers)
+                self.checker_index.profile = self.checker_profile
+
+            return self.checker_index.lookup(elem)
+
         for checker in checkers:
             result, signal, properties = checker.determine(elem)
 
@@ -218,13 +425,80 @@ class TTS_HTML_Converter(HTMLParser):
 
         current_chapters_count = len(self.project.tts_chapters)
 
+        self._start_document(new_chapter)
+        self.feed(html)
+        self._end_document()
+
+        return len(self.project.tts_chapters) - current_chapters_count
+
+    def _start_document(self, new_chapter: bool) -> None:
         if new_chapter:
             self.current_chapter = TTS_Chapter()
             self.project.tts_chapters.append(self.current_chapter)
 
-        self.feed(html)
+        self.title_candidates = {}
+        self._title_collectors = []
+        self._title_elements = 0
 
-        return len(self.project.tts_chapters) - current_chapters_count
+        self._child_counts = [0]
+
+    def _end_document(self) -> None:
+        # Process remaining text and close elements left open, so nothing is carried over to the next document
+        self.close()
+        self._close_open_elements()
+
+    def write_profile_report(self) -> None:
+        """
+        Write the report of the checker profile to the profile file, or print it if there is none. Does nothing if not profiling.
+        Called by convert_from_html(), readers converting several documents or chunks call it once at the end.
+
+        :return: None
+        """
+        if self.checker_profile is None:
+            return
+
+        report = self.checker_profile.report(self.checkers)
+
+        if self.profile_file:
+            with open(self.profile_file, 'w', encoding='utf-8') as file:
+                file.write(report + '\n')
+        else:
+            print(report)
+
+    def convert_chunks(self, chunks: Iterable[str]) -> Iterator[TTS_Chapter]:
+        """
+        Converts HTML read in chunks (like from a large file), yielding each chapter as soon as it is complete. Completed chapters are removed from the project, so only the open elements and the current chapter are kept in memory.
+
+        :param chunks: The chunks of the HTML string, they may be cut anywhere.
+        :type chunks: Iterable[str]
+
+        :return: Iterator over the chapters (including empty ones, like convert_from_html()).
+        :rtype: Iterator[TTS_Chapter]
+        """
+        self.project = TTS_Project()
+        self._start_document(True)
+
+        pending = ''
+
+        for chunk in chunks:
+            pending += chunk
+
+            # Feed up to the last tag only, so text between two tags is never split into several items
+            position = pending.rfind('<')
+
+            if position > 0:
+                self.feed(pending[:position])
+                pending = pending[position:]
+
+            # All chapters but the current one are complete
+            while len(self.project.tts_chapters) > 1:
+                yield self.project.tts_chapters.pop(0)
+
+        self.feed(pending)
+        self._end_document()
+
+        while self.project.tts_chapters:
+            yield self.project.tts_chapters.pop(0)
 
     def convert_from_html(self, html: str, conversion_mode: CONVERSION_MODE = CONVERSION_MODE.PROJECT) -> Optional[TTS_Project | list[TTS_Item]]:
         """
@@ -241,6 +515,7 @@ class TTS_HTML_Converter(HTMLParser):
         self.project = TTS_Project()
 
         self.add_from_html(html)
+        self.write_profile_report()
 
         match conversion_mode:
             case CONVERSION_MODE.PROJECT:
@@ -253,7 +528,7 @@ class TTS_HTML_Converter(HTMLParser):
 
     def add_checkers_from_json(self, filename: str = '') -> None:
         """
-        Load and add checkers from a checkers JSON file.
+        Load and add checkers from a checkers JSON file. Files are only read once as long as they are unchanged, the checkers are shared by all converters.
 
         :param filename: Filename of the checkers file to load (in JSON format), defaults to ''
         :type filename: str, optional
@@ -261,12 +536,29 @@ class TTS_HTML_Converter(HTMLParser):
         :return: None
         """
 
-        json_check_entries = []
-
         if not os.path.exists(filename):
             print(f'Checkers file "{filename}" does not exist, skipping.')
             return
 
+        key = os.path.abspath(filename)
+        mtime = os.stat(filename).st_mtime_ns
+        cached = _checkers_files_cache.get(key)
+
+        if cached and cached[0] == mtime:
+            checkers = cached[1]
+        else:
+            checkers = self._read_checkers_file(filename)
+            _checkers_files_cache[key] = (mtime, checkers)
+
+        self.checkers.extend(checkers)
+
+        self.checker_index = None
+        print(f'{len(checkers)} checkers entries added.')
+
+    def _read_checkers_file(self, filename: str) -> list[Checker]:
+        checkers: list[Checker] = []
+        json_check_entries = []
+
         print(f'Loading checkers file "{filename}".')
 
         with open(filename, 'r') as file:
@@ -295,6 +587,11 @@ class TTS_HTML_Converter(HTMLParser):
                         condition = ConditionClass(arg)
                     case 'ID':
                         condition = ConditionID(arg)
+                    case 'Selector':
+                        try:
+                            condition = ConditionSelector(arg)
+                        except ValueError as e:
+                            print(f'{e}, skipping condition.')
                     case _:
                         print(f'Unknown checker condition found: {name}')
 
@@ -331,8 +628,9 @@ class TTS_HTML_Converter(HTMLParser):
                     case _:
                         print(f'Unknown checker signal found: {json_signal}')
 
-            self.checkers.append(Checker(conditions, properties, signal))
-        print(f'{len(json_check_entries)} checkers entries added.')
+            checkers.append(Checker(conditions, properties, signal))
+
+        return checkers
 
     def get_project(self) -> TTS_Project:
         """
@@ -5,26 +5,69 @@ import json
 import os
 import re
 import string
+import threading
+import time
 import wave
 from enum import Enum, auto
 from pathlib import Path
 from typing import Optional
 
 import numpy as np  # type: ignore
-import TTS  # type: ignore
 from num2words import num2words  # type: ignore
-from piper import PiperVoice  # type: ignore
-from piper.download import find_voice, get_voices  # type: ignore
-from TTS.utils.manage import ModelManager  # type: ignore
-from TTS.utils.synthesizer import Synthesizer  # type: ignore
 
 from .items.tts_item import TTS_Item
 from .utils.log import LOG_TYPE, bcolors, log
+from .utils.text import SENTENCE_BREAKS, split_text
+from .utils.threads import ThreadBudget
 
 
 class Backend(Enum):
     COQUI = auto()
     PIPER = auto()
+    # Synthetic voice generating deterministic audio, for benchmarking and tests
+    FAKE = auto()
+
+
+# Dummy inputs of different lengths for warming up the synthesizer (memory allocation, kernel selection)
+WARM_UP_TEXTS = [
+    "Hello.",
+    "This is a short sentence to warm up the speech synthesizer.",
+    "Is this a somewhat longer question, with a comma, a number like 42, and a few more words to cover longer inputs as well?",
+]
+
+
+class SynthesisError(Exception):
+    """
+    Raised when synthesizing an item fails, even after retrying.
+
+    :param tts_item: The item that could not be synthesized.
+    :type tts_item: TTS_Item
+
+    :param attempts: Number of attempts made.
+    :type attempts: int
+
+    :param reason: Description of the last failure.
+    :type reason: str
+    """
+
+    def __init__(self, tts_item: TTS_Item, attempts: int, reason: str) -> None:
+        super().__init__(f'Error synthesizing "{tts_item.text}" after {attempts} attempt(s): {reason}.')
+        self.tts_item = tts_item
+        self.attempts = attempts
+        self.reason = reason
+
+
+# Maximum number of characters per synthesized item (0 = unlimited), long items are split at sentence/clause boundaries
+# Coqui requests are served by Piper for now (see TTS_Processor), so they get the Piper limit
+MAX_CHARS_BACKEND = {
+    Backend.PIPER: 1000,
+    Backend.FAKE: 1000,
+}
+
+# Model specific limits, override the backend limits
+MAX_CHARS_MODEL = {
+    "tts_models/de/thorsten/tacotron2-DDC": 200,
+}
 
 
 class TTS_Processor:
@@ -35,6 +78,9 @@ class TTS_Processor:
         preferred_speakers: Optional[list[str]] = None,
         backend: Backend = Backend.COQUI,
         lang: str = "en",
+        backend_options: Optional[dict] = None,
+        thread_budget: Optional[ThreadBudget] = None,
+        max_chars: Optional[int] = None,
     ) -> None:
         """
         Initializes a new instance of the TTS class.
@@ -49,12 +95,33 @@ class TTS_Processor:
                                 If set to None, the default speaker(s) will be used.
         :type preferred_speakers: Optional[list[str]]
 
+        :param backend_options: Optional keyword arguments for the backend voice, for example `cache_dir` or `quantized` for Backend.PIPER (see load_piper_voice) or `latency_per_char` for Backend.FAKE (see FakeVoice).
+        :type backend_options: Optional[dict]
+
+        :param thread_budget: Optional number of inference threads, applied to both onnxruntime (Piper) and torch (Coqui). Use ThreadBudget.for_workers() when running several processors in parallel.
+        :type thread_budget: Optional[ThreadBudget]
+
+        :param max_chars: Maximum number of characters per synthesized item, longer items are split at sentence/clause boundaries. Defaults to the limit of the model or backend (see MAX_CHARS_MODEL and MAX_CHARS_BACKEND), 0 disables splitting.
+        :type max_chars: Optional[int]
+
         :return: None
         """
         # self.backend = backend
-        self.backend = Backend.PIPER
+        # Coqui is disabled for now, use Piper instead
+        self.backend = Backend.PIPER if backend == Backend.COQUI else backend
+        self.backend_options = backend_options or {}
+        self.thread_budget = thread_budget
         self.model = model
         self.vocoder = vocoder
+
+        if max_chars is None:
+            max_chars = MAX_CHARS_MODEL.get(model, MAX_CHARS_BACKEND.get(self.backend, 0))
+        self.max_chars = max_chars
+
+        self.initialized = False
+        self.warm_up_time = 0.0
+        self._initialize_thread: Optional[threading.Thread] = None
+        self._initialize_error: Optional[Exception] = None
         # self.silence_length = 100
         # self.silence_threshold = -60
         # self.pause_post_regular =
@@ -72,6 +139,9 @@ class TTS_Processor:
         self.pause_newline = 250
         self.pause_colon = 100
 
+        # Number of retries for known sporadic model errors
+        self.max_retries = 3
+
         self.preferred_speakers = preferred_speakers or []
 
         # List of models that need segments ending on a fullstop to avoid synthensizing errors
@@ -94,6 +164,10 @@ class TTS_Processor:
             os.path.join("data", "replace.json"),
             os.path.join("data", f"replace_{lang}.json"),
         ]:
+            # Not every language has its own replacements
+            if not os.path.exists(os.path.join(source_dir, file_path)):
+                continue
+
             with open(
                 os.path.join(source_dir, file_path), "r", encoding="utf-8"
             ) as file:
@@ -106,14 +180,23 @@ class TTS_Processor:
     #     self.synthesizer = None
     #     gc.collect()
 
-    def initialize(self) -> None:
+    def initialize(self, warm_up: bool = False) -> None:
         """
         Initializes the text-to-speech (TTS) system, downloads the specified models, and populates the speaker list.
 
+        :param warm_up: Run dummy inputs through the voice after loading, so the first actual item is synthesized at full speed (see warm_up()).
+        :type warm_up: bool
+
         :return: None
         """
         log(LOG_TYPE.INFO, f"Initializing speech synthesizer.")
+
+        # Backends are imported on first use only, as they are slow to load
         if self.backend == Backend.COQUI:
+            import TTS  # type: ignore
+            from TTS.utils.manage import ModelManager  # type: ignore
+            from TTS.utils.synthesizer import Synthesizer  # type: ignore
+
             if self.model == "":
                 self.model = "tts_models/en/vctk/vits"
             models_dir = Path(TTS.__file__).resolve().parent / ".models.json"
@@ -128,6 +211,9 @@ class TTS_Processor:
             config_path = config_path or ""
             vocoder_config_path = vocoder_config_path or ""
 
+            if self.thread_budget:
+                self._apply_torch_thread_budget(self.thread_budget)
+
             with contextlib.redirect_stdout(None):
                 self.synthesizer = Synthesizer(
                     tts_checkpoint=model_path,
@@ -146,6 +232,10 @@ class TTS_Processor:
                         self.synthesizer.tts_model.speaker_manager.name_to_id.keys()
                     )
         elif self.backend == Backend.PIPER:
+            from piper.download import find_voice, get_voices  # type: ignore
+
+            from .piper_loader import load_piper_voice
+
             download_dir = "/usr/share/piper-voices/"
             update_voices = False
             # model_path = Path(model)
@@ -162,41 +252,146 @@ class TTS_Processor:
             dir = Path(file).parent
             model, config = find_voice(self.model, [dir])
 
-            self.voice = PiperVoice.load(model, config_path=config, use_cuda=False)
+            self.voice = load_piper_voice(model, config_path=config, use_cuda=False, thread_budget=self.thread_budget, **self.backend_options)
 
             # Load config JSON
             with open(config, "r", encoding="utf-8") as config_file:
                 config_dict = json.load(config_file)
 
             self.voice_speakers = list(config_dict["speaker_id_map"])
+        elif self.backend == Backend.FAKE:
+            from .fake_voice import FakeVoice
+
+            self.voice = FakeVoice(**self.backend_options)
+            self.voice_speakers = list(self.voice.speaker_id_map)
+
+        self.initialized = True
+
+        if warm_up:
+            self.warm_up()
+
+    def _apply_torch_thread_budget(self, thread_budget: ThreadBudget) -> None:
+        """
+        Apply the thread budget to torch (used by Coqui TTS).
 
-    # def _find_and_break(self, tts_items: list[TTS_Item], break_at: list[str], break_after: int) -> list[TTS_Item]:
-    #     final_items = []
+        :param thread_budget: The thread budget to apply.
+        :type thread_budget: ThreadBudget
 
-    #     for tts_item in tts_items:
-    #         line = tts_item.text
-    #         found = False
+        :return: None
+        """
+        import torch  # type: ignore
+
+        thread_budget = thread_budget.limited()
+
+        if thread_budget.intra_op > 0:
+            torch.set_num_threads(thread_budget.intra_op)
+        if thread_budget.inter_op > 0:
+            try:
+                torch.set_num_interop_threads(thread_budget.inter_op)
+            except RuntimeError:
+                # Can only be set once, before any inter-op parallel work has started
+                log(LOG_TYPE.WARNING, f"Number of torch inter-op threads could not be set, already in use.")
+
+    def warm_up(self, texts: Optional[list[str]] = None) -> float:
+        """
+        Run dummy inputs through the selected voice. The first inference runs are much slower than later ones (lazy memory allocation and kernel selection in onnxruntime/torch), so this moves that cost out of the first actual item.
+
+        :param texts: Texts to synthesize, defaults to WARM_UP_TEXTS (inputs of different lengths).
+        :type texts: Optional[list[str]]
+
+        :return: The time needed for warming up in seconds (also stored as warm_up_time).
+        :rtype: float
+        """
+        start = time.perf_counter()
 
-    #         if len(line) > break_after:
-    #             for b in break_at:
-    #                 find = line.rfind(b, 0, break_after)
+        for text in texts or WARM_UP_TEXTS:
+            self.synthesize_tts_item(TTS_Item(text, 0))
 
-    #                 if find >= 0:
-    #                     final_items.append(TTS_Item(line[:find].strip(), tts_item.speaker, tts_item.pause_pre, tts_item.pause_post, tts_item.strip_silence))
-    #                     final_items += self._find_and_break([TTS_Item(line[find + 1:].strip(), tts_item.speaker, tts_item.pause_pre,
-    #                                                         tts_item.pause_post, tts_item.strip_silence)], break_at, break_after)
-    #                     found = True
-    #                     break
+        self.warm_up_time = time.perf_counter() - start
 
-    #             if not found:
-    #                 # No save spot for breaking found, do a hard break
-    #                 final_items.append(TTS_Item(line[:break_after].strip(), tts_item.speaker, tts_item.pause_pre, tts_item.pause_post, tts_item.strip_silence))
-    #                 final_items += self._find_and_break([TTS_Item(line[break_after:].strip(), tts_item.speaker, tts_item.pause_pre,
-    #                                                     tts_item.pause_post, tts_item.strip_silence)], break_at, break_after)
-    #         else:
-    #             final_items.append(TTS_Item(line.strip(), tts_item.speaker, tts_item.pause_pre, tts_item.pause_post, tts_item.strip_silence))
+        log(LOG_TYPE.INFO, f"Speech synthesizer warmed up in {self.warm_up_time:.2f}s.")
 
-    #     return final_items
+        return self.warm_up_time
+
+    def initialize_async(self, warm_up: bool = False) -> None:
+        """
+        Starts initializing the TTS system in a background thread, so loading the model can overlap with other work like preprocessing.
+        Call wait_initialized() before synthesizing.
+
+        :param warm_up: Also warm up the voice in the background (see warm_up()).
+        :type warm_up: bool
+
+        :return: None
+        """
+        if self.initialized or self._initialize_thread:
+            return
+
+        self._initialize_thread = threading.Thread(target=self._initialize_background, args=(warm_up,), name='tts_processor_initialize', daemon=True)
+        self._initialize_thread.start()
+
+    def _initialize_background(self, warm_up: bool) -> None:
+        try:
+            self.initialize(warm_up)
+        except Exception as e:
+            # Raised in the calling thread by wait_initialized()
+            self._initialize_error = e
+
+    def wait_initialized(self) -> None:
+        """
+        Waits for a background initialization started by initialize_async() to finish, or initializes right away if none was started.
+
+        :return: None
+
+        :raises Exception: The exception raised while initializing in the background.
+        """
+        if self._initialize_thread:
+            self._initialize_thread.join()
+            self._initialize_thread = None
+
+            if self._initialize_error:
+                error = self._initialize_error
+                self._initialize_error = None
+                raise error
+        elif not self.initialized:
+            self.initialize()
+
+    def close(self) -> None:
+        """
+        Releases resources held for synthesizing. Nothing to release here, as the model is loaded in this process (see TTS_Synthesis_Worker.close()).
+
+        :return: None
+        """
+
+    def _find_and_break(self, tts_items: list[TTS_Item], break_at: list[str], break_after: int) -> list[TTS_Item]:
+        """
+        Break items longer than the given number of characters, preferring sentence and clause boundaries. Keeps per item latency and memory consumption of the models bounded.
+
+        :param tts_items: The list of TTS items to break.
+        :type tts_items: list[TTS_Item]
+
+        :param break_at: Regular expressions of breaking points in order of preference.
+        :type break_at: list[str]
+
+        :param break_after: Maximum number of characters per item, 0 disables breaking.
+        :type break_after: int
+
+        :return: A list of TTS items resulting from the breaking.
+        :rtype: list[TTS_Item]
+        """
+        final_items: list[TTS_Item] = []
+
+        for tts_item in tts_items:
+            if break_after <= 0 or len(tts_item.text) <= break_after:
+                final_items.append(tts_item)
+                continue
+
+            chunks = split_text(tts_item.text, break_after, break_at)
+
+            for idx, chunk in enumerate(chunks):
+                # Keep the minimum length on the last part only
+                final_items.append(TTS_Item(chunk, tts_item.speaker_idx, tts_item.length if idx == len(chunks) - 1 else 0))
+
+        return final_items
 
     def _de_thorsten_tacotron2_DDC_tweaks(self, tts_item: TTS_Item) -> TTS_Item:
         """
@@ -318,10 +513,8 @@ class TTS_Processor:
             # tts_items = self._break_single(tts_items, r'[\.!\?]\s', keep=True)
             # tts_items = self.break_single(tts_items, '…')
 
-            # Break items if too long (memory consumption)
-            # TODO: disabled for now as recent versions of TTS don’t seem to leak memory that much
-            # tts_items = self.find_and_break(tts_items, [
-            #                                 '. ', '! ', '? ', ': ', ';', ') ', '] ', '} ', ', ', ' '], self.max_chars)
+            # Break items if too long (memory consumption and latency)
+            tts_items = self._find_and_break(tts_items, SENTENCE_BREAKS, self.max_chars)
 
             # For quotes, use a secondary speaker by shifting the current index up by 1
             # TODO: disabled for now because it breaks the flow too much
@@ -681,13 +874,17 @@ class TTS_Processor:
 
         :return: numpy array of synthesized audio
         :rtype: np.ndarray
+
+        :raises SynthesisError: If synthesizing fails.
         """
 
         numpy_wav = np.array([0], dtype=np.float32)
 
         if tts_item.text:
             # Run in a loop to bypass https://github.com/coqui-ai/TTS/discussions/2516
+            attempts = 0
             while True:
+                attempts += 1
                 try:
                     speaker = ""
 
@@ -727,7 +924,8 @@ class TTS_Processor:
                                 text=tts_item.text,
                                 speaker_name=speaker,
                             )
-                    elif self.backend == Backend.PIPER:
+                    elif self.backend in (Backend.PIPER, Backend.FAKE):
+                        # The fake voice mimics the Piper voice interface
                         speaker_id = None
 
                         length_scale = None
@@ -769,13 +967,15 @@ class TTS_Processor:
                         numpy_array /= np.iinfo(np.int16).max
 
                 except IndexError as e:
+                    if attempts > self.max_retries:
+                        raise SynthesisError(tts_item, attempts, f"IndexError: {e}")
                     log(
                         LOG_TYPE.WARNING,
                         f"IndexError bug encountered, trying again.{bcolors.ENDC}",
                     )
                     continue
                 except Exception as e:
-                    raise Exception(f'Error synthesizing "{tts_item.text}: {e}".')
+                    raise SynthesisError(tts_item, attempts, str(e))
                 else:
                     # numpy_wav = np.asarray(wav, dtype=np.float32)
                     numpy_wav = numpy_array
@@ -801,3 +1001,5 @@ class TTS_Processor:
             return int(self.synthesizer.output_sample_rate)
         elif self.backend == Backend.PIPER:
             return 22050
+        elif self.backend == Backend.FAKE:
+            return self.voice.sample_rate
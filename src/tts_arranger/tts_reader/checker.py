@@ -1,17 +1,33 @@
+import re
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from .checker_profile import Checker_Profile  # type: ignore
 
 
 @dataclass
 class Element():
+    """
+    An HTML element as seen by the checkers. Attributes, parent and index are only needed by selector conditions (see ConditionSelector).
+    """
     name: str = ''
     id = ''
     classes: list[str] = field(default_factory=list)
+    attrs: dict[str, str] = field(default_factory=dict)
+
+    # The enclosing element and the index among the elements within it (0 for the first child)
+    parent: Optional['Element'] = field(default=None, repr=False, compare=False)
+    index: int = 0
 
 
 class Condition(ABC):
+    # Conditions only depending on the element's name, ID and classes, their results can be memoized (see CheckerIndex)
+    signature_only = False
+
     def __init__(self, arg: str):
         self.arg = arg
 
@@ -21,20 +37,187 @@ class Condition(ABC):
 
 
 class ConditionName(Condition):
+    signature_only = True
+
     def check(self, elem: Element) -> bool:
         return elem.name == self.arg
 
 
 class ConditionClass(Condition):
+    signature_only = True
+
     def check(self, elem: Element) -> bool:
         return self.arg in elem.classes
 
 
 class ConditionID(Condition):
+    signature_only = True
+
     def check(self, elem: Element) -> bool:
         return self.arg == elem.id
 
 
+_SELECTOR_COMBINATOR = re.compile(r'\s*>\s*|\s+')
+
+_SELECTOR_SIMPLE = re.compile(r'''
+    (?P<tag>[\w-]+|\*)
+    | \.(?P<cls>[\w-]+)
+    | \#(?P<id>[\w-]+)
+    | \[\s*(?P<attr>[^\s\]~|^$*=]+)\s*(?:(?P<op>[~|^$*]?=)\s*(?P<value>"[^"]*"|'[^']*'|[^\s\]]*)\s*)?\]
+    | (?P<pseudo>:first-child)
+''', re.VERBOSE)
+
+_ATTRIBUTE_OPERATORS: dict[Optional[str], Callable[[str, str], bool]] = {
+    None: lambda actual, value: True,
+    '=': lambda actual, value: actual == value,
+    '~=': lambda actual, value: value in actual.split(),
+    '|=': lambda actual, value: actual == value or actual.startswith(value + '-'),
+    '^=': lambda actual, value: bool(value) and actual.startswith(value),
+    '$=': lambda actual, value: bool(value) and actual.endswith(value),
+    '*=': lambda actual, value: bool(value) and value in actual,
+}
+
+
+class _Compound():
+    # A sequence of simple selectors without combinator, like "p.note[lang]:first-child"
+    __slots__ = ('tag', 'id', 'classes', 'attributes', 'first_child')
+
+    def __init__(self) -> None:
+        self.tag: Optional[str] = None
+        self.id: Optional[str] = None
+        self.classes: tuple[str, ...] = ()
+        self.attributes: tuple[tuple[str, Optional[str], str], ...] = ()
+        self.first_child = False
+
+    def matches(self, elem: Element) -> bool:
+        if self.tag is not None and elem.name != self.tag:
+            return False
+        if self.id is not None and elem.id != self.id:
+            return False
+        if self.first_child and elem.index != 0:
+            return False
+        for elem_class in self.classes:
+            if elem_class not in elem.classes:
+                return False
+        for name, operator, value in self.attributes:
+            actual = elem.attrs.get(name)
+            if actual is None or not _ATTRIBUTE_OPERATORS[operator](actual, value):
+                return False
+        return True
+
+
+class ConditionSelector(Condition):
+    """
+    Matches elements by a CSS selector, which is compiled once when the condition is created.
+    Supported are type ("p"), universal ("*"), class (".note"), ID ("#title") and attribute selectors ("[lang]", "[lang=en]", "[class~=x]", "[lang|=en]", "[href^=x]", "[href$=x]", "[href*=x]"), ":first-child", and the descendant (" ") and child (">") combinators.
+    Several selectors are separated by commas, attribute names may contain a prefix like "epub:type".
+
+    :raises ValueError: If the selector is invalid or not supported.
+    """
+
+    def __init__(self, arg: str):
+        super().__init__(arg)
+
+        # For each selector, its compounds from the matched element outwards, with the combinator to the next (enclosing) one
+        self.selectors: list[tuple[tuple[_Compound, str], ...]] = [self._compile(selector.strip()) for selector in arg.split(',')]
+
+        self.signature_only = all(len(selector) == 1 and not selector[0][0].attributes and not selector[0][0].first_child for selector in self.selectors)
+
+    @staticmethod
+    def _compile(selector: str) -> tuple[tuple[_Compound, str], ...]:
+        compounds: list[tuple[_Compound, str]] = []
+        compound: Optional[_Compound] = None
+        combinator = ''
+        position = 0
+
+        while position < len(selector):
+            match = _SELECTOR_COMBINATOR.match(selector, position)
+
+            if match:
+                if compound is None:
+                    break
+                compounds.append((compound, combinator))
+                combinator = '>' if '>' in match.group() else ' '
+                compound = None
+                position = match.end()
+                continue
+
+            match = _SELECTOR_SIMPLE.match(selector, position)
+
+            if not match:
+                break
+
+            compound = compound or _Compound()
+            position = match.end()
+
+            if match['tag']:
+                compound.tag = None if match['tag'] == '*' else match['tag'].lower()
+            elif match['cls']:
+                compound.classes += (match['cls'],)
+            elif match['id']:
+                compound.id = match['id']
+            elif match['attr']:
+                compound.attributes += ((match['attr'].lower(), match['op'], (match['value'] or '').strip('\'"')),)
+            else:
+                compound.first_child = True
+
+        if compound is None or position < len(selector):
+            raise ValueError(f'Invalid or unsupported selector "{selector}" at position {position}')
+
+        compounds.append((compound, combinator))
+        compounds.reverse()
+
+        return tuple(compounds)
+
+    @property
+    def index_keys(self) -> Optional[list[tuple[str, str]]]:
+        """
+        Keys of elements the selector can match, by kind ("id", "class" or "name"), for indexing (see CheckerIndex).
+
+        :return: One key per selector, None if any selector may match elements of any name, ID and classes.
+        :rtype: Optional[list[tuple[str, str]]]
+        """
+        keys: list[tuple[str, str]] = []
+
+        for selector in self.selectors:
+            compound = selector[0][0]
+
+            if compound.id is not None:
+                keys.append(('id', compound.id))
+            elif compound.classes:
+                keys.append(('class', compound.classes[0]))
+            elif compound.tag is not None:
+                keys.append(('name', compound.tag))
+            else:
+                return None
+
+        return keys
+
+    def check(self, elem: Element) -> bool:
+        return any(self._matches(selector, 0, elem) for selector in self.selectors)
+
+    def _matches(self, selector: tuple[tuple[_Compound, str], ...], position: int, elem: Element) -> bool:
+        compound, combinator = selector[position]
+
+        if not compound.matches(elem):
+            return False
+
+        if position + 1 == len(selector):
+            return True
+
+        if combinator == '>':
+            return elem.parent is not None and self._matches(selector, position + 1, elem.parent)
+
+        ancestor = elem.parent
+
+        while ancestor is not None:
+            if self._matches(selector, position + 1, ancestor):
+                return True
+            ancestor = ancestor.parent
+
+        return False
+
+
 class CHECKER_SIGNAL(Enum):
     NO_SIGNAL = auto()
     IGNORE = auto()
@@ -47,10 +230,11 @@ class CHECK_SPEAKER_RESULT(Enum):
     # IGNORE = auto()
 
 
-@dataclass
+@dataclass(frozen=True)
 class CheckerItemProperties():
     """
-    Defines the properties for a TTS item to be generated. If pause_after is set, a pause item will be generated as well after the current item
+    Defines the properties for a TTS item to be generated. If pause_after is set, a pause item will be generated as well after the current item.
+    Immutable, as properties are shared between checker results, use dataclasses.replace() for modified properties.
     """
     speaker_idx: int = 0
     pause_after: int = 0
@@ -104,3 +288,109 @@ class Checker():
         if ret_total:
             return CHECK_SPEAKER_RESULT.MATCHED, self.signal, self.properties
         return CHECK_SPEAKER_RESULT.NOT_MATCHED, self.signal, None
+
+
+class CheckerIndex():
+    """
+    A list of checkers compiled for fast lookup: instead of checking every checker for every element, only checkers with a condition on the element's name, ID or one of its classes are checked.
+    Selectors are indexed by the name, ID or a class of the element they match (like "p" for "div.chapter > p").
+    Results are memoized per element signature (name, ID and classes), so recurring elements are looked up only once. Memoizing is disabled if any condition depends on more than the signature.
+    """
+
+    # Maximum number of memoized element signatures, the memo is cleared when exceeded
+    CACHE_SIZE = 4096
+
+    NO_MATCH: tuple[CHECK_SPEAKER_RESULT, CHECKER_SIGNAL, Optional[CheckerItemProperties]] = (CHECK_SPEAKER_RESULT.NOT_MATCHED, CHECKER_SIGNAL.NO_SIGNAL, None)
+
+    def __init__(self, checkers: list[Checker]):
+        """
+        :param checkers: The checkers in priority order, the first matching checker is returned.
+        :type checkers: list[Checker]
+        """
+        self.checkers = list(checkers)
+
+        self._by_name: dict[str, list[int]] = {}
+        self._by_id: dict[str, list[int]] = {}
+        self._by_class: dict[str, list[int]] = {}
+
+        # Checkers with custom conditions can't be indexed, they are always checked
+        self._unindexed: list[int] = []
+
+        indexes = {'name': self._by_name, 'id': self._by_id, 'class': self._by_class}
+
+        for priority, checker in enumerate(self.checkers):
+            for condition in checker.conditions:
+                if isinstance(condition, ConditionName):
+                    self._by_name.setdefault(condition.arg, []).append(priority)
+                elif isinstance(condition, ConditionID):
+                    self._by_id.setdefault(condition.arg, []).append(priority)
+                elif isinstance(condition, ConditionClass):
+                    self._by_class.setdefault(condition.arg, []).append(priority)
+                elif isinstance(condition, ConditionSelector) and condition.index_keys is not None:
+                    for kind, key in condition.index_keys:
+                        indexes[kind].setdefault(key, []).append(priority)
+                else:
+                    self._unindexed.append(priority)
+
+        # Other conditions may depend on more than the element signature, like selectors on ancestors or attributes
+        self._memoize = all(condition.signature_only for checker in self.checkers for condition in checker.conditions)
+
+        # Memoized results with the priority of the matching checker (-1 for no match)
+        self._cache: dict[tuple, tuple[int, tuple[CHECK_SPEAKER_RESULT, CHECKER_SIGNAL, Optional[CheckerItemProperties]]]] = {}
+
+        # Records lookups and evaluations if set (see Checker_Profile)
+        self.profile: Optional['Checker_Profile'] = None
+
+    def lookup(self, elem: Element) -> tuple[CHECK_SPEAKER_RESULT, CHECKER_SIGNAL, Optional[CheckerItemProperties]]:
+        """
+        Get the result of the first checker matching an element, same as calling determine() of each checker in order.
+
+        :param elem: an HTML Element object
+        :type elem: Element
+
+        :return: a tuple consisting of a CHECK_SPEAKER_RESULT object, a CHECKER_SIGNAL object, and an optional CheckerItemProperties object
+        :rtype: tuple[CHECK_SPEAKER_RESULT, CHECKER_SIGNAL, Optional[CheckerItemProperties]]
+        """
+        key = (elem.name, elem.id, frozenset(elem.classes))
+
+        if self._memoize:
+            cached = self._cache.get(key)
+
+            if cached is not None:
+                if self.profile is not None:
+                    self.profile.record_lookup(cached[0], elem, memoized=True)
+                return cached[1]
+
+        candidates = set(self._unindexed)
+        candidates.update(self._by_name.get(elem.name, ()))
+        candidates.update(self._by_id.get(elem.id, ()))
+
+        for elem_class in elem.classes:
+            candidates.update(self._by_class.get(elem_class, ()))
+
+        result = self.NO_MATCH
+        matched_priority = -1
+
+        # Checkers without a condition matching the element can't match, determine() decides on the rest
+        for priority in sorted(candidates):
+            if self.profile is None:
+                checker_result = self.checkers[priority].determine(elem)
+            else:
+                start = time.perf_counter()
+                checker_result = self.checkers[priority].determine(elem)
+                self.profile.record_evaluation(priority, time.perf_counter() - start)
+
+            if checker_result[0] != CHECK_SPEAKER_RESULT.NOT_MATCHED:
+                result = checker_result
+                matched_priority = priority
+                break
+
+        if self.profile is not None:
+            self.profile.record_lookup(matched_priority, elem)
+
+        if self._memoize:
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = (matched_priority, result)
+
+        return result
@@ -0,0 +1,163 @@
+from dataclasses import dataclass, field
+
+from .checker import CHECKER_SIGNAL, Checker, Element  # type: ignore
+
+# Number of matched elements kept per checker as samples
+SAMPLES_COUNT = 3
+
+# Number of enclosing elements shown for samples
+SAMPLE_ANCESTORS = 2
+
+
+def describe_element(elem: Element) -> str:
+    """
+    Get a short selector-like description of an element with its closest ancestors, like "section > div.chapter > p#intro".
+
+    :param elem: The element.
+    :type elem: Element
+
+    :return: The description.
+    :rtype: str
+    """
+    parts = []
+    current = elem
+
+    while current is not None and len(parts) <= SAMPLE_ANCESTORS:
+        parts.append(current.name + (f'#{current.id}' if current.id else '') + ''.join(f'.{elem_class}' for elem_class in current.classes))
+        current = current.parent
+
+    return ' > '.join(reversed(parts))
+
+
+def describe_checker(checker: Checker) -> str:
+    """
+    Get a short description of a checker, its conditions and what it results in, like "Name=p Class=chapter -> NEW_CHAPTER speaker 1 pause 1000".
+
+    :param checker: The checker.
+    :type checker: Checker
+
+    :return: The description.
+    :rtype: str
+    """
+    conditions = ' '.join(f'{type(condition).__name__.removeprefix("Condition")}={condition.arg}' for condition in checker.conditions) or '(no conditions)'
+
+    if checker.signal == CHECKER_SIGNAL.IGNORE:
+        return f'{conditions} -> IGNORE'
+
+    outcome = f'{checker.signal.name} ' if checker.signal != CHECKER_SIGNAL.NO_SIGNAL else ''
+
+    if checker.properties:
+        outcome += f'speaker {checker.properties.speaker_idx} pause {checker.properties.pause_after}'
+
+    return f'{conditions} -> {outcome.strip()}'
+
+
+@dataclass
+class Checker_Stats():
+    """
+    Profiling statistics of a single checker.
+
+    :param matches: Number of elements the checker decided on, as the first matching checker.
+    :type matches: int
+
+    :param evaluated: Number of elements the checker was evaluated for (elements looked up from memoized results excluded).
+    :type evaluated: int
+
+    :param seconds: Time spent evaluating the checker in seconds.
+    :type seconds: float
+
+    :param samples: Descriptions of the first matched elements (see describe_element()).
+    :type samples: list[str]
+    """
+    matches: int = 0
+    evaluated: int = 0
+    seconds: float = 0
+    samples: list[str] = field(default_factory=list)
+
+
+class Checker_Profile:
+    """
+    Records which checkers match and how much time they take while converting (see TTS_HTML_Converter), for reordering and pruning checkers files.
+    Checkers are identified by their priority (index in the converter's list of checkers). Statistics are accumulated over all converted documents.
+    """
+
+    def __init__(self) -> None:
+        self.stats: dict[int, Checker_Stats] = {}
+
+        # Elements looked up, those without matching checker and those looked up from memoized results
+        self.elements = 0
+        self.unmatched = 0
+        self.memoized = 0
+
+    def record_evaluation(self, priority: int, seconds: float) -> None:
+        """
+        Record evaluating a checker for an element.
+
+        :param priority: The checker's priority.
+        :type priority: int
+
+        :param seconds: Time spent in seconds.
+        :type seconds: float
+
+        :return: None
+        """
+        stats = self.stats.setdefault(priority, Checker_Stats())
+        stats.evaluated += 1
+        stats.seconds += seconds
+
+    def record_lookup(self, priority: int, elem: Element, memoized: bool = False) -> None:
+        """
+        Record the result of looking up an element.
+
+        :param priority: Priority of the matching checker, -1 if no checker matched.
+        :type priority: int
+
+        :param elem: The element.
+        :type elem: Element
+
+        :param memoized: If the result was memoized, so no checkers were evaluated.
+        :type memoized: bool
+
+        :return: None
+        """
+        self.elements += 1
+
+        if memoized:
+            self.memoized += 1
+
+        if priority < 0:
+            self.unmatched += 1
+            return
+
+        stats = self.stats.setdefault(priority, Checker_Stats())
+        stats.matches += 1
+
+        if len(stats.samples) < SAMPLES_COUNT:
+            stats.samples.append(describe_element(elem))
+
+    def report(self, checkers: list[Checker]) -> str:
+        """
+        Get a human readable report of the statistics.
+
+        :param checkers: The checkers of the converter, in priority order.
+        :type checkers: list[Checker]
+
+        :return: The report, one line per checker in priority order and a summary.
+        :rtype: str
+        """
+        total_seconds = sum(stats.seconds for stats in self.stats.values())
+
+        lines = [f'Checker profile: {self.elements} elements, {self.elements - self.unmatched} matched, {self.memoized} memoized, {total_seconds * 1000:.1f} ms evaluating checkers']
+        lines.append(f'{"#":>4} {"matches":>8} {"evaluated":>10} {"ms":>8}  checker  [samples]')
+
+        for priority, checker in enumerate(checkers):
+            stats = self.stats.get(priority, Checker_Stats())
+            samples = ', '.join(stats.samples)
+            lines.append(f'{priority + 1:>4} {stats.matches:>8} {stats.evaluated:>10} {stats.seconds * 1000:>8.2f}  {describe_checker(checker)}  [{samples}]')
+
+        unused = [str(priority + 1) for priority in range(len(checkers)) if priority not in self.stats or self.stats[priority].matches == 0]
+
+        if unused:
+            lines.append(f'Never matched: {", ".join(unused)}')
+
+        return '\n'.join(lines)
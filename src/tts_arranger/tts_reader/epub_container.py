@@ -0,0 +1,230 @@
+import codecs
+import posixpath
+import xml.etree.ElementTree as ElementTree
+import zipfile
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import unquote
+
+NAMESPACES = {
+    'CONTAINER': 'urn:oasis:names:tc:opendocument:xmlns:container',
+    'OPF': 'http://www.idpf.org/2007/opf',
+    'DC': 'http://purl.org/dc/elements/1.1/',
+}
+
+DOCUMENT_MEDIA_TYPE = 'application/xhtml+xml'
+
+
+def decode_document(content: bytes) -> str:
+    """
+    Decode an EPUB content document, which is UTF-8 or UTF-16 with byte order mark.
+
+    :param content: The raw content.
+    :type content: bytes
+
+    :return: The decoded content, undecodable bytes are replaced.
+    :rtype: str
+    """
+    if content.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return content.decode('utf-16')
+    return content.decode('utf-8-sig', errors='replace')
+
+
+@dataclass(frozen=True)
+class EPUB_Item():
+    """
+    An item of the EPUB manifest.
+
+    :param id: The item ID.
+    :type id: str
+
+    :param name: Path of the item within the archive.
+    :type name: str
+
+    :param media_type: The media type, like "application/xhtml+xml".
+    :type media_type: str
+
+    :param properties: The item properties, like "nav" or "cover-image".
+    :type properties: tuple[str, ...]
+    """
+    id: str
+    name: str
+    media_type: str
+    properties: tuple[str, ...] = ()
+
+
+class EPUB_Container:
+    """
+    Lightweight access to an EPUB archive. Only the container and package (OPF) files are parsed when opening, items are read (and decompressed) on demand.
+    Can be used as a context manager, closing the archive at the end.
+    """
+
+    def __init__(self, filename: str) -> None:
+        """
+        Opens the archive and reads the metadata, manifest and spine.
+
+        :param filename: The filename of the EPUB file.
+        :type filename: str
+
+        :return: None
+
+        :raises ValueError: If the file has no package file.
+        """
+        self.filename = filename
+        self.archive = zipfile.ZipFile(filename, 'r')
+
+        # Manifest items by ID, in manifest order
+        self.manifest: dict[str, EPUB_Item] = {}
+
+        # IDs of the items in reading order
+        self.spine: list[str] = []
+
+        # Metadata values with their attributes by namespace and name (see get_metadata())
+        self.metadata: dict[str, dict[Optional[str], list[tuple[Optional[str], dict]]]] = {}
+
+        try:
+            self._load_package(self._find_package())
+        except (KeyError, ElementTree.ParseError) as e:
+            self.close()
+            raise ValueError(f'"{filename}" is not a valid EPUB file: {e}')
+
+    def __enter__(self) -> 'EPUB_Container':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the archive.
+
+        :return: None
+        """
+        self.archive.close()
+
+    def _find_package(self) -> str:
+        container = ElementTree.fromstring(self.archive.read('META-INF/container.xml'))
+
+        for root_file in container.iter(f'{{{NAMESPACES["CONTAINER"]}}}rootfile'):
+            if root_file.get('media-type') == 'application/oebps-package+xml':
+                return root_file.get('full-path', '')
+
+        raise KeyError('no package file in container')
+
+    def _load_package(self, package_name: str) -> None:
+        package = ElementTree.fromstring(self.archive.read(package_name))
+        package_dir = posixpath.dirname(package_name)
+        opf = NAMESPACES['OPF']
+
+        metadata = package.find(f'{{{opf}}}metadata')
+
+        if metadata is not None:
+            for elem in metadata:
+                if not isinstance(elem.tag, str):
+                    continue
+
+                namespace, _, tag = elem.tag[1:].rpartition('}')
+                name: Optional[str] = tag
+
+                if elem.tag == f'{{{opf}}}meta':
+                    # Named meta elements (EPUB 2) like "calibre:timestamp" are kept under their prefix, others (EPUB 3) under the OPF namespace without name
+                    name = elem.get('name')
+
+                    if name and ':' in name:
+                        namespace, name = name.split(':', 1)
+
+                self.metadata.setdefault(namespace, {}).setdefault(name, []).append((elem.text, dict(elem.attrib)))
+
+        manifest = package.find(f'{{{opf}}}manifest')
+
+        if manifest is not None:
+            for elem in manifest.iter(f'{{{opf}}}item'):
+                item_id = elem.get('id', '')
+                href = elem.get('href', '')
+
+                self.manifest[item_id] = EPUB_Item(
+                    item_id,
+                    posixpath.normpath(posixpath.join(package_dir, unquote(href))),
+                    elem.get('media-type', ''),
+                    tuple(elem.get('properties', '').split()),
+                )
+
+        spine = package.find(f'{{{opf}}}spine')
+
+        if spine is not None:
+            self.spine = [elem.get('idref', '') for elem in spine.iter(f'{{{opf}}}itemref')]
+
+    def get_metadata(self, namespace: str, name: Optional[str]) -> list[tuple[Optional[str], dict]]:
+        """
+        Get metadata values, like ebooklib's EpubBook.get_metadata().
+
+        :param namespace: The namespace, "DC", "OPF" or a namespace URI.
+        :type namespace: str
+
+        :param name: The name of the metadata, like "title". Meta elements without name (EPUB 3) are found with None in the "OPF" namespace.
+        :type name: Optional[str]
+
+        :return: The values with their attributes.
+        :rtype: list[tuple[Optional[str], dict]]
+        """
+        return self.metadata.get(NAMESPACES.get(namespace, namespace), {}).get(name, [])
+
+    @property
+    def documents(self) -> list[EPUB_Item]:
+        """
+        The content documents in reading order (spine order), followed by documents missing in the spine in manifest order.
+
+        :rtype: list[EPUB_Item]
+        """
+        documents = [self.manifest[item_id] for item_id in dict.fromkeys(self.spine) if item_id in self.manifest and self.manifest[item_id].media_type == DOCUMENT_MEDIA_TYPE]
+        spine_ids = set(self.spine)
+
+        return documents + [item for item in self.manifest.values() if item.media_type == DOCUMENT_MEDIA_TYPE and item.id not in spine_ids]
+
+    def read(self, item: EPUB_Item) -> bytes:
+        """
+        Read the content of an item.
+
+        :param item: The item.
+        :type item: EPUB_Item
+
+        :return: The content, empty if the item is missing in the archive.
+        :rtype: bytes
+        """
+        try:
+            return self.archive.read(item.name)
+        except KeyError:
+            return b''
+
+    def read_document(self, item: EPUB_Item) -> str:
+        """
+        Read and decode a content document.
+
+        :param item: The document item.
+        :type item: EPUB_Item
+
+        :return: The decoded content.
+        :rtype: str
+        """
+        return decode_document(self.read(item))
+
+    def get_cover(self) -> Optional[EPUB_Item]:
+        """
+        Get the cover image: the image declared as cover (EPUB 3 "cover-image" property or EPUB 2 cover meta element), otherwise the first image.
+
+        :return: The cover image item, None if there are no images.
+        :rtype: Optional[EPUB_Item]
+        """
+        images = [item for item in self.manifest.values() if item.media_type.startswith('image/')]
+
+        for image in images:
+            if 'cover-image' in image.properties:
+                return image
+
+        for _, attributes in self.get_metadata('OPF', 'cover'):
+            image = self.manifest.get(attributes.get('content', ''))
+
+            if image and image.media_type.startswith('image/'):
+                return image
+
+        return images[0] if images else None
@@ -1,7 +1,8 @@
 import os
 from abc import ABC
-from typing import Callable, Optional
+from typing import Callable, Iterator, Optional
 
+from .. import TTS_Chapter  # type: ignore
 from .. import TTS_Project  # type: ignore
 
 
@@ -35,6 +36,24 @@ class TTS_Abstract_Reader(ABC):
         # Set filename as title
         self.title = os.path.splitext(os.path.basename(filename))[0]
 
+    def iter_chapters(self, filename: str, callback: Optional[Callable[[float], None]] = None) -> Iterator[TTS_Chapter]:
+        """
+        Read a file chapter by chapter, for synthesizing chapters while later ones are still being read (see TTS_Writer.synthesize_and_write()).
+        Project metadata (title, author etc.) is set before the iterator is returned, so it can be used for the output filename. Readers without support for this load the whole file first.
+
+        :param filename: The filename of the file.
+        :type filename: str
+
+        :param callback: The callback function for progress updates.
+        :type callback: Optional[Callable[[float], None]]
+
+        :return: Iterator over the chapters.
+        :rtype: Iterator[TTS_Chapter]
+        """
+        self.load(filename, callback)
+
+        return iter(list(self.project.tts_chapters))
+
     def load_raw(self, content: str, author: str = '', title: str = '', callback: Optional[Callable[[float], None]] = None) -> None:
         self.author = author or self.author
         self.title = title or self.title
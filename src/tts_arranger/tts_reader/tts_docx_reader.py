@@ -1,8 +1,6 @@
 
 from typing import Callable, Optional
 
-import mammoth  # type: ignore
-
 from .tts_html_based_reader import TTS_HTML_Based_Reader  # type: ignore
 
 
@@ -25,6 +23,8 @@ class TTS_Docx_Reader(TTS_HTML_Based_Reader):
         """
         super().load(filename, callback)
 
+        import mammoth  # type: ignore
+
         with open(filename, "rb") as docx_file:
             style_map = """
             p[style-name^='Heading'] => h1:fresh
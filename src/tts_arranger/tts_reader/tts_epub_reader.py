@@ -1,17 +1,51 @@
 import base64
 import datetime
 import json
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 from dateutil.parser import ParserError
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Callable, Iterator, Optional
 
-from bs4 import BeautifulSoup, PageElement  # type: ignore
 from dateutil.parser import parse  # type: ignore
-from ebooklib import ITEM_DOCUMENT, epub  # type: ignore
+from ebooklib import epub  # type: ignore
 
+from ..items.tts_chapter import TTS_Chapter  # type: ignore
+from ..items.tts_project import TTS_Project  # type: ignore
+from ..tts_html_converter import Checker, CheckerItemProperties, TTS_HTML_Converter  # type: ignore
+from .epub_container import EPUB_Container, EPUB_Item  # type: ignore
 from .tts_html_based_reader import TTS_HTML_Based_Reader  # type: ignore
 
+# Converter of a conversion worker process, built once from the reader's checkers (see _init_worker())
+_worker_converter: Optional[TTS_HTML_Converter] = None
+
+# EPUB file opened by a conversion worker process, documents are read by the workers themselves
+_worker_container: Optional[EPUB_Container] = None
+
+
+def _init_worker(checkers: list[Checker], default_properties: CheckerItemProperties, coalesce_text: bool) -> None:
+    global _worker_converter
+
+    _worker_converter = TTS_HTML_Converter(default_properties=default_properties, ignore_default_checkers=True, coalesce_text=coalesce_text)
+    _worker_converter.checkers = checkers
+
+
+def _convert_document(filename: str, item: Optional[EPUB_Item]) -> tuple[list[TTS_Chapter], str]:
+    # Convert a single document in a worker process, returns its chapters and the chapter title
+    global _worker_container
+
+    if item is None or _worker_converter is None:
+        return [], ""
+
+    if _worker_container is None or _worker_container.filename != filename:
+        if _worker_container:
+            _worker_container.close()
+        _worker_container = EPUB_Container(filename)
+
+    project = _worker_converter.convert_from_html(_worker_container.read_document(item))
+    return project.tts_chapters, _worker_converter.get_chapter_title()
+
 
 class TTS_EPUB_Reader(TTS_HTML_Based_Reader):
     """
@@ -49,24 +83,54 @@ class TTS_EPUB_Reader(TTS_HTML_Based_Reader):
                         pass
         return ""
 
-    def load(
-        self, filename: str, callback: Optional[Callable[[float], None]] = None
-    ) -> None:
+    def _convert_documents(self, container: EPUB_Container, documents: list[Optional[EPUB_Item]], workers: int) -> Iterator[tuple[list[TTS_Chapter], str]]:
         """
-        Load an EPUB file into the TTS_Project.
+        Convert the documents into the project of the HTML converter, in order. Documents are read from the archive right before converting them.
 
-        :param filename: The filename of the EPUB file.
-        :type filename: str
+        :param container: The opened EPUB file.
+        :type container: EPUB_Container
 
-        :param callback: The callback function for progress updates.
-        :type callback: Optional[Callable[[float], None]]
+        :param documents: The documents, None for documents to skip.
+        :type documents: list[Optional[EPUB_Item]]
 
-        :return: None
+        :param workers: Number of worker processes, 1 converts in this process. Always 1 when profiling the checkers, so all statistics are recorded by the same converter.
+        :type workers: int
+
+        :return: Iterator over the added chapters and the chapter title of each document, chapters are added right before being yielded.
+        :rtype: Iterator[tuple[list[TTS_Chapter], str]]
         """
-        book = epub.read_epub(filename)
+        project = self.html_converter.get_project()
+
+        if workers <= 1 or self.html_converter.checker_profile is not None:
+            for item in documents:
+                if item is None:
+                    yield [], ""
+                    continue
 
-        epub_items = list(book.get_items_of_type(ITEM_DOCUMENT))
+                added_chapters_count = self.html_converter.add_from_html(container.read_document(item))
+                yield project.tts_chapters[len(project.tts_chapters) - added_chapters_count:], self.html_converter.get_chapter_title()
+            return
+
+        # Documents are independent, each worker converts them with its own converter, while results are merged in document order
+        context = multiprocessing.get_context("spawn")
+        initargs = (self.html_converter.checkers, self.html_converter.default_properties, self.html_converter.coalesce_text)
+
+        with ProcessPoolExecutor(workers, context, initializer=_init_worker, initargs=initargs) as executor:
+            try:
+                for chapters, chapter_title in executor.map(_convert_document, [container.filename] * len(documents), documents):
+                    project.tts_chapters.extend(chapters)
+                    yield chapters, chapter_title
+            finally:
+                # Stopped early (see max_chapters), don't convert remaining documents
+                executor.shutdown(cancel_futures=True)
+
+    def _read_documents(self, book: EPUB_Container, callback: Optional[Callable[[float], None]], max_chapters: int, workers: int) -> Iterator[list[TTS_Chapter]]:
+        """
+        Convert the documents of an EPUB file into the project of the HTML converter.
 
+        :return: Iterator over the chapters of each converted document, with chapter titles set.
+        :rtype: Iterator[list[TTS_Chapter]]
+        """
         exclude_ids: list[str]
 
         source_dir = Path(__file__).resolve().parent.parent
@@ -79,61 +143,49 @@ class TTS_EPUB_Reader(TTS_HTML_Based_Reader):
         )
         print(f"Ignoring {exclude_ids_str}")
 
-        for i, epub_item in enumerate(epub_items):
-            if epub_item.id not in exclude_ids:
-                soup = BeautifulSoup(epub_item.content, "xml")
-
-                if isinstance(soup, PageElement):
-                    added_chapters_count = self.html_converter.add_from_html(str(soup))
-
-                    # If no chapter titel is found, use the first item
-                    # chapter_title = self.get_chapter_title(book.toc, epub_item.file_name)
-
-                    # Get chapter title by looking for the first header tag
-                    chapter_title = ""
-                    for header in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6"]):
-                        if header.text.strip():
-                            chapter_title = header.text.strip()
-                            break
-
-                    # If no header is found, use the first paragraph tag with a class like 'h1', 'h2', etc.
-                    if not chapter_title:
-                        for header in soup.find_all(["p"]):
-                            if header.text.strip():
-                                if header.has_attr("class"):
-                                    if header["class"][0].startswith("h"):
-                                        chapter_title = header.text.strip()
-                                        break
-
-                    # If no chapter title is found, use the title tag
-                    if not chapter_title:
-                        title_tag = soup.find("title")
-                        if title_tag:
-                            chapter_title = title_tag.text.strip()
-
-                    # TODO: Do this later
-                    # if not chapter_title:
-                    #     if len(self.html_converter.get_project().tts_chapters[-1].tts_items) > 0:
-                    #         chapter_title = self._smart_truncate(self.html_converter.get_project().tts_chapters[-1].tts_items[0].text).strip()
-
-                    # self.html_converter.get_project().tts_chapters[-1].title = chapter_title
-                    # Set title for added chapters
-                    for j in range(added_chapters_count):
-                        self.html_converter.get_project().tts_chapters[
-                            -1 - j
-                        ].title = chapter_title
+        epub_items = book.documents
+
+        chapters_count = 0
+
+        # Cover documents are identified as "cover", excluded documents are never decompressed
+        documents = [epub_item if ("cover" if "cover" in epub_item.properties else epub_item.id) not in exclude_ids else None for epub_item in epub_items]
+
+        # Items, chapters and the chapter title are found in a single pass
+        for i, (chapters, chapter_title) in enumerate(self._convert_documents(book, documents, workers)):
+            # TODO: Do this later
+            # if not chapter_title:
+            #     if len(self.html_converter.get_project().tts_chapters[-1].tts_items) > 0:
+            #         chapter_title = self._smart_truncate(self.html_converter.get_project().tts_chapters[-1].tts_items[0].text).strip()
+
+            # Set title for added chapters
+            for chapter in chapters:
+                chapter.title = chapter_title
+
+            if max_chapters:
+                chapters_count += sum(1 for chapter in chapters if self.html_converter.get_project().has_content(chapter))
+
+            yield chapters
 
             if callback is not None:
                 callback(100 / len(epub_items) * i)
 
-        self.project = self.html_converter.get_project()
-        self.project.clean_empty_chapters()
+            if max_chapters and chapters_count >= max_chapters:
+                # Later documents are not needed, skip parsing them
+                break
+
+        # Once for all documents
+        self.html_converter.write_profile_report()
 
+    def _set_metadata(self, book: EPUB_Container, project: TTS_Project) -> None:
+        """
+        Set title, author, date and cover image of the project from the metadata of an EPUB file.
+        """
         title = book.get_metadata("DC", "title")[0][0]
         author = book.get_metadata("DC", "creator")[0][0]
         date_metadata = book.get_metadata("DC", "date")
 
         date_str = ""
+        date = datetime.datetime(1, 1, 1)
 
         if len(date_metadata) > 0:
             date_str = book.get_metadata("DC", "date")[0][0]
@@ -156,12 +208,78 @@ class TTS_EPUB_Reader(TTS_HTML_Based_Reader):
                             else:
                                 break
 
-        for epub_item in book.get_items():
-            if epub_item.media_type.startswith("image/"):
-                if epub_item.content:
-                    self.project.image_bytes = base64.b64encode(epub_item.content)
-                    break
+        # Read only the cover, not all images
+        cover = book.get_cover()
+
+        if cover:
+            cover_content = book.read(cover)
+
+            if cover_content:
+                project.image_bytes = base64.b64encode(cover_content)
+
+        project.author = author
+        project.title = title
+        project.date = date
+
+    def load(
+        self, filename: str, callback: Optional[Callable[[float], None]] = None, max_chapters: int = 0, workers: int = 1
+    ) -> None:
+        """
+        Load an EPUB file into the TTS_Project.
+
+        :param filename: The filename of the EPUB file.
+        :type filename: str
+
+        :param callback: The callback function for progress updates.
+        :type callback: Optional[Callable[[float], None]]
+
+        :param max_chapters: Stop parsing after this number of (non-empty) chapters, for previews (see Preview.max_chapters). 0 parses the whole book.
+        :type max_chapters: int
+
+        :param workers: Number of processes converting documents in parallel, 1 converts them one after another in this process. The resulting project is the same.
+        :type workers: int
+
+        :return: None
+        """
+        # Only the package file is parsed here, documents and the cover image are read when needed
+        with EPUB_Container(filename) as book:
+            for _ in self._read_documents(book, callback, max_chapters, workers):
+                pass
+
+            self.project = self.html_converter.get_project()
+            self.project.clean_empty_chapters()
+
+            self._set_metadata(book, self.project)
+
+    def iter_chapters(
+        self, filename: str, callback: Optional[Callable[[float], None]] = None, max_chapters: int = 0, workers: int = 1
+    ) -> Iterator[TTS_Chapter]:
+        """
+        Read an EPUB file chapter by chapter, each document is converted when the chapters of the previous one have been consumed.
+        Project metadata is set before the iterator is returned, so it can be used for the output filename, chapters are not added to the project. Takes the same parameters as load().
+
+        :return: Iterator over the non-empty chapters.
+        :rtype: Iterator[TTS_Chapter]
+        """
+        book = EPUB_Container(filename)
+
+        try:
+            self._set_metadata(book, self.project)
+        except Exception:
+            book.close()
+            raise
+
+        return self._iter_documents(book, callback, max_chapters, workers)
+
+    def _iter_documents(self, book: EPUB_Container, callback: Optional[Callable[[float], None]], max_chapters: int, workers: int) -> Iterator[TTS_Chapter]:
+        # The container is closed when done
+        with book:
+            converter_project = self.html_converter.get_project()
+
+            for chapters in self._read_documents(book, callback, max_chapters, workers):
+                for chapter in chapters:
+                    if converter_project.has_content(chapter):
+                        yield chapter
 
-        self.project.author = author
-        self.project.title = title
-        self.project.date = date
+                # Chapters are handed over, don't keep them in the converter
+                converter_project.tts_chapters.clear()
@@ -1,7 +1,5 @@
 from typing import Callable, Optional
 
-from bs4 import BeautifulSoup, PageElement  # type: ignore
-
 from .. import TTS_Chapter  # type: ignore
 from .. import TTS_Project  # type: ignore
 from ..tts_html_converter import (CHECKER_SIGNAL, Checker,  # type: ignore
@@ -14,7 +12,7 @@ class TTS_HTML_Based_Reader(TTS_Abstract_Reader):
     Base class for converting an EPUB file into a TTS project.
     """
 
-    def __init__(self, custom_checkers: Optional[list[Checker]] = None, custom_checkers_files: Optional[list[str]] = None, ignore_default_checkers=False):
+    def __init__(self, custom_checkers: Optional[list[Checker]] = None, custom_checkers_files: Optional[list[str]] = None, ignore_default_checkers=False, coalesce_text=True, profile_checkers=False, profile_file: Optional[str] = None):
         """
         Initializes the reader and its HTML converter
 
@@ -26,6 +24,15 @@ class TTS_HTML_Based_Reader(TTS_Abstract_Reader):
 
         :param ignore_default_checkers: Defines if the default checkers should be ignored, defaults to False
         :type ignore_default_checkers: bool, optional
+
+        :param coalesce_text: Defines if text of the same speaker is coalesced into a single item while converting (see TTS_HTML_Converter), defaults to True
+        :type coalesce_text: bool, optional
+
+        :param profile_checkers: Defines if the checkers are profiled while converting, with a report after loading (see TTS_HTML_Converter), defaults to False
+        :type profile_checkers: bool, optional
+
+        :param profile_file: An optional file for the profiling report instead of printing it, enables profiling
+        :type profile_file: Optional[str], optional
         """
         super().__init__()
 
@@ -34,7 +41,7 @@ class TTS_HTML_Based_Reader(TTS_Abstract_Reader):
         self.last_signal = CHECKER_SIGNAL.NO_SIGNAL
         self.current_chapter: Optional[TTS_Chapter] = None
 
-        self.html_converter = TTS_HTML_Converter(custom_checkers=custom_checkers, custom_checkers_files=custom_checkers_files, ignore_default_checkers=ignore_default_checkers)
+        self.html_converter = TTS_HTML_Converter(custom_checkers=custom_checkers, custom_checkers_files=custom_checkers_files, ignore_default_checkers=ignore_default_checkers, coalesce_text=coalesce_text, profile_checkers=profile_checkers, profile_file=profile_file)
 
     def load_raw(self, content: str, author: str = '', title: str = '', callback: Optional[Callable[[float], None]] = None) -> None:
         """
@@ -56,14 +63,11 @@ class TTS_HTML_Based_Reader(TTS_Abstract_Reader):
         """
         super().load_raw(content, author, title, callback)
 
-        soup = BeautifulSoup(content, 'html.parser')
-
-        if isinstance(soup, PageElement):
-            project = self.html_converter.convert_from_html(str(soup))
+        project = self.html_converter.convert_from_html(content)
 
-            # Get titles from first chapter items
-            if isinstance(project, TTS_Project):
-                project.get_titles()
+        # Get titles from first chapter items
+        if isinstance(project, TTS_Project):
+            project.set_titles()
 
             self.project.merge_from_project(project)
 
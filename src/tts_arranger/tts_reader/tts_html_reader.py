@@ -1,8 +1,12 @@
+import os
+from typing import Callable, Iterator, Optional
 
-from typing import Callable, Optional
-
+from .. import TTS_Chapter  # type: ignore
 from .tts_html_based_reader import TTS_HTML_Based_Reader  # type: ignore
 
+# Number of characters read from the file at once
+CHUNK_SIZE = 1024 * 1024
+
 
 class TTS_HTML_Reader(TTS_HTML_Based_Reader):
     """
@@ -11,22 +15,61 @@ class TTS_HTML_Reader(TTS_HTML_Based_Reader):
 
     def load(self, filename: str, callback: Optional[Callable[[float], None]] = None) -> None:
         """
-        Load an HTML file into the TTS_Project.
+        Load an HTML file into the TTS_Project. The file is read and converted in chunks, so it is never kept in memory as a whole.
+
+        :param filename: The filename of the HTML file.
+        :type filename: str
+
+        :param callback: An optional function that takes a float between 0 and 100 representing the progress of the loading process as its argument. This can be used to periodically check on the loading progress. Defaults to None if not provided.
+        :type callback: Optional[Callable[[float], None]]
 
-        :param content: The HTML string.
-        :type content: str
+        :return: None
+        """
+        for chapter in self.iter_chapters(filename, callback):
+            self.project.tts_chapters.append(chapter)
 
-        :param author: The author of the HTML file (will be used as the author of the audiobook).
-        :type author: str
+    def iter_chapters(self, filename: str, callback: Optional[Callable[[float], None]] = None) -> Iterator[TTS_Chapter]:
+        """
+        Read an HTML file chapter by chapter, each chapter is yielded as soon as the next one starts. Project metadata is set before the iterator is returned, chapters are not added to the project.
 
-        :param title: The title of the HTML file (will be used as the title of the audiobook).
-        :type title: str
+        :param filename: The filename of the HTML file.
+        :type filename: str
 
-        :param callback: An optional function that takes a float between 0 and 1 representing the progress of the loading process as its argument. This can be used to periodically check on the loading progress. Defaults to None if not provided.
+        :param callback: The callback function for progress updates.
         :type callback: Optional[Callable[[float], None]]
 
-        :return: None
+        :return: Iterator over the chapters, with titles set from their first items.
+        :rtype: Iterator[TTS_Chapter]
         """
         super().load(filename, callback)
+
+        self.project.author = self.author
+        self.project.title = self.title
+
+        return self._convert_chunks(filename, callback)
+
+    def _convert_chunks(self, filename: str, callback: Optional[Callable[[float], None]] = None) -> Iterator[TTS_Chapter]:
+        for chapter in self.html_converter.convert_chunks(self._read_chunks(filename, callback)):
+            chapter.set_title()
+            yield chapter
+
+        self.html_converter.write_profile_report()
+
+    def _read_chunks(self, filename: str, callback: Optional[Callable[[float], None]] = None) -> Iterator[str]:
+        # Progress is estimated from the characters read, which are at most as many as bytes
+        size = max(1, os.path.getsize(filename))
+        read = 0
+
         with open(filename, 'r') as file:
-            self.load_raw(file.read())
+            while True:
+                chunk = file.read(CHUNK_SIZE)
+
+                if not chunk:
+                    break
+
+                read += len(chunk)
+
+                if callback is not None:
+                    callback(min(100, 100 * read / size))
+
+                yield chunk
@@ -5,7 +5,7 @@ from typing import Callable, Optional
 
 import srt  # type: ignore
 
-from .. import TTS_Item, TTS_Project, TTS_Simple_Writer  # type: ignore
+from .. import TTS_Item, TTS_Project  # type: ignore
 from .tts_abstract_reader import TTS_Abstract_Reader  # type: ignore
 
 
@@ -13,7 +13,9 @@ import scipy.io.wavfile  # type: ignore
 from .items.tts_item import TTS_Item
 from .tts_abstract_writer import TTS_Abstract_Writer
 from .tts_processor import TTS_Processor, Backend
+from .tts_synthesis_worker import WorkerLimits
 from .utils.log import LOG_TYPE, bcolors, log
+from .utils.threads import ThreadBudget
 
 
 class TTS_Simple_Writer(TTS_Abstract_Writer):
@@ -21,13 +23,64 @@ class TTS_Simple_Writer(TTS_Abstract_Writer):
     Simple writer class that takes a list of TTS items (in contrast to a more complex TTS_Project object), synthesizes, and writes them as a final audio file
     """
 
-    def __init__(self, tts_items: list[TTS_Item], preferred_speakers: Optional[list[str]] = None, model: str = "", backend: Backend = Backend.COQUI, lang: str = 'en'):
-        super().__init__(preferred_speakers, model, backend, lang)
+    def __init__(self, tts_items: list[TTS_Item], preferred_speakers: Optional[list[str]] = None, model: str = "", backend: Backend = Backend.COQUI, lang: str = 'en', backend_options: Optional[dict] = None, preload: bool = True, warm_up: bool = True, thread_budget: Optional[ThreadBudget] = None, max_chars: Optional[int] = None, worker_limits: Optional[WorkerLimits] = None):
+        """
+        :param preload: Start loading the model in the background right away. Defaults to True.
+        :type preload: bool
+
+        :param warm_up: Run dummy inputs through the voice after loading (in the background if preloading), which reduces the latency of the first item. Defaults to True.
+        :type warm_up: bool
+
+        :param thread_budget: Optional number of inference threads (see TTS_Processor).
+        :type thread_budget: Optional[ThreadBudget]
+
+        :param max_chars: Optional maximum number of characters per synthesized item (see TTS_Processor).
+        :type max_chars: Optional[int]
+
+        :param worker_limits: Run the model in a supervised worker process, which is restarted when exceeding these limits (see TTS_Synthesis_Worker).
+        :type worker_limits: Optional[WorkerLimits]
+        """
+        super().__init__(preferred_speakers, model, backend, lang, backend_options, thread_budget, max_chars, worker_limits)
 
         self.tts_items = tts_items
+        self.warm_up = warm_up
 
         self.final_numpy: np.ndarray
 
+        self.vocoder = ''
+        self.tts_processor: Optional[TTS_Processor] = None
+
+        if preload:
+            try:
+                self.tts_processor = self._create_processor()
+            except ValueError:
+                # Unsupported settings are reported when synthesizing
+                pass
+            else:
+                self.tts_processor.initialize_async(self.warm_up)
+
+    def _create_processor(self) -> TTS_Processor:
+        """
+        Create the TTS processor, selecting a default model for the language if needed.
+
+        :return: The TTS processor (not initialized yet).
+        :rtype: TTS_Processor
+
+        :raises ValueError: If there is no default model for the language.
+        """
+        if self.model == '':
+            if self.backend == Backend.COQUI:
+                match self.lang:
+                    case 'en':
+                        self.model = 'tts_models/en/vctk/vits'
+                    case 'de':
+                        self.model = 'tts_models/de/thorsten/tacotron2-DDC'
+                        self.vocoder = 'vocoder_models/de/thorsten/hifigan_v1'
+                    case _:
+                        raise ValueError(f'Language code "{self.lang}" not supported')
+
+        return self._new_processor(self.vocoder, self.lang)
+
     def synthesize_and_write(self, output_filename: str, callback: Optional[Callable[[float, TTS_Item], None]] = None, preprocess=True):
         """
         Synthesize and write list of items as an audio file
@@ -44,65 +97,62 @@ class TTS_Simple_Writer(TTS_Abstract_Writer):
         characters_sum = 0
         characters_total = 0
 
-        self.vocoder = ''
-        if self.model == '':
-            if self.backend == Backend.COQUI:
-                match self.lang:
-                    case 'en':
-                        self.model = 'tts_models/en/vctk/vits'
-                    case 'de':
-                        self.model = 'tts_models/de/thorsten/tacotron2-DDC'
-                        self.vocoder = 'vocoder_models/de/thorsten/hifigan_v1'
-                    case _:
-                        raise ValueError(f'Language code "{self.lang}" not supported')
+        if self.tts_processor:
+            # Preloaded (and warmed up) in the background
+            tts_processor = self.tts_processor
+            tts_processor.wait_initialized()
+        else:
+            tts_processor = self._create_processor()
+            tts_processor.initialize(self.warm_up)
 
-        tts_processor = TTS_Processor(self.model, self.vocoder, self.preferred_speakers, self.backend, self.lang)
-        tts_processor.initialize()
+        try:
+            self.sample_rate = tts_processor.get_sample_rate()
 
-        self.sample_rate = tts_processor.get_sample_rate()
+            if preprocess:
+                tts_items = tts_processor.preprocess_items(self.tts_items)
+            else:
+                tts_items = self.tts_items
 
-        if preprocess:
-            tts_items = tts_processor.preprocess_items(self.tts_items)
-        else:
-            tts_items = self.tts_items
+            for tts_item in tts_items:
+                characters_sum += len(tts_item.text)
 
-        for tts_item in tts_items:
-            characters_sum += len(tts_item.text)
+            numpy_segments = np.array([0], dtype=np.float32)
 
-        numpy_segments = np.array([0], dtype=np.float32)
+            for idx, tts_item in enumerate(tts_items):
+                self.print_progress(idx, len(tts_items), tts_item)
 
-        for idx, tts_item in enumerate(tts_items):
-            self.print_progress(idx, len(tts_items), tts_item)
+                if time_needed:
+                    log(LOG_TYPE.INFO, f'(Remaining time: {str(datetime.timedelta(seconds=round(time_needed)))}).')
 
-            if time_needed:
-                log(LOG_TYPE.INFO, f'(Remaining time: {str(datetime.timedelta(seconds=round(time_needed)))}).')
+                time_last = time.time()
 
-            time_last = time.time()
+                if callback is not None:
+                    callback(100/(len(tts_items) * idx), tts_item)
 
-            if callback is not None:
-                callback(100/(len(tts_items) * idx), tts_item)
+                try:
+                    numpy_segments = np.concatenate((numpy_segments, tts_processor.synthesize_tts_item(tts_item)))
 
-            try:
-                numpy_segments = np.concatenate((numpy_segments, tts_processor.synthesize_tts_item(tts_item)))
-
-                time_now = time.time()
-                time_total += time_now - time_last
-                characters_total += len(tts_item.text)
-
-                if characters_total > 0:
-                    time_needed = ((time_total / characters_total) * characters_sum) - time_total
-
-                # Report progress
-                # if callback is not None:
-                #     callback(idx, len(tts_items))
-            except KeyboardInterrupt:
-                log(LOG_TYPE.ERROR, 'Stopped by user.')
-                sys.exit()
-            except Exception as e:
-                # with open(self.temp_dir.name + '/tts-error.log', 'a+') as f:
-                #     f.write(f'Error synthesizing "{output_filename}"\n')
-                log(LOG_TYPE.ERROR, f'Error synthesizing "{output_filename}": {e}.')
-                sys.exit()
+                    time_now = time.time()
+                    time_total += time_now - time_last
+                    characters_total += len(tts_item.text)
+
+                    if characters_total > 0:
+                        time_needed = ((time_total / characters_total) * characters_sum) - time_total
+
+                    # Report progress
+                    # if callback is not None:
+                    #     callback(idx, len(tts_items))
+                except KeyboardInterrupt:
+                    log(LOG_TYPE.ERROR, 'Stopped by user.')
+                    sys.exit()
+                except Exception as e:
+                    # with open(self.temp_dir.name + '/tts-error.log', 'a+') as f:
+                    #     f.write(f'Error synthesizing "{output_filename}"\n')
+                    log(LOG_TYPE.ERROR, f'Error synthesizing "{output_filename}": {e}.')
+                    sys.exit()
+        finally:
+            # Stop a synthesis worker process (and its model) right away, it is restarted on demand
+            tts_processor.close()
 
         self._write(numpy_segments, output_filename)
         log(LOG_TYPE.SUCCESS, f'Synthesizing finished, file saved as "{output_filename}".')
@@ -0,0 +1,340 @@
+import multiprocessing
+import os
+import resource
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from typing import Optional
+
+import numpy as np  # type: ignore
+
+from .items.tts_item import TTS_Item
+from .tts_processor import Backend, SynthesisError, TTS_Processor
+from .utils.log import LOG_TYPE, log
+from .utils.text import split_text
+from .utils.threads import ThreadBudget
+
+
+def current_rss_mb() -> float:
+    """
+    Get the resident set size (physical memory in use) of the current process.
+
+    :return: The resident set size in MB. Falls back to the peak resident set size where /proc is not available.
+    :rtype: float
+    """
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        # Kilobytes on Linux, bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / 1024 / 1024 if max_rss > 1024 * 1024 * 1024 else max_rss / 1024
+
+
+@dataclass(frozen=True)
+class WorkerLimits():
+    """
+    Defines when a synthesis worker process is recycled (restarted with the model reloaded) and how failing items are handled. A value of 0 disables the limit.
+
+    :param max_rss_mb: Maximum resident memory of the worker process in MB.
+    :type max_rss_mb: int
+
+    :param max_items: Maximum number of items synthesized by a single worker process.
+    :type max_items: int
+
+    :param item_timeout: Maximum time in seconds for synthesizing a single item, a worker exceeding it is killed and restarted.
+    :type item_timeout: float
+
+    :param max_retries: Number of retries for items failing to synthesize, each retry splits the text into smaller parts.
+    :type max_retries: int
+    """
+    max_rss_mb: int = 0
+    max_items: int = 0
+    item_timeout: float = 0
+    max_retries: int = 2
+
+
+def _worker_main(connection: Connection, processor_args: dict, warm_up: bool) -> None:
+    """
+    Entry point of the worker process, synthesizes the items received from the parent process until the connection is closed.
+    """
+    try:
+        _serve(connection, processor_args, warm_up)
+    except (BrokenPipeError, ConnectionResetError, KeyboardInterrupt):
+        # Parent stopped the worker (for example while still loading the model)
+        pass
+
+
+def _serve(connection: Connection, processor_args: dict, warm_up: bool) -> None:
+    try:
+        processor = TTS_Processor(**processor_args)
+        processor.initialize(warm_up)
+    except Exception as e:
+        connection.send(('error', f'Initializing the synthesis worker failed: {e}'))
+        return
+
+    connection.send(('ready', processor.get_sample_rate(), current_rss_mb()))
+
+    while True:
+        try:
+            tts_item = connection.recv()
+        except EOFError:
+            break
+
+        if tts_item is None:
+            break
+
+        try:
+            audio = processor.synthesize_tts_item(tts_item)
+        except Exception as e:
+            connection.send(('error', str(e)))
+        else:
+            connection.send(('ok', audio, current_rss_mb()))
+
+
+class TTS_Synthesis_Worker(TTS_Processor):
+    """
+    TTS processor running the model in a supervised subprocess, which is transparently restarted (and the model reloaded) when it exceeds the memory or item limits.
+    Preprocessing runs in the calling process, only synthesizing is delegated. As the synthesized audio is returned item by item, restarting never loses progress.
+    """
+
+    def __init__(
+        self,
+        model="",
+        vocoder: str = "",
+        preferred_speakers: Optional[list[str]] = None,
+        backend: Backend = Backend.COQUI,
+        lang: str = "en",
+        backend_options: Optional[dict] = None,
+        thread_budget: Optional[ThreadBudget] = None,
+        max_chars: Optional[int] = None,
+        limits: Optional[WorkerLimits] = None,
+    ) -> None:
+        """
+        Takes the same parameters as TTS_Processor, plus:
+
+        :param limits: Limits for restarting the worker process and retrying items, defaults to no limits (the process is only restarted if it dies).
+        :type limits: Optional[WorkerLimits]
+
+        :return: None
+        """
+        super().__init__(model, vocoder, preferred_speakers, backend, lang, backend_options, thread_budget, max_chars)
+
+        self.processor_args = {
+            'model': model,
+            'vocoder': vocoder,
+            'preferred_speakers': preferred_speakers,
+            'backend': backend,
+            'lang': lang,
+            'backend_options': backend_options,
+            'thread_budget': thread_budget,
+            'max_chars': max_chars,
+        }
+        self.limits = limits or WorkerLimits()
+
+        self.sample_rate = 0
+        self.rss_mb = 0.0
+        self.items_synthesized = 0
+        self.restarts = 0
+
+        self._warm_up = False
+        self._process: Optional[multiprocessing.process.BaseProcess] = None
+        self._connection: Optional[Connection] = None
+        self._ready = False
+
+    def initialize(self, warm_up: bool = False) -> None:
+        """
+        Starts the worker process and waits for the model to be loaded.
+
+        :param warm_up: Warm up the voice after loading, also applies to restarted workers.
+        :type warm_up: bool
+
+        :return: None
+        """
+        self.initialize_async(warm_up)
+        self.wait_initialized()
+
+    def initialize_async(self, warm_up: bool = False) -> None:
+        """
+        Starts the worker process, which loads the model while the calling process continues. Call wait_initialized() before synthesizing.
+
+        :param warm_up: Warm up the voice after loading, also applies to restarted workers.
+        :type warm_up: bool
+
+        :return: None
+        """
+        self._warm_up = warm_up
+
+        if self._process and self._process.is_alive():
+            return
+
+        # Don't inherit threads and loaded libraries of the parent process
+        context = multiprocessing.get_context('spawn')
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(target=_worker_main, args=(child_connection, self.processor_args, warm_up), name='tts_synthesis_worker', daemon=True)
+        self._process.start()
+        child_connection.close()
+
+        self._ready = False
+        self.items_synthesized = 0
+
+    def wait_initialized(self) -> None:
+        """
+        Waits for the worker process to finish loading the model, starts it first if needed.
+
+        :return: None
+
+        :raises RuntimeError: If the worker process could not be initialized.
+        """
+        if not self._process:
+            self.initialize_async(self._warm_up)
+
+        if self._ready:
+            return
+
+        message = self._receive()
+
+        if message[0] != 'ready':
+            self.close()
+            raise RuntimeError(message[1])
+
+        _, self.sample_rate, self.rss_mb = message
+        self._ready = True
+        self.initialized = True
+
+    def _receive(self, tts_item: Optional[TTS_Item] = None, timeout: float = 0) -> tuple:
+        # Send the item first (if any), a dead or hanging worker is reported as a message as well
+        assert self._connection
+
+        try:
+            if tts_item is not None:
+                self._connection.send(tts_item)
+            if timeout > 0 and not self._connection.poll(timeout):
+                return ('timeout', f'no result within {timeout:g}s')
+            return self._connection.recv()
+        except (EOFError, OSError):
+            if self._process:
+                self._process.join(1)
+            exit_code = self._process.exitcode if self._process else None
+            return ('died', f'synthesis worker process died (exit code {exit_code})')
+
+    def close(self, kill: bool = False) -> None:
+        """
+        Stops the worker process.
+
+        :param kill: Kill the worker process right away instead of waiting for it to exit, for hanging workers.
+        :type kill: bool
+
+        :return: None
+        """
+        if self._connection:
+            try:
+                self._connection.send(None)
+            except (OSError, ValueError):
+                pass
+            self._connection.close()
+            self._connection = None
+
+        if self._process:
+            if not kill:
+                self._process.join(5)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join()
+            self._process = None
+
+        self._ready = False
+        self.initialized = False
+
+    def restart(self, reason: str, kill: bool = False) -> None:
+        """
+        Restarts the worker process, the model is reloaded in the background.
+
+        :param reason: Reason for restarting, for logging.
+        :type reason: str
+
+        :param kill: Kill the worker process right away (see close()).
+        :type kill: bool
+
+        :return: None
+        """
+        log(LOG_TYPE.INFO, f'Restarting synthesis worker after {self.items_synthesized} items ({reason}).')
+
+        self.close(kill)
+        self.restarts += 1
+        self.initialize_async(self._warm_up)
+
+    def _limits_exceeded(self) -> Optional[str]:
+        if self.limits.max_rss_mb > 0 and self.rss_mb > self.limits.max_rss_mb:
+            return f'RSS {self.rss_mb:.0f} MB exceeds {self.limits.max_rss_mb} MB'
+        if self.limits.max_items > 0 and self.items_synthesized >= self.limits.max_items:
+            return f'item limit of {self.limits.max_items} reached'
+        return None
+
+    def _synthesize_once(self, tts_item: TTS_Item) -> tuple[Optional[np.ndarray], str, str]:
+        # Returns the audio, or None, the kind of failure ("error", "died" or "timeout") and its reason
+        self.wait_initialized()
+
+        message = self._receive(tts_item, self.limits.item_timeout)
+
+        if message[0] != 'ok':
+            if message[0] in ('died', 'timeout'):
+                self.restart(message[1], kill=True)
+            return None, message[0], message[1]
+
+        _, audio, self.rss_mb = message
+        self.items_synthesized += 1
+
+        # Restart between items, so the audio of the current item is never lost
+        reason = self._limits_exceeded()
+        if reason:
+            self.restart(reason)
+
+        return audio, 'ok', ''
+
+    def _synthesize_with_retries(self, tts_item: TTS_Item, attempt: int) -> np.ndarray:
+        audio, kind, reason = self._synthesize_once(tts_item)
+
+        if audio is not None:
+            return audio
+
+        if attempt >= self.limits.max_retries or not tts_item.text:
+            raise SynthesisError(tts_item, attempt + 1, reason)
+
+        if kind == 'died':
+            # The worker crashed (for example killed by the system), not necessarily caused by the input
+            chunks = [tts_item.text]
+        else:
+            # Retry with smaller parts, problematic input often only affects a part of the text
+            chunks = split_text(tts_item.text, max(1, len(tts_item.text) // 2))
+
+        log(LOG_TYPE.WARNING, f'Synthesizing failed ({reason}), retrying in {len(chunks)} part(s).')
+
+        audio_parts = [self._synthesize_with_retries(TTS_Item(chunk, tts_item.speaker_idx), attempt + 1) for chunk in chunks]
+
+        # Pad the parts together, not each part on its own
+        return self.pad_length(np.concatenate(audio_parts), tts_item.length / 1000.0)
+
+    def synthesize_tts_item(self, tts_item: TTS_Item) -> np.ndarray:
+        """
+        Synthesize a single item in the worker process and return a numpy array containing the audio data.
+        If synthesizing fails, times out (see WorkerLimits.item_timeout) or the worker process dies, the worker is restarted if needed and the text is synthesized again in progressively smaller parts, up to WorkerLimits.max_retries times.
+
+        :param tts_item: TTS item to be synthesized
+        :type tts_item: TTS_Item
+
+        :return: numpy array of synthesized audio
+        :rtype: np.ndarray
+
+        :raises SynthesisError: If synthesizing still fails after all retries.
+        """
+        return self._synthesize_with_retries(tts_item, 0)
+
+    def get_sample_rate(self) -> int:
+        """
+        Returns the sample rate
+
+        :return: sample rate
+        :rtype: int
+        """
+        self.wait_initialized()
+        return self.sample_rate
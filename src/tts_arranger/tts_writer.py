@@ -1,11 +1,15 @@
 import base64
+import contextlib
 import io
+import json
 import math
 import os
+import shutil
 import subprocess
 import sys
 import tempfile
-from typing import Callable, Optional
+import time
+from typing import Callable, Iterable, Optional, Sized
 
 import ffmpeg  # type: ignore
 import numpy as np  # type: ignore
@@ -13,12 +17,17 @@ import scipy.io.wavfile  # type: ignore
 from pathvalidate._filename import sanitize_filename
 from PIL import Image
 
+from .chapter_manifest import Chapter_Manifest, chapter_hash  # type: ignore
+from .estimator import Chapter_Estimate, Project_Estimate, Timing_Store  # type: ignore
 from .items.tts_chapter import TTS_Chapter  # type: ignore
 from .items.tts_item import TTS_Item  # type: ignore
 from .items.tts_project import TTS_Project  # type: ignore
+from .preview import Preview  # type: ignore
 from .tts_abstract_writer import TTS_Abstract_Writer
 from .tts_processor import TTS_Processor, Backend
+from .tts_synthesis_worker import WorkerLimits
 from .utils.log import LOG_TYPE, bcolors, log  # type: ignore
+from .utils.threads import ThreadBudget, prefetch  # type: ignore
 
 
 class TTS_Writer(TTS_Abstract_Writer):
@@ -26,12 +35,15 @@ class TTS_Writer(TTS_Abstract_Writer):
     Class to process TTS projects (containing of chapters each containing a number of items) and to finally write an audio file including chapter metadata and chapter info
     """
 
-    def __init__(self, project: TTS_Project = TTS_Project(),  base_path: str = '', output_format='m4b', model: str = '', vocoder: str = '', preferred_speakers: Optional[list[str]] = None, backend: Backend = Backend.COQUI) -> None:
+    # Version of the item index written alongside cached outputs
+    INDEX_VERSION = 1
+
+    def __init__(self, project: Optional[TTS_Project] = None,  base_path: str = '', output_format='m4b', model: str = '', vocoder: str = '', preferred_speakers: Optional[list[str]] = None, backend: Backend = Backend.COQUI, backend_options: Optional[dict] = None, preload: bool = True, thread_budget: Optional[ThreadBudget] = None, max_chars: Optional[int] = None, worker_limits: Optional[WorkerLimits] = None, timings: Optional[Timing_Store] = None, record_timings: bool = True) -> None:
         """
         Constructor for the TTS_Writer class.
 
-        :param project: An instance of the TTS_Project class containing the project information.
-        :type project: TTS_Project
+        :param project: An instance of the TTS_Project class containing the project information, a new empty project by default.
+        :type project: Optional[TTS_Project]
 
         :param base_path: The path to the project directory.
         :type base_path: str
@@ -49,9 +61,37 @@ class TTS_Writer(TTS_Abstract_Writer):
                                 If set to None, the default speaker(s) will be used.
         :type preferred_speakers: Optional[list[str]]
 
+        :param backend: The synthesis backend to be used, Backend.FAKE generates deterministic audio without any models (for benchmarking and tests).
+        :type backend: Backend
+
+        :param backend_options: Optional keyword arguments passed on to the backend voice (see TTS_Processor).
+        :type backend_options: Optional[dict]
+
+        :param preload: Start loading the model in the background as soon as synthesizing starts, so it overlaps with optimizing and preprocessing the project. Estimates and dry runs never load the model. Defaults to True.
+        :type preload: bool
+
+        :param thread_budget: Optional number of inference threads, use ThreadBudget.for_workers() when running several writers in parallel.
+        :type thread_budget: Optional[ThreadBudget]
+
+        :param max_chars: Optional maximum number of characters per synthesized item (see TTS_Processor).
+        :type max_chars: Optional[int]
+
+        :param worker_limits: Run the model in a supervised worker process, which is restarted when exceeding these limits (see TTS_Synthesis_Worker).
+        :type worker_limits: Optional[WorkerLimits]
+
+        :param timings: Store of the synthesis timings, used for calibrating estimates (see estimate()). Defaults to the store in the user's cache directory (see Timing_Store).
+        :type timings: Optional[Timing_Store]
+
+        :param record_timings: Record the timings of synthesizing to the store, so later estimates are calibrated. Defaults to True.
+        :type record_timings: bool
+
         :return: None
         """
-        super().__init__(preferred_speakers, model, backend, project.lang_code)
+        # Chapters are added to the project while synthesizing, so never share a default instance
+        if project is None:
+            project = TTS_Project()
+
+        super().__init__(preferred_speakers, model, backend, project.lang_code, backend_options, thread_budget, max_chars, worker_limits)
 
         self.NANOSECONDS_IN_ONE_SECOND = 1e9
 
@@ -63,6 +103,51 @@ class TTS_Writer(TTS_Abstract_Writer):
 
         self.temp_files: list[tuple[str, str]] = []
 
+        # Indexes of the chapters reused from the encoded chapter cache in the last run
+        self.reused_chapters: list[int] = []
+
+        # Loudness normalization of the output
+        self.speechnorm_expansion = 12.5
+        self.speechnorm_raise = 0.0001
+
+        # Synthesis timings are recorded for calibrating estimates (see estimate())
+        self.timings = timings or Timing_Store()
+        self.record_timings = record_timings
+
+        self.preload = preload
+        self.tts_processor: Optional[TTS_Processor] = None
+
+        if preload:
+            try:
+                # Loaded when synthesizing (see synthesize_and_write()), not needed for estimates
+                self.tts_processor = self._create_processor()
+            except ValueError:
+                # Unsupported settings are reported when synthesizing
+                pass
+
+    def _create_processor(self) -> TTS_Processor:
+        """
+        Create the TTS processor for the project, selecting a default model for the project language if needed.
+
+        :return: The TTS processor (not initialized yet).
+        :rtype: TTS_Processor
+
+        :raises ValueError: If there is no default model for the project language.
+        """
+        if not (self.model and self.vocoder):
+            if self.backend == Backend.COQUI:
+                match self.project.lang_code:
+                    case 'en':
+                        self.model = 'tts_models/en/vctk/vits'
+                        self.vocoder = ''
+                    case 'de':
+                        self.model = 'tts_models/de/thorsten/tacotron2-DDC'
+                        self.vocoder = 'vocoder_models/de/thorsten/hifigan_v1'
+                    case _:
+                        raise ValueError(f'Language code "{self.project.lang_code}" not supported')
+
+        return self._new_processor(self.vocoder, self.project.lang_code)
+
     def _get_nanoseconds_for_file(self, filename: str):
         """
         Get the duration of an audio file in nanoseconds.
@@ -76,14 +161,44 @@ class TTS_Writer(TTS_Abstract_Writer):
         result = ffmpeg.probe(filename, cmd='ffprobe', show_entries='format=duration')
         return int(float(result['format']['duration']) * self.NANOSECONDS_IN_ONE_SECOND)
 
-    def _synthesize_chapters(self, chapters: list[TTS_Chapter], temp_dir: str, tts_processor: TTS_Processor, callback: Optional[Callable[[float, TTS_Item], None]] = None, optimize=False, max_pause_duration=0, preprocess=True) -> None:
+    def _voice_key(self) -> str:
+        # Identifies the voice for recorded timings
+        return f'{self.backend.name.lower()}:{self.model}{".int8" if self.backend_options.get("quantized") else ""}'
+
+    def _synthesis_settings(self, optimize: bool, max_pause_duration: int, preprocess: bool, max_seconds: float = 0) -> dict:
+        """
+        Get all settings affecting the synthesized audio of a chapter, used for identifying completed chapters (see chapter_hash()).
+
+        :return: The settings.
+        :rtype: dict
+        """
+        settings = {
+            'backend': self.backend.name,
+            'model': self.model,
+            'vocoder': self.vocoder,
+            'preferred_speakers': self.preferred_speakers,
+            'lang': self.project.lang_code,
+            'backend_options': self.backend_options,
+            'max_chars': self.max_chars,
+            'optimize': optimize,
+            'max_pause_duration': max_pause_duration,
+            'preprocess': preprocess,
+        }
+
+        # Only for previews, so keys of complete chapters stay the same
+        if max_seconds > 0:
+            settings['max_seconds'] = max_seconds
+
+        return settings
+
+    def _synthesize_chapters(self, chapters: Iterable[TTS_Chapter], temp_dir: str, tts_processor: TTS_Processor, callback: Optional[Callable[[float, TTS_Item], None]] = None, optimize=False, max_pause_duration=0, preprocess=True, item_audio: Optional[dict[tuple, np.ndarray]] = None, max_seconds: float = 0, prefetch_chapters: int = 0) -> list[Optional[str]]:
         """
         Private method for synthesizing chapters into audio.
 
-        :param chapters: A list of TTS chapters containing text to be synthesized into audio.
-        :type chapters: list[TTS_Chapter]
+        :param chapters: TTS chapters containing text to be synthesized into audio, a list or an iterator (see prefetch_chapters).
+        :type chapters: Iterable[TTS_Chapter]
 
-        :param temp_dir: Path to the temporary directory.
+        :param temp_dir: Path to the temporary or work directory, chapters already completed according to its manifest are skipped.
         :type temp_dir: str
 
         :param tts_arranger: ATTS_Arranger object to be used for synthesizing.
@@ -101,70 +216,340 @@ class TTS_Writer(TTS_Abstract_Writer):
         :param preprocess: Defines if the chapter should be preprocessed before synthesizing.
         :type preprocess: boolean
 
-        :return: None
-        :rtype: None
+        :param item_audio: Optional audio of previously synthesized items keyed by (text, speaker_idx, length), these items are not synthesized again.
+        :type item_audio: Optional[dict[tuple, np.ndarray]]
+
+        :param max_seconds: Stop synthesizing a chapter after the item reaching this duration (in seconds), for previews. 0 synthesizes complete chapters.
+        :type max_seconds: float
+
+        :param prefetch_chapters: Consume and preprocess the chapters in a background thread, up to this number of chapters ahead of synthesizing. 0 preprocesses all chapters first.
+        :type prefetch_chapters: int
+
+        :return: The WAV file of each chapter (None for empty chapters), each with an item index (sample offsets of the synthesized items) saved as "<file>.items.json".
+        :rtype: list[Optional[str]]
         """
 
-        log(LOG_TYPE.INFO, f'Preprocessing items.')
+        manifest = Chapter_Manifest(temp_dir)
+        settings = self._synthesis_settings(optimize, max_pause_duration, preprocess, max_seconds)
 
-        for chapter in chapters:
-            if optimize:
-                chapter.optimize(max_pause_duration)
-            if preprocess:
-                chapter.tts_items = tts_processor.preprocess_items(chapter.tts_items)
+        # Unknown for iterators
+        chapters_count = len(chapters) if isinstance(chapters, Sized) else 0
 
-        tts_processor.initialize()
-        self.sample_rate = tts_processor.get_sample_rate()
+        def prepare(chapter: TTS_Chapter) -> tuple[TTS_Chapter, str, Optional[dict]]:
+            # Chapters completed by a previous (interrupted) run don't need to be synthesized again
+            key = chapter_hash(chapter, settings)
+            entry = manifest.get(key)
 
-        total_items = 0
+            if not entry:
+                if optimize:
+                    chapter.optimize(max_pause_duration)
+                if preprocess:
+                    chapter.tts_items = tts_processor.preprocess_items(chapter.tts_items)
 
-        for chapter in chapters:
-            total_items += len(chapter.tts_items)
+            return chapter, key, entry
+
+        prepared: Iterable[tuple[TTS_Chapter, str, Optional[dict]]]
+
+        if prefetch_chapters > 0:
+            log(LOG_TYPE.INFO, f'Preprocessing items while synthesizing.')
+
+            prepared = prefetch(map(prepare, chapters), prefetch_chapters)
 
-        current_total_items = 0
+            # Model loading may still be running in the background
+            tts_processor.wait_initialized()
+            self.sample_rate = tts_processor.get_sample_rate()
+        else:
+            log(LOG_TYPE.INFO, f'Preprocessing items.')
+
+            prepared = [prepare(chapter) for chapter in chapters]
+            completed_count = sum(1 for _, _, entry in prepared if entry)
+
+            if completed_count:
+                log(LOG_TYPE.INFO, f'Resuming, {completed_count} of {chapters_count} chapters already completed.')
+
+            if completed_count < chapters_count:
+                # Model loading may still be running in the background
+                tts_processor.wait_initialized()
+                self.sample_rate = tts_processor.get_sample_rate()
 
         cumulative_time = 0
+        chapter_files: list[Optional[str]] = []
+
+        for i, (chapter, key, entry) in enumerate(prepared):
+            temp_format = 'wav'
+
+            chapter_title = f'{i + 1:0{len(str(len(self.temp_files)))}} - {chapter.title}'
+
+            if entry:
+                log(LOG_TYPE.INFO, f'Chapter {i + 1} already completed, skipping.')
+
+                self.temp_files.append((chapter_title, manifest.path(entry['file'])))
+                chapter_files.append(manifest.path(entry['file']))
+
+                chapter.start_time = cumulative_time
+                chapter.end_time = cumulative_time + entry['duration']
+                cumulative_time = chapter.end_time
+                continue
 
-        for i, chapter in enumerate(chapters):
             numpy_segments = np.array([0], dtype=np.float32)
 
-            temp_format = 'wav'
+            filename = f'tts_part_{key[:16]}.{temp_format}'
+            filename_out = manifest.path(filename)
 
-            filename = os.path.join(temp_dir, f'tts_part_{i}.{temp_format}')
+            if chapters_count > 1:
+                log(LOG_TYPE.INFO, f'Synthesizing chapter {i + 1} of {chapters_count}.')
+            elif not chapters_count:
+                log(LOG_TYPE.INFO, f'Synthesizing chapter {i + 1}.')
 
-            if len(chapters) > 1:
-                log(LOG_TYPE.INFO, f'Synthesizing chapter {i + 1} of {len(chapters)}.')
+            chapter.start_time = cumulative_time
 
             if len(chapter.tts_items) > 0:
+                item_entries: list[dict] = []
+                synthesized_chars = 0
+                synthesized_samples = 0
+                synthesis_time = 0.0
+
                 for j, tts_item in enumerate(chapter.tts_items):
-                    self.print_progress(j, len(chapter.tts_items), tts_item)
+                    item_key = (tts_item.text, tts_item.speaker_idx, tts_item.length)
 
                     if callback is not None:
-                        callback(100/(len(chapters) * len(chapter.tts_items)) * (i + j), tts_item)
+                        # Progress of the current chapter if the number of chapters is unknown
+                        callback(100/(max(1, chapters_count) * len(chapter.tts_items)) * ((i if chapters_count else 0) + j), tts_item)
+
+                    if item_audio and item_key in item_audio:
+                        # Unchanged item, reuse the previously synthesized audio
+                        audio = item_audio[item_key]
+                    else:
+                        self.print_progress(j, len(chapter.tts_items), tts_item)
 
-                    # Synthesize audio from TTS item text
-                    numpy_segments = np.concatenate((numpy_segments, tts_processor.synthesize_tts_item(tts_item)))
+                        # Synthesize audio from TTS item text
+                        start = time.perf_counter()
+                        audio = tts_processor.synthesize_tts_item(tts_item)
 
-                # Write synthesized audio as temp file
-                scipy.io.wavfile.write(filename, self.sample_rate, numpy_segments)
+                        if tts_item.text.strip():
+                            synthesis_time += time.perf_counter() - start
+                            synthesized_chars += len(tts_item.text.strip())
+                            synthesized_samples += len(audio)
 
-                current_total_items += len(chapter.tts_items)
+                    item_entries.append({'text': item_key[0], 'speaker_idx': item_key[1], 'length': item_key[2], 'start': len(numpy_segments), 'end': len(numpy_segments) + len(audio)})
+                    numpy_segments = np.concatenate((numpy_segments, audio))
 
-                num_zeros = len(str(len(self.temp_files)))
-                chapter_title = f'{i + 1:0{num_zeros}} - {chapter.title}'
+                    if max_seconds > 0 and len(numpy_segments) >= max_seconds * self.sample_rate:
+                        log(LOG_TYPE.INFO, f'Preview limit of {max_seconds:g}s reached after {j + 1} of {len(chapter.tts_items)} items.')
+                        break
 
-                filename_out = os.path.join(temp_dir, f'tts_part_{i}.{temp_format}')
+                # Write synthesized audio and item index as temp files, renamed when complete so an interruption never leaves a partial file
+                with open(f'{filename_out}.items.json.tmp', 'w', encoding='utf-8') as items_file:
+                    json.dump({'sample_rate': self.sample_rate, 'items': item_entries}, items_file)
+                os.replace(f'{filename_out}.items.json.tmp', f'{filename_out}.items.json')
+
+                scipy.io.wavfile.write(f'{filename_out}.tmp', self.sample_rate, numpy_segments)
+                os.replace(f'{filename_out}.tmp', filename_out)
+
+                duration = self._get_nanoseconds_for_file(filename_out)
+                manifest.add(key, filename, duration)
+
+                if self.record_timings:
+                    self.timings.record(self._voice_key(), synthesized_chars, synthesized_samples / self.sample_rate, synthesis_time)
 
                 # Add temp file for concatenating later
                 self.temp_files.append((chapter_title, filename_out))
                 log(LOG_TYPE.INFO, f'Temp file added: {filename_out}{bcolors.ENDC}')
+                chapter_files.append(filename_out)
+
+                chapter.end_time = cumulative_time + duration
+            else:
+                chapter_files.append(None)
+                chapter.end_time = cumulative_time
 
-            chapter.start_time = cumulative_time
-            chapter.end_time = cumulative_time + self._get_nanoseconds_for_file(filename)
             cumulative_time = chapter.end_time
 
         del tts_processor
 
+        return chapter_files
+
+    def _segment_extension(self) -> str:
+        # Container of the encoded chapter segments, must allow concatenating with stream copy into the output format
+        return 'm4a' if self.output_format in ['m4b', 'm4a'] else self.output_format
+
+    def _load_item_audio(self, index: dict, chapter_indexes: list[int], cache_dir: str) -> dict[tuple, np.ndarray]:
+        """
+        Load the audio of the items of previously synthesized chapters, based on the item index of a previous output.
+
+        :param index: The item index of the previous output.
+        :type index: dict
+
+        :param chapter_indexes: Indexes of the chapters to load the items of.
+        :type chapter_indexes: list[int]
+
+        :param cache_dir: Directory of the encoded chapter cache, also containing the unencoded audio of the chapters.
+        :type cache_dir: str
+
+        :return: The audio of the items keyed by (text, speaker_idx, length).
+        :rtype: dict[tuple, np.ndarray]
+        """
+        item_audio: dict[tuple, np.ndarray] = {}
+
+        for idx in chapter_indexes:
+            if idx >= len(index['chapters']):
+                continue
+
+            key = index['chapters'][idx]['key']
+            audio_path = os.path.join(cache_dir, key[:2], f'{key}.flac')
+
+            if not os.path.exists(audio_path):
+                continue
+
+            audio_bytes, _ = (
+                ffmpeg
+                .input(audio_path)
+                .output('pipe:', format='f32le', acodec='pcm_f32le', ac=1, loglevel='error')
+                .run(capture_stdout=True)
+            )
+            audio = np.frombuffer(audio_bytes, dtype=np.float32)
+
+            for item in index['chapters'][idx]['items']:
+                item_audio[(item['text'], item['speaker_idx'], item['length'])] = audio[item['start']:item['end']]
+
+        return item_audio
+
+    def _synthesize_segments(self, chapters: list[TTS_Chapter], temp_dir: str, tts_processor: TTS_Processor, cache_dir: str, callback: Optional[Callable[[float, TTS_Item], None]] = None, optimize=False, max_pause_duration=0, preprocess=True, index_filename: Optional[str] = None, max_seconds: float = 0) -> tuple[list[str], dict]:
+        """
+        Private method for synthesizing chapters into encoded segments, using a content-addressed cache. Only chapters not in the cache are synthesized and encoded, the cache key covers the chapter's items, the voice configuration and the encoder settings.
+        Sets the start and end times of all chapters.
+
+        :param cache_dir: Directory of the encoded chapter cache.
+        :type cache_dir: str
+
+        :param index_filename: Optional item index of a previous output. Unchanged items of changed chapters are taken from the previous audio instead of synthesizing them again.
+        :type index_filename: Optional[str]
+
+        For the other parameters, see _synthesize_chapters().
+
+        :return: The encoded segments of all non-empty chapters in order, and the item index for the output.
+        :rtype: tuple[list[str], dict]
+        """
+        extension = self._segment_extension()
+        settings = self._synthesis_settings(optimize, max_pause_duration, preprocess, max_seconds)
+        settings['encoder'] = {'format': extension, 'speechnorm': [self.speechnorm_expansion, self.speechnorm_raise]}
+
+        segment_paths: list[str] = []
+
+        for chapter in chapters:
+            key = chapter_hash(chapter, settings)
+            segment_paths.append(os.path.join(cache_dir, key[:2], f'{key}.{extension}'))
+
+        pending = [idx for idx, segment_path in enumerate(segment_paths) if not os.path.exists(segment_path) and chapters[idx].tts_items]
+        self.reused_chapters = [idx for idx, segment_path in enumerate(segment_paths) if os.path.exists(segment_path)]
+
+        if pending:
+            item_audio: dict[tuple, np.ndarray] = {}
+
+            if index_filename and os.path.exists(index_filename):
+                with open(index_filename, 'r', encoding='utf-8') as index_file:
+                    previous_index = json.load(index_file)
+
+                # Previous audio is only valid for the same settings
+                if previous_index.get('version') == self.INDEX_VERSION and previous_index.get('settings') == json.loads(json.dumps(settings, default=str)):
+                    item_audio = self._load_item_audio(previous_index, pending, cache_dir)
+
+            chapter_files = self._synthesize_chapters([chapters[idx] for idx in pending], temp_dir, tts_processor, callback, optimize, max_pause_duration, preprocess, item_audio, max_seconds)
+
+            for idx, chapter_file in zip(pending, chapter_files):
+                if not chapter_file:
+                    continue
+
+                segment_path = segment_paths[idx]
+                temp_segment_path = f'{segment_path}.tmp.{extension}'
+                os.makedirs(os.path.dirname(segment_path), exist_ok=True)
+
+                # Keep the unencoded audio and the item index for patching later, the segment is written last as it marks the chapter complete
+                base_path = os.path.splitext(segment_path)[0]
+                (
+                    ffmpeg
+                    .input(chapter_file)
+                    .output(f'{base_path}.tmp.flac', sample_fmt='s16', loglevel='error')
+                    .run(overwrite_output=True)
+                )
+                os.replace(f'{base_path}.tmp.flac', f'{base_path}.flac')
+                shutil.copyfile(f'{chapter_file}.items.json', f'{base_path}.items.json')
+
+                # Encode to a temporary file first, so an interruption never leaves a partial segment in the cache
+                (
+                    ffmpeg
+                    .input(chapter_file)
+                    .filter('speechnorm', e=f'{self.speechnorm_expansion}', r=f'{self.speechnorm_raise}', l=1)
+                    .output(temp_segment_path, loglevel='error')
+                    .run(overwrite_output=True)
+                )
+                os.replace(temp_segment_path, segment_path)
+
+        if self.reused_chapters:
+            log(LOG_TYPE.INFO, f'Reused {len(self.reused_chapters)} of {len(chapters)} chapters from cache: {", ".join(str(idx + 1) for idx in self.reused_chapters)}.')
+
+        # Chapter times from the encoded segments, as encoding may change durations slightly
+        segments: list[str] = []
+        cumulative_time = 0
+
+        index: dict = {'version': self.INDEX_VERSION, 'sample_rate': 0, 'settings': settings, 'chapters': []}
+
+        for chapter, segment_path in zip(chapters, segment_paths):
+            chapter.start_time = cumulative_time
+
+            if os.path.exists(segment_path):
+                cumulative_time += self._get_nanoseconds_for_file(segment_path)
+                segments.append(segment_path)
+
+            chapter.end_time = cumulative_time
+
+            items_path = f'{os.path.splitext(segment_path)[0]}.items.json'
+            chapter_index: dict = {'sample_rate': 0, 'items': []}
+
+            if os.path.exists(items_path):
+                with open(items_path, 'r', encoding='utf-8') as items_file:
+                    chapter_index = json.load(items_file)
+
+            index['sample_rate'] = index['sample_rate'] or chapter_index['sample_rate']
+            index['chapters'].append({'title': chapter.title, 'key': os.path.basename(os.path.splitext(segment_path)[0]), 'start': chapter.start_time, 'end': chapter.end_time, 'items': chapter_index['items']})
+
+        return segments, index
+
+    def _mux_segments(self, segments: list[str], metadata_filename: str, output_path: str, temp_dir: str) -> None:
+        """
+        Concatenate encoded segments into the output file with stream copy (no re-encoding), adding chapter metadata.
+
+        :param segments: The encoded segments in order.
+        :type segments: list[str]
+
+        :param metadata_filename: The FFMETADATA file with chapter information.
+        :type metadata_filename: str
+
+        :param output_path: Path of the output file.
+        :type output_path: str
+
+        :param temp_dir: Directory for the concat list.
+        :type temp_dir: str
+
+        :return: None
+        """
+        list_filename = os.path.join(temp_dir, 'segments.txt')
+
+        with open(list_filename, 'w', encoding='utf-8') as list_file:
+            for segment in segments:
+                escaped_segment = os.path.abspath(segment).replace("'", "'\\''")
+                list_file.write(f"file '{escaped_segment}'\n")
+
+        cmd = (
+            ffmpeg
+            .output(ffmpeg.input(list_filename, f='concat', safe=0)['a'], ffmpeg.input(metadata_filename), output_path, acodec='copy', map_metadata=1, **{'metadata': f'title={self.project.title}', 'metadata:': f'album={self.project.subtitle}', 'metadata:g': f'artist={self.project.author}'}, loglevel='error')
+            .compile(overwrite_output=True)
+        )
+
+        # Remove last map parameter (workaround for ffmpeg-python bug)
+        cmd = self._remove_last_arg(cmd, '-map')
+
+        subprocess.call(cmd)
+
     def _remove_last_arg(self, cmd: list[str], arg: str) -> list[str]:
         """
         Remove the last occurrence of the given argument from the provided list.
@@ -240,7 +625,74 @@ class TTS_Writer(TTS_Abstract_Writer):
                 .run(overwrite_output=True)
             )
 
-    def synthesize_and_write(self, project_filename: str, temp_dir_prefix: str|None = '', concat=True, callback: Optional[Callable[[float, TTS_Item], None]] = None, preprocess = True, optimize = False, max_pause_duration=0) -> None:
+    def _index_filename(self, output_path: str) -> str:
+        # Item index (sample offsets of all synthesized items) saved alongside cached outputs
+        return f'{output_path}.index.json'
+
+    def estimate(self, preprocess=True, optimize=False, max_pause_duration=0, preview: Optional[Preview] = None) -> Project_Estimate:
+        """
+        Dry run: optimize and preprocess the project like synthesize_and_write() without synthesizing anything, and estimate the duration, synthesis time and output size.
+        Estimates are based on the timings recorded by previous runs with the same voice, default values are used until the voice has been used once.
+
+        For the parameters, see synthesize_and_write().
+
+        :return: The estimates per chapter.
+        :rtype: Project_Estimate
+        """
+        # Select the default model, without loading it
+        t = self.tts_processor or self._create_processor()
+        voice = self._voice_key()
+
+        estimate = Project_Estimate(self.project.title, output_format=self.output_format)
+
+        if not self.timings.is_calibrated(voice):
+            estimate.uncalibrated_voices.append(voice)
+
+        # Work on copies, so the project is left unchanged
+        for chapter in (preview or Preview()).apply(self.project.tts_chapters):
+            if not self.project.raw and optimize:
+                chapter.optimize(max_pause_duration)
+            if not self.project.raw and preprocess:
+                chapter.tts_items = t.preprocess_items(chapter.tts_items)
+
+            chapter_estimate = Chapter_Estimate(chapter.title)
+
+            for tts_item in chapter.tts_items:
+                speaker = self.preferred_speakers[tts_item.speaker_idx % len(self.preferred_speakers)] if self.preferred_speakers else f'Speaker {tts_item.speaker_idx}'
+                chapter_estimate.add_item(self.timings, voice, speaker, tts_item.text, tts_item.length)
+
+            estimate.chapters.append(chapter_estimate)
+
+        return estimate
+
+    def patch(self, project_filename: str, cache_dir: str, callback: Optional[Callable[[float, TTS_Item], None]] = None, preprocess=True, optimize=False, max_pause_duration=0) -> None:
+        """
+        Update an output file previously written with the same cache directory after editing items of the project.
+        Only edited items are synthesized, they are spliced into the audio of their chapters and only these chapters are encoded again. The following chapter markers are shifted accordingly, all other chapters are muxed with stream copy.
+        The settings must be the same as for writing the output, otherwise all changed chapters are synthesized completely.
+
+        :param project_filename: The name of the previously written output (without extension).
+        :type project_filename: str
+
+        :param cache_dir: The directory of the encoded chapter cache used for writing the output.
+        :type cache_dir: str
+
+        For the other parameters, see synthesize_and_write().
+
+        :return: None
+
+        :raises ValueError: If there is no item index for the output, i.e. it was not written using a cache directory.
+        """
+        output_filename = os.path.join(self.project_path, sanitize_filename(project_filename))
+        output_extension = f'.{self.output_format}'
+        output_path = output_filename[:255 - len(output_extension)] + output_extension
+
+        if not os.path.exists(self._index_filename(output_path)):
+            raise ValueError(f'No item index found for "{output_path}", write it using a cache directory first')
+
+        self.synthesize_and_write(project_filename, callback=callback, preprocess=preprocess, optimize=optimize, max_pause_duration=max_pause_duration, cache_dir=cache_dir)
+
+    def synthesize_and_write(self, project_filename: str, temp_dir_prefix: str|None = '', concat=True, callback: Optional[Callable[[float, TTS_Item], None]] = None, preprocess = True, optimize = False, max_pause_duration=0, work_dir: Optional[str] = None, cache_dir: Optional[str] = None, preview: Optional[Preview] = None, dry_run=False, chapter_stream: Optional[Iterable[TTS_Chapter]] = None, prefetch_chapters: int = 1) -> None:
         """
         Synthesize and write the output audio files for the given project.
 
@@ -259,15 +711,59 @@ class TTS_Writer(TTS_Abstract_Writer):
         :param max_pause_duration: An optional maximum duration (in milliseconds) of silence to be inserted between adjacent TTS items in the output audio file. 
         :type max_pause_duration: int
 
+        :param work_dir: An optional persistent work directory used instead of a temporary directory. Completed chapters are recorded in a manifest, so running again after a failure resumes where it stopped.
+        :type work_dir: Optional[str]
+
+        :param cache_dir: An optional directory for caching encoded chapters (only used when concatenating). On later runs, only changed chapters are synthesized and encoded, the others are reused and muxed without re-encoding.
+                          An item index is saved alongside the output ("<output>.index.json"), so only edited items of changed chapters are synthesized again (see patch()).
+        :type cache_dir: Optional[str]
+
+        :param preview: Optionally render only a part of the project (see Preview), saved as "<output>.preview" so complete outputs are not replaced. The project itself is left unchanged.
+        :type preview: Optional[Preview]
+
+        :param dry_run: Only log statistics and estimates of the project (see estimate()), nothing is synthesized or written.
+        :type dry_run: bool
+
+        :param chapter_stream: Optionally synthesize the chapters of an iterator (like TTS_Abstract_Reader.iter_chapters()) instead of the project's chapters. Chapters are synthesized while later ones are still being read and preprocessed, and are added to the project when done.
+                               Previews, dry runs and cache directories need all chapters up front, the iterator is consumed first for these.
+        :type chapter_stream: Optional[Iterable[TTS_Chapter]]
+
+        :param prefetch_chapters: Number of chapters read and preprocessed ahead of synthesizing when using a chapter stream.
+        :type prefetch_chapters: int
+
         :return: None
 
         :raises: ValueError if `project_filename` is not a valid file path.
         """
 
-        if not self.project.tts_chapters:
+        if chapter_stream is not None and (dry_run or preview or (cache_dir and concat)):
+            self.project.tts_chapters = list(chapter_stream)
+            chapter_stream = None
+
+        if dry_run:
+            log(LOG_TYPE.INFO, self.estimate(preprocess, optimize, max_pause_duration, preview).report())
+            return
+
+        if self.preload and self.tts_processor:
+            # Load the model while the chapters are prepared and preprocessed
+            self.tts_processor.initialize_async()
+
+        chapters = self.project.tts_chapters
+        max_seconds: float = 0
+
+        if preview:
+            # Limit before preprocessing, so only the previewed part is processed at all
+            chapters = preview.apply(chapters)
+            max_seconds = preview.max_seconds
+            project_filename = f'{project_filename}.preview'
+
+        if not chapters and chapter_stream is None:
             log(LOG_TYPE.ERROR, f'No chapters to synthesize, exiting.')
             return
 
+        # Don't concatenate temp files of previous runs
+        self.temp_files = []
+
         # Make sure the prefix exists
         if temp_dir_prefix:
             if not os.path.exists(temp_dir_prefix):
@@ -276,38 +772,63 @@ class TTS_Writer(TTS_Abstract_Writer):
             # tempfile.TemporaryDirectory needs None, otherwise this will be set to the current working directory 
             temp_dir_prefix = None
 
-        with tempfile.TemporaryDirectory(dir=temp_dir_prefix) as temp_dir:
+        if work_dir:
+            os.makedirs(work_dir, exist_ok=True)
+
+        output_filename = os.path.join(self.project_path, sanitize_filename(project_filename))
+        output_extension = f'.{self.output_format}'
+
+        # Shorten path if needed
+        output_filename = output_filename[:255 - len(output_extension)]
+        output_path = output_filename + output_extension
+        index_filename = self._index_filename(output_path)
+
+        with contextlib.nullcontext(work_dir) if work_dir else tempfile.TemporaryDirectory(dir=temp_dir_prefix) as temp_dir:
             try:
                 log(LOG_TYPE.INFO, f'Synthesizing project "{self.project.title}".')
 
-                if self.model and self.vocoder:
-                    t = TTS_Processor(self.model, self.vocoder, self.preferred_speakers)
-                else:
-                    if self.backend == Backend.COQUI:
-                        match self.project.lang_code:
-                            case 'en':
-                                self.model = 'tts_models/en/vctk/vits'
-                                self.vocoder = ''
-                            case 'de':
-                                self.model = 'tts_models/de/thorsten/tacotron2-DDC'
-                                self.vocoder = 'vocoder_models/de/thorsten/hifigan_v1'
-                            case _:
-                                raise ValueError(f'Language code "{self.project.lang_code}" not supported')
+                # Use the preloaded processor if available
+                t = self.tts_processor or self._create_processor()
 
-                    t = TTS_Processor(self.model, self.vocoder, self.preferred_speakers)
+                try:
+                    if cache_dir and concat:
+                        segments, index = self._synthesize_segments(chapters, temp_dir, t, cache_dir, callback, not self.project.raw and optimize, max_pause_duration, not self.project.raw and preprocess, index_filename, max_seconds)
+                    elif chapter_stream is not None:
+                        segments, index = [], {}
 
-                self._synthesize_chapters(self.project.tts_chapters, temp_dir, t, callback, not self.project.raw and optimize, max_pause_duration, not self.project.raw and preprocess)
+                        # Collect the chapters while they are consumed, for the chapter metadata
+                        chapters = []
+
+                        def collect(stream: Iterable[TTS_Chapter]) -> Iterable[TTS_Chapter]:
+                            for chapter in stream:
+                                chapters.append(chapter)
+                                yield chapter
+
+                        self._synthesize_chapters(collect(chapter_stream), temp_dir, t, callback, not self.project.raw and optimize, max_pause_duration, not self.project.raw and preprocess, prefetch_chapters=max(1, prefetch_chapters))
+                        self.project.tts_chapters = chapters
+
+                        if not chapters:
+                            log(LOG_TYPE.ERROR, f'No chapters to synthesize, exiting.')
+                            return
+                    else:
+                        segments, index = [], {}
+                        self._synthesize_chapters(chapters, temp_dir, t, callback, not self.project.raw and optimize, max_pause_duration, not self.project.raw and preprocess, max_seconds=max_seconds)
+                finally:
+                    # Stop a synthesis worker process (and its model) right away, it is restarted on demand
+                    t.close()
 
             except Exception as e:
                 log(LOG_TYPE.ERROR, f'Synthesizing project "{self.project.title}" failed: {e}.')
+                if work_dir:
+                    log(LOG_TYPE.INFO, f'Completed chapters are kept in "{work_dir}", run again to resume.')
                 sys.exit(1)
 
             else:
-                if len(self.temp_files) > 0:
+                if len(self.temp_files) > 0 or segments:
                     # Prepare chapter metadata
                     metadata_lines = [';FFMETADATA1\n']
 
-                    for chapter in self.project.tts_chapters:
+                    for chapter in chapters:
                         metadata_lines.append(f'[CHAPTER]\nSTART={chapter.start_time}\nEND={chapter.end_time}\ntitle={chapter.title}\n')
 
                     metadata = ''.join(metadata_lines)
@@ -317,23 +838,25 @@ class TTS_Writer(TTS_Abstract_Writer):
                     with open(metadata_filename, 'w', encoding='utf-8') as metadata_file:
                         metadata_file.write(metadata)
 
-                    output_filename = os.path.join(self.project_path, sanitize_filename(project_filename))
-                    output_extension = f'.{self.output_format}'
-
-                    # Shorten path if needed
-                    output_filename = output_filename[:255 - len(output_extension)]
-                    output_path = output_filename + output_extension
-
                     output_files: list[str] = []
 
                     # Create directory if needed
                     os.makedirs(self.project_path, exist_ok=True)
 
-                    comp_expansion = 12.5
-                    comp_raise = 0.0001
+                    comp_expansion = self.speechnorm_expansion
+                    comp_raise = self.speechnorm_raise
 
                     # Concatenate all files, adding metadata and cover image (if set)
-                    if concat:
+                    if segments:
+                        self._mux_segments(segments, metadata_filename, output_path, temp_dir)
+
+                        # Item index for patching the output later
+                        with open(index_filename, 'w', encoding='utf-8') as index_file:
+                            json.dump(index, index_file, default=str)
+
+                        output_files.append(output_path)
+                        log(LOG_TYPE.SUCCESS, f'Synthesizing project {self.project.title} finished, file saved as "{output_path}".')
+                    elif concat:
                         infiles = [ffmpeg.input(file) for _, file in self.temp_files]
 
                         metadata_input = ffmpeg.input(metadata_filename)
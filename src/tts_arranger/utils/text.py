@@ -0,0 +1,57 @@
+import re
+
+# Preferred breaking points, from strongest (end of sentence) to weakest (any whitespace)
+SENTENCE_BREAKS = [r'[\.!\?…]["“”»«\'’)\]]*\s', r'[;:]\s', r'[,\)\]\}]\s|\s[-–—]\s', r'\s']
+
+
+def split_text(text: str, max_chars: int, break_at: list[str] = SENTENCE_BREAKS) -> list[str]:
+    """
+    Split a text into chunks of at most `max_chars` characters. Chunks are broken at the last sentence boundary within the limit, falling back to clause boundaries, whitespace and finally a hard break.
+
+    :param text: The text to split.
+    :type text: str
+
+    :param max_chars: Maximum number of characters per chunk, 0 disables splitting.
+    :type max_chars: int
+
+    :param break_at: Regular expressions of breaking points in order of preference, the text is broken after each match.
+    :type break_at: list[str]
+
+    :return: The stripped, non-empty chunks.
+    :rtype: list[str]
+    """
+    text = text.strip()
+
+    if max_chars <= 0 or len(text) <= max_chars:
+        return [text] if text else []
+
+    patterns = [re.compile(pattern) for pattern in break_at]
+    chunks: list[str] = []
+
+    while len(text) > max_chars:
+        # Include one more character, so a break right at the limit is found
+        window = text[:max_chars + 1]
+        position = 0
+
+        for pattern in patterns:
+            matches = [match.end() for match in pattern.finditer(window) if match.end() > 0]
+
+            if matches:
+                position = matches[-1]
+                break
+
+        if position == 0:
+            # No safe spot for breaking found, do a hard break
+            position = max_chars
+
+        chunk = text[:position].strip()
+
+        if chunk:
+            chunks.append(chunk)
+
+        text = text[position:].strip()
+
+    if text:
+        chunks.append(text)
+
+    return chunks
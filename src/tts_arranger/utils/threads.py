@@ -0,0 +1,127 @@
+import os
+import queue
+import threading
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+# Marks the end of a prefetched iterable (see prefetch())
+_DONE = object()
+
+
+def available_cores() -> int:
+    """
+    Get the number of CPU cores this process may run on.
+
+    :return: Number of usable cores (respects CPU affinity where supported).
+    :rtype: int
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class ThreadBudget():
+    """
+    Defines how many threads the inference backends (onnxruntime for Piper, torch for Coqui) may use. A value of 0 leaves the choice to the backend.
+
+    :param intra_op: Threads used to parallelize single operators.
+    :type intra_op: int
+
+    :param inter_op: Threads used to run independent operators in parallel.
+    :type inter_op: int
+
+    :param workers: Number of processes/writers running in parallel on this machine with the same budget, the thread counts are limited so that all workers together don't exceed the available cores.
+    :type workers: int
+    """
+    intra_op: int = 0
+    inter_op: int = 0
+    workers: int = 1
+
+    @classmethod
+    def for_workers(cls, workers: int = 1) -> 'ThreadBudget':
+        """
+        Create a budget that evenly splits the available cores between the given number of parallel workers.
+
+        :param workers: Number of parallel workers.
+        :type workers: int
+
+        :return: A thread budget for each worker.
+        :rtype: ThreadBudget
+        """
+        workers = max(1, workers)
+        return cls(max(1, available_cores() // workers), 1, workers)
+
+    def limited(self) -> 'ThreadBudget':
+        """
+        Get the budget limited to the cores available to each worker. Backend defaults (0) are replaced by the per worker share if there is more than one worker, as backends would otherwise use all cores each.
+
+        :return: The limited thread budget.
+        :rtype: ThreadBudget
+        """
+        cores_per_worker = max(1, available_cores() // max(1, self.workers))
+
+        intra_op = self.intra_op
+        inter_op = self.inter_op
+
+        if intra_op > cores_per_worker or (intra_op == 0 and self.workers > 1):
+            intra_op = cores_per_worker
+        if inter_op > cores_per_worker or (inter_op == 0 and self.workers > 1):
+            inter_op = 1
+
+        return replace(self, intra_op=intra_op, inter_op=inter_op)
+
+
+def prefetch(iterable: Iterable[T], size: int = 1) -> Iterator[T]:
+    """
+    Iterate over an iterable in a background thread, staying up to `size` items ahead of the consumer. Lets producing items (like parsing and preprocessing chapters) overlap with consuming them.
+
+    :param iterable: The iterable, consumed by the background thread only.
+    :type iterable: Iterable
+
+    :param size: Maximum number of items produced ahead.
+    :type size: int
+
+    :return: Iterator over the items in the same order. Exceptions of the iterable are raised when reaching them.
+    :rtype: Iterator
+    """
+    items: queue.Queue = queue.Queue(maxsize=max(1, size))
+    stop = threading.Event()
+
+    def put(entry: tuple) -> bool:
+        # Wait for space, unless the consumer stopped early
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((_DONE, e))
+        else:
+            put((_DONE, None))
+
+    thread = threading.Thread(target=produce, name='prefetch', daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = items.get()
+
+            if error is not None:
+                raise error
+            if item is _DONE:
+                break
+
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+import unittest
+
+
+class ImportTest(unittest.TestCase):
+    def test_reader_path_is_lightweight(self):
+        # Run in a fresh interpreter, as other tests may already have imported the backends
+        script = '''
+import sys
+from tts_arranger import TTS_EPUB_Reader, TTS_HTML_Reader, save_tts_project_to_json
+print(','.join(m for m in ('TTS', 'piper', 'onnxruntime', 'scipy', 'ffmpeg', 'PIL') if m in sys.modules))
+'''
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+
+        self.assertEqual(output.stdout.strip(), '')
+
+    def test_lazy_attributes(self):
+        import tts_arranger
+        from tts_arranger.tts_processor import TTS_Processor
+
+        self.assertIs(tts_arranger.TTS_Processor, TTS_Processor)
+        self.assertIn('TTS_Writer', dir(tts_arranger))
+
+        with self.assertRaises(AttributeError):
+            tts_arranger.Does_Not_Exist
+
+
+if __name__ == '__main__':
+    unittest.main()
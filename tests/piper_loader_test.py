@@ -0,0 +1,152 @@
+import importlib.util
+import json
+import os
+import shutil
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from tts_arranger.json_processor import JSON_Processor
+from tts_arranger.piper_loader import (load_piper_voice, optimized_model_path,
+                                       quantize_voice, quantized_model_path)
+
+HAS_ONNX = all(importlib.util.find_spec(module) for module in ('onnx', 'onnxruntime', 'piper'))
+
+
+def write_model(model_path: str, weight: float = 1.0) -> None:
+    # Tiny model with a weight matrix, enough for graph optimization and quantization
+    import numpy as np  # type: ignore
+    import onnx  # type: ignore
+    from onnx import TensorProto, helper, numpy_helper  # type: ignore
+
+    weights = numpy_helper.from_array(np.full((4, 4), weight, dtype=np.float32), 'weights')
+    bias = numpy_helper.from_array(np.ones((4,), dtype=np.float32), 'bias')
+
+    graph = helper.make_graph(
+        [helper.make_node('MatMul', ['input', 'weights'], ['product']), helper.make_node('Add', ['product', 'bias'], ['output'])],
+        'voice',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, [1, 4])],
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, [1, 4])],
+        [weights, bias],
+    )
+
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)], ir_version=8), model_path)
+
+    with open(f'{model_path}.json', 'w', encoding='utf-8') as config_file:
+        json.dump({'num_symbols': 1, 'num_speakers': 1, 'audio': {'sample_rate': 22050}, 'espeak': {'voice': 'en-us'}, 'phoneme_id_map': {}}, config_file)
+
+
+@unittest.skipUnless(HAS_ONNX, 'onnx, onnxruntime and piper are needed')
+class PiperLoaderTest(unittest.TestCase):
+    def test_optimized_model_path(self):
+        import onnxruntime  # type: ignore
+
+        with TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, 'voice.onnx')
+            write_model(model_path)
+
+            path = optimized_model_path(model_path, os.path.join(temp_dir, 'cache'))
+
+            self.assertTrue(path.name.startswith('voice-'))
+            self.assertEqual(path, optimized_model_path(model_path, os.path.join(temp_dir, 'cache')))
+
+            # Keyed by execution provider, onnxruntime version and model content
+            self.assertNotEqual(path, optimized_model_path(model_path, os.path.join(temp_dir, 'cache'), use_cuda=True))
+
+            with mock.patch.object(onnxruntime, '__version__', '0.0.0'):
+                self.assertNotEqual(path, optimized_model_path(model_path, os.path.join(temp_dir, 'cache')))
+
+            write_model(model_path, weight=2.0)
+            self.assertNotEqual(path, optimized_model_path(model_path, os.path.join(temp_dir, 'cache')))
+
+    def test_optimized_model_cache(self):
+        import onnxruntime  # type: ignore
+
+        with TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, 'voice.onnx')
+            cache_dir = os.path.join(temp_dir, 'cache')
+            write_model(model_path)
+
+            cache_path = optimized_model_path(model_path, cache_dir)
+
+            with mock.patch.object(onnxruntime, 'InferenceSession', wraps=onnxruntime.InferenceSession) as session:
+                # First load optimizes the original model and saves the result
+                load_piper_voice(model_path, cache_dir=cache_dir)
+
+                self.assertEqual(session.call_args.args[0], model_path)
+                self.assertTrue(cache_path.exists())
+                self.assertEqual(os.listdir(cache_dir), [cache_path.name])
+
+                # Later loads use the optimized model without optimizing again
+                load_piper_voice(model_path, cache_dir=cache_dir)
+
+                self.assertEqual(session.call_args.args[0], str(cache_path))
+                self.assertEqual(session.call_args.kwargs['sess_options'].graph_optimization_level, onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL)
+
+    def test_optimized_model_cache_fallback(self):
+        import onnxruntime  # type: ignore
+
+        with TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, 'voice.onnx')
+            write_model(model_path)
+
+            # A file in the way, the cache directory can't be created
+            blocker = os.path.join(temp_dir, 'blocker')
+            open(blocker, 'w').close()
+
+            with mock.patch.object(onnxruntime, 'InferenceSession', wraps=onnxruntime.InferenceSession) as session:
+                voice = load_piper_voice(model_path, cache_dir=os.path.join(blocker, 'cache'))
+
+                self.assertEqual(session.call_args.args[0], model_path)
+                self.assertEqual(session.call_args.kwargs['sess_options'].optimized_model_filepath, '')
+
+            self.assertEqual(voice.config.sample_rate, 22050)
+
+    def test_quantize_voice(self):
+        with TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, 'en_US-voice-medium.onnx')
+            write_model(model_path)
+
+            # Stored next to the original
+            quantized_path = quantized_model_path(model_path)
+            self.assertEqual(str(quantized_path), os.path.join(temp_dir, 'en_US-voice-medium.int8.onnx'))
+
+            self.assertEqual(quantize_voice(model_path), quantized_path)
+            self.assertTrue(quantized_path.exists())
+            self.assertEqual(sorted(os.listdir(temp_dir)), ['en_US-voice-medium.int8.onnx', 'en_US-voice-medium.onnx', 'en_US-voice-medium.onnx.json'])
+
+            # Existing variants are reused, unless forced
+            with mock.patch('onnxruntime.quantization.quantize_dynamic', side_effect=lambda source, target, **kwargs: shutil.copy(source, target)) as quantize_dynamic:
+                self.assertEqual(quantize_voice(model_path), quantized_path)
+                quantize_dynamic.assert_not_called()
+
+                quantize_voice(model_path, force=True)
+                quantize_dynamic.assert_called_once()
+
+            voice = load_piper_voice(model_path, quantized=True)
+            self.assertEqual(voice.session._model_path, str(quantized_path))
+
+
+class JSON_ProcessorVoiceTest(unittest.TestCase):
+    def test_quantized_speakers(self):
+        processor = JSON_Processor('')
+
+        model_ids = processor.get_model_info({'backend': {'backend_id': 'piper', 'speaker_id_mapping': {
+            'narrator': {'model_id': 'en_US-voice-medium', 'quantized': True},
+            'dialog': {'model_id': 'en_US-voice-medium'},
+            'other': {'model_id': 'en_US-voice-medium', 'quantized': True},
+        }}})
+
+        # Quantized and float variants of a model are loaded as separate voices
+        with mock.patch.object(JSON_Processor, 'load_model', side_effect=lambda backend, model_id, quantized=False: (model_id, quantized)) as load_model:
+            voices = processor.load_models(model_ids)
+
+        self.assertEqual(voices, {'en_US-voice-medium.int8': ('en_US-voice-medium', True), 'en_US-voice-medium': ('en_US-voice-medium', False)})
+        self.assertEqual(load_model.call_count, 2)
+
+        self.assertEqual(processor._timing_key({'speaker_id': 'narrator'}), 'piper:en_US-voice-medium.int8')
+        self.assertEqual(processor._timing_key({'speaker_id': 'dialog'}), 'piper:en_US-voice-medium')
+
+
+if __name__ == '__main__':
+    unittest.main()
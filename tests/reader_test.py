@@ -1,13 +1,20 @@
+import base64
+import contextlib
+import io
 import os
 import tempfile
 import unittest
 import urllib.request
 
 from tts_arranger import TTS_Chapter, TTS_Item, TTS_Project
-from tts_arranger.tts_html_converter import (CHECKER_SIGNAL, Checker,
+from tts_arranger.tts_html_converter import (CHECK_SPEAKER_RESULT,
+                                             CHECKER_SIGNAL, Checker,
+                                             CheckerIndex,
                                              CheckerItemProperties,
                                              ConditionClass, ConditionID,
-                                             ConditionName)
+                                             ConditionName, ConditionSelector,
+                                             Element, TTS_HTML_Converter)
+from tts_arranger.tts_reader.epub_container import EPUB_Container
 from tts_arranger.tts_reader.tts_epub_reader import TTS_EPUB_Reader
 from tts_arranger.tts_reader.tts_html_reader import TTS_HTML_Reader
 
@@ -22,7 +29,8 @@ class TTS_HTML_ReaderTest(unittest.TestCase):
         checkers.append(Checker([ConditionName('i')], CheckerItemProperties(2, 500)))
         checkers.append(Checker([ConditionName('b')], CheckerItemProperties(3, 1000)))
 
-        reader = TTS_HTML_Reader(custom_checkers=checkers)
+        # One item per text node
+        reader = TTS_HTML_Reader(custom_checkers=checkers, coalesce_text=False)
         reader.load_raw(html)
 
         items = reader.project.tts_chapters[0].tts_items
@@ -278,6 +286,346 @@ class TTS_HTML_ReaderTest(unittest.TestCase):
 
         self.assertEqual(items[0].length, 1500)
 
+    def test_skip_ignored(self):
+        html = '<body><p>1</p><div class="nav"><div><i>2</i><br><img src="x"></div><span/>3</div><p>4<sup class="endnote"/></p><p>5</p></body>'
+
+        checkers = []
+
+        checkers.append(Checker([ConditionClass('nav')], None, CHECKER_SIGNAL.IGNORE))
+        checkers.append(Checker([ConditionName('i')], CheckerItemProperties(1, 500)))
+
+        reader = TTS_HTML_Reader(custom_checkers=checkers)
+        reader.load_raw(html)
+        reader.get_project().optimize()
+
+        # Matching elements, void elements and nested elements of the same name within ignored elements are skipped
+        items = [item.text for item in reader.get_project().tts_chapters[0].tts_items if item.text]
+
+        self.assertEqual(items, ['1', '4', '5'])
+
+    def test_checker_index(self):
+        checkers: list[Checker] = []
+
+        checkers.append(Checker([ConditionName('sup'), ConditionClass('endnote')], None, CHECKER_SIGNAL.IGNORE))
+        checkers.append(Checker([ConditionName('p'), ConditionClass('chapter')], CheckerItemProperties(1, 1000), CHECKER_SIGNAL.NEW_CHAPTER))
+        checkers.append(Checker([ConditionID('b')], CheckerItemProperties(2, 800)))
+        checkers.append(Checker([ConditionName('p')], CheckerItemProperties(0, 500)))
+        checkers.append(Checker([], CheckerItemProperties(3, 0)))
+
+        index = CheckerIndex(checkers)
+
+        for name in ['p', 'sup', 'span', 'div']:
+            for elem_id in ['', 'b']:
+                for classes in [[], ['chapter'], ['endnote', 'x'], ['x']]:
+                    elem = Element(name, classes)
+                    elem.id = elem_id
+
+                    # Same result as checking all checkers in order
+                    expected = CheckerIndex.NO_MATCH
+                    for checker in checkers:
+                        if checker.determine(elem)[0] != CHECK_SPEAKER_RESULT.NOT_MATCHED:
+                            expected = checker.determine(elem)
+                            break
+
+                    self.assertEqual(index.lookup(elem), expected)
+                    self.assertEqual(index.lookup(elem), expected)
+
+    def test_single_pass(self):
+        html = '<html><head><title>Doc</title></head><body><p class="h2">Para <i>title</i></p><div><h1><h2>Inner</h2> heading</h1><p>1<div class="nav"><p>2</div>3</div><b>4</i></b><p>5</body></html>'
+
+        checkers = []
+
+        checkers.append(Checker([ConditionClass('nav')], None, CHECKER_SIGNAL.IGNORE))
+
+        converter = TTS_HTML_Converter(custom_checkers=checkers, coalesce_text=False)
+        converter.convert_from_html(html)
+
+        # Unclosed elements are closed by enclosing end tags, stray end tags are ignored
+        items = [item.text.strip() for item in converter.project.tts_chapters[0].tts_items if item.text.strip()]
+
+        self.assertEqual(items, ['Doc', 'Para', 'title', 'Inner', 'heading', '1', '3', '4', '5'])
+        self.assertEqual(converter.get_chapter_title(), 'Inner heading')
+
+        converter.convert_from_html('<title>Doc</title><p class="h1"></p><p class="x">1</p><p class="h3">Title</p>')
+        self.assertEqual(converter.get_chapter_title(), 'Title')
+
+        converter.convert_from_html('<head><title>Doc</title></head>')
+        self.assertEqual(converter.get_chapter_title(), 'Doc')
+
+    def test_selector(self):
+        html = '<div class="chapter"><p>1</p><p lang="en-US" epub:type="footnote x">2 <span>3</span></p><section><p class="note">4</p></section></div><p>5</p>'
+
+        expected = {
+            'div > p:first-child': ['1'],
+            'div p': ['1', '2 3', '4'],
+            'div > p': ['1', '2 3'],
+            '[lang|=en]': ['2 3'],
+            '[epub:type~=footnote]': ['2 3'],
+            'div.chapter span, section > .note': ['3', '4'],
+        }
+
+        for selector, texts in expected.items():
+            checkers = [Checker([ConditionSelector(selector)], CheckerItemProperties(1, 500))]
+
+            project = TTS_HTML_Converter(custom_checkers=checkers, ignore_default_checkers=True).convert_from_html(html)
+            assert isinstance(project, TTS_Project)
+
+            self.assertEqual([item.text.strip() for item in project.tts_chapters[0].tts_items if item.speaker_idx == 1], texts, selector)
+
+        for selector in ['', 'p >', 'p:hover', 'p[lang']:
+            with self.assertRaises(ValueError):
+                ConditionSelector(selector)
+
+        # Selectors are indexed by their matched element, memoizing is only kept for selectors without context
+        checkers = [Checker([ConditionSelector('div > p.x')], CheckerItemProperties(1, 500)), Checker([ConditionSelector('#a, span')], CheckerItemProperties(2, 500))]
+        index = CheckerIndex(checkers)
+
+        self.assertEqual(index.lookup(Element('p', ['x'], parent=Element('div'))), (CHECK_SPEAKER_RESULT.MATCHED, CHECKER_SIGNAL.NO_SIGNAL, CheckerItemProperties(1, 500)))
+        self.assertEqual(index.lookup(Element('p', ['x'], parent=Element('section'))), CheckerIndex.NO_MATCH)
+        self.assertEqual(index.lookup(Element('span')), (CHECK_SPEAKER_RESULT.MATCHED, CHECKER_SIGNAL.NO_SIGNAL, CheckerItemProperties(2, 500)))
+        self.assertFalse(index._memoize)
+        self.assertTrue(CheckerIndex(checkers[1:])._memoize)
+
+    def test_checkers_file_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'checkers.json')
+
+            with open(filename, 'w') as file:
+                file.write('{"check_entries": [{"conditions": [{"name": "Selector", "arg": "div > p"}], "properties": {"speaker_idx": 1}}]}')
+
+            converter1 = TTS_HTML_Converter(custom_checkers_files=[filename], ignore_default_checkers=True)
+            converter2 = TTS_HTML_Converter(custom_checkers_files=[filename], ignore_default_checkers=True)
+
+            # Read and compiled once
+            self.assertIs(converter1.checkers[0], converter2.checkers[0])
+            self.assertIsInstance(converter1.checkers[0].conditions[0], ConditionSelector)
+
+            # Read again when changed
+            with open(filename, 'w') as file:
+                file.write('{"check_entries": [{"conditions": [{"name": "Name", "arg": "p"}], "properties": {"speaker_idx": 2}}]}')
+            os.utime(filename, ns=(0, os.stat(filename).st_mtime_ns + 1))
+
+            converter3 = TTS_HTML_Converter(custom_checkers_files=[filename], ignore_default_checkers=True)
+
+            self.assertEqual(converter3.checkers[0].properties, CheckerItemProperties(2, 0))
+
+    def test_checker_profile(self):
+        html = '<div><p class="chapter">One</p><p>1</p><p>2</p><sup class="endnote">3</sup></div>'
+
+        checkers: list[Checker] = []
+
+        checkers.append(Checker([ConditionName('sup'), ConditionClass('endnote')], None, CHECKER_SIGNAL.IGNORE))
+        checkers.append(Checker([ConditionSelector('p.chapter')], CheckerItemProperties(1, 1000), CHECKER_SIGNAL.NEW_CHAPTER))
+        checkers.append(Checker([ConditionName('p')], CheckerItemProperties(0, 500)))
+        checkers.append(Checker([ConditionName('li')], CheckerItemProperties(1, 500)))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'profile.txt')
+
+            converter = TTS_HTML_Converter(custom_checkers=checkers, ignore_default_checkers=True, profile_file=filename)
+            converter.convert_from_html(html)
+
+            profile = converter.checker_profile
+            assert profile is not None
+
+            self.assertEqual((profile.elements, profile.unmatched), (5, 1))
+            self.assertEqual(profile.stats[0].matches, 1)
+            self.assertEqual(profile.stats[1].samples, ['div > p.chapter'])
+            self.assertEqual(profile.stats[2].matches, 2)
+
+            # The second paragraph is looked up from memoized results
+            self.assertEqual(profile.stats[2].evaluated, 1)
+            self.assertEqual(profile.memoized, 1)
+            self.assertNotIn(3, profile.stats)
+
+            with open(filename, 'r') as file:
+                report = file.read()
+
+            self.assertIn('Selector=p.chapter -> NEW_CHAPTER speaker 1 pause 1000', report)
+            self.assertIn('Never matched: 4', report)
+
+            # Accumulated over documents, without a report per document
+            os.remove(filename)
+            converter.add_from_html(html)
+            self.assertEqual(profile.stats[2].matches, 4)
+            self.assertFalse(os.path.exists(filename))
+
+            # Reported once after reading a file in chunks
+            html_filename = os.path.join(temp_dir, 'profile.html')
+
+            with open(html_filename, 'w') as file:
+                file.write(html * 3)
+
+            TTS_HTML_Reader(custom_checkers=checkers, ignore_default_checkers=True, profile_file=filename).load(html_filename)
+
+            with open(filename, 'r') as file:
+                self.assertEqual(file.read().count('Checker profile:'), 1)
+
+        # Not recorded without profiling
+        converter = TTS_HTML_Converter(custom_checkers=checkers, ignore_default_checkers=True)
+        converter.convert_from_html(html)
+        self.assertIsNone(converter.checker_profile)
+
+    def test_coalesce_text(self):
+        html = '<p class="bla">test1 <span class="x"><i>test2</i> <b>test3</b> test4 <span>test5</span></span></p>\n<p>test6</p> <p><i>test7</i></p>'
+
+        checkers: list[Checker] = []
+
+        checkers.append(Checker([ConditionName('p'), ConditionClass('bla')], CheckerItemProperties(1, 800)))
+        checkers.append(Checker([ConditionName('i')], CheckerItemProperties(2, 500)))
+        checkers.append(Checker([ConditionName('b')], CheckerItemProperties(3, 1000)))
+
+        converter = TTS_HTML_Converter(custom_checkers=checkers, ignore_default_checkers=True)
+        project = converter.convert_from_html(html)
+        assert isinstance(project, TTS_Project)
+
+        # Text of the same speaker is appended to the previous item, whitespace between items of other speakers is dropped
+        items = [(item.text, item.speaker_idx, item.length) for item in project.tts_chapters[0].tts_items]
+
+        self.assertEqual(items, [('test1 ', 1, 0), ('test2', 2, 0), ('', -1, 500), ('test3', 3, 0), ('', -1, 1000), (' test4 test5', 1, 0), ('', -1, 800), ('test6 ', 0, 0), ('test7', 2, 0), ('', -1, 500)])
+
+        # Same result as optimizing the items of each text node
+        uncoalesced = TTS_HTML_Converter(custom_checkers=checkers, ignore_default_checkers=True, coalesce_text=False).convert_from_html(html)
+        assert isinstance(uncoalesced, TTS_Project)
+
+        uncoalesced.optimize()
+        project.optimize()
+
+        self.assertEqual([(item.text, item.speaker_idx, item.length) for item in project.tts_chapters[0].tts_items], [(item.text, item.speaker_idx, item.length) for item in uncoalesced.tts_chapters[0].tts_items])
+
+    def test_convert_chunks(self):
+        html = '<html><head><title>Doc</title></head><body><p>Intro &amp; more</p><p class="chapter">One</p><p>Text <i>in</i> chapter</p><p class="chapter">Two</p><p>End</body></html>'
+
+        converter = TTS_HTML_Converter()
+        project = converter.convert_from_html(html)
+        assert isinstance(project, TTS_Project)
+
+        expected = [[(item.text, item.speaker_idx, item.length) for item in chapter.tts_items] for chapter in project.tts_chapters]
+        converted = []
+
+        # Chunks cut anywhere, even within tags, entities and text
+        for chapter in converter.convert_chunks(html[i:i + 5] for i in range(0, len(html), 5)):
+            converted.append([(item.text, item.speaker_idx, item.length) for item in chapter.tts_items])
+
+            # Completed chapters are handed over right away
+            self.assertLessEqual(len(converter.project.tts_chapters), 1)
+
+        self.assertEqual(converted, expected)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'chunks.html')
+
+            with open(file_path, 'w') as file:
+                file.write(html)
+
+            reader = TTS_HTML_Reader()
+            reader.load(file_path)
+
+            self.assertEqual(reader.get_project().title, 'chunks')
+            self.assertEqual([chapter.title for chapter in reader.get_project().tts_chapters], ['Doc', 'One', 'Two'])
+
+    def test_epub_workers(self):
+        from ebooklib import epub  # type: ignore
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'workers_test.epub')
+
+            book = epub.EpubBook()
+            book.set_identifier('workers_test')
+            book.set_title('Workers')
+            book.add_author('Author')
+            book.add_metadata('DC', 'date', '2020-01-01')
+
+            documents = []
+
+            for i in range(6):
+                document = epub.EpubHtml(title=f'Chapter {i}', file_name=f'chapter_{i}.xhtml')
+                document.content = f'<html><body><h1>Chapter {i}</h1><p>Text {i}</p><p class="chapter">Part {i}</p></body></html>'
+                documents.append(document)
+
+            # Manifest order differs from the reading order
+            for document in reversed(documents):
+                book.add_item(document)
+
+            book.add_item(epub.EpubNcx())
+            book.spine = documents
+            epub.write_epub(file_path, book)
+
+            with EPUB_Container(file_path) as container:
+                self.assertEqual([item.id for item in container.manifest.values()][:6], [document.id for document in reversed(documents)])
+                self.assertEqual([item.id for item in container.documents], [document.id for document in documents])
+
+            results = []
+
+            for workers in [1, 2]:
+                reader = TTS_EPUB_Reader()
+                reader.load(file_path, workers=workers)
+                results.append([(chapter.title, [item.text for item in chapter.tts_items]) for chapter in reader.get_project().tts_chapters])
+
+            # Chapters are merged in spine order
+            self.assertEqual(results[0], results[1])
+            self.assertEqual([title for title, _ in results[1]][:3], ['Chapter 0', 'Chapter 0', 'Chapter 1'])
+
+            # The checker profile is reported once for all documents
+            output = io.StringIO()
+
+            with contextlib.redirect_stdout(output):
+                TTS_EPUB_Reader(profile_checkers=True).load(file_path)
+
+            self.assertEqual(output.getvalue().count('Checker profile:'), 1)
+
+            # Streamed chapters are the same, metadata is set but chapters are not added to the project
+            reader = TTS_EPUB_Reader()
+            stream = reader.iter_chapters(file_path)
+            self.assertEqual(reader.get_project().title, 'Workers')
+
+            streamed = [(chapter.title, [item.text for item in chapter.tts_items]) for chapter in stream]
+
+            self.assertEqual(streamed, results[0])
+            self.assertEqual(reader.get_project().title, 'Workers')
+            self.assertEqual(reader.get_project().tts_chapters, [])
+
+    def test_epub_container(self):
+        from ebooklib import epub  # type: ignore
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'container_test.epub')
+
+            book = epub.EpubBook()
+            book.set_identifier('container_test')
+            book.set_title('Container')
+            book.add_author('Author')
+            book.add_item(epub.EpubImage(uid='image', file_name='images/image.png', media_type='image/png', content=b'image'))
+            book.set_cover('cover.jpg', b'cover')
+
+            document = epub.EpubHtml(title='Chapter', file_name='text/chapter.xhtml')
+            document.content = '<html><body><h1>Chapter</h1><p>Text</p></body></html>'
+            book.add_item(document)
+
+            book.add_item(epub.EpubNcx())
+            book.spine = [document]
+            epub.write_epub(file_path, book)
+
+            with EPUB_Container(file_path) as container:
+                self.assertEqual(container.get_metadata('DC', 'title')[0][0], 'Container')
+                self.assertEqual(container.spine, [document.id])
+                # Documents missing in the spine come last
+                self.assertEqual([item.id for item in container.documents], [document.id, 'cover'])
+                self.assertIn('Text', container.read_document(container.documents[0]))
+
+                # The declared cover image, not the first image
+                cover = container.get_cover()
+                assert cover
+                self.assertEqual(container.read(cover), b'cover')
+
+            # Cover document is excluded, without date the modification date is used
+            reader = TTS_EPUB_Reader()
+            reader.load(file_path)
+
+            self.assertEqual([chapter.title for chapter in reader.get_project().tts_chapters], ['Chapter'])
+            self.assertEqual(reader.get_project().image_bytes, base64.b64encode(b'cover'))
+            self.assertGreater(reader.get_project().date.year, 1)
+
     def test_epub1(self):
         preferred_speakers = ['p273', 'p330']
 
@@ -1,9 +1,34 @@
+import json
+import multiprocessing
 import os
 import unittest
 from tempfile import TemporaryDirectory
+from unittest import mock
 
-from tts_arranger import (TTS_Chapter, TTS_Item, TTS_Processor, TTS_Project,
-                          TTS_Writer)
+from tts_arranger import (Backend, Preview, SynthesisError, TTS_Chapter,
+                          TTS_EPUB_Reader, TTS_Item, TTS_Processor,
+                          TTS_Project, TTS_Simple_Writer, TTS_Synthesis_Worker,
+                          TTS_Writer, WorkerLimits)
+from tts_arranger.estimator import Timing_Store, default_timings_filename
+from tts_arranger.utils.threads import ThreadBudget, available_cores
+
+# Keeps anything written to the user's cache directory (like recorded timings) out of the home directory
+cache_dir = TemporaryDirectory()
+environ = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_dir.name})
+
+
+def setUpModule():
+    environ.start()
+
+
+def tearDownModule():
+    environ.stop()
+    cache_dir.cleanup()
+
+
+def new_project(title: str, chapters: int = 3, fixed: bool = False) -> TTS_Project:
+    # Chapters of a sentence, a pause and a paragraph by a second speaker, with fixed the paragraph of the second chapter is edited
+    return TTS_Project([TTS_Chapter([TTS_Item(f'This is chapter {c + 1}.'), TTS_Item(length=500), TTS_Item('A paragraph' + (' with a fix' if fixed and c == 1 else '') + '.', 1)], f'Chapter {c + 1}') for c in range(chapters)], title)
 
 
 class Test(unittest.TestCase):
@@ -346,6 +371,352 @@ Do you mean pidgin Danish, perhaps? :''')
             # Ensure that the output file has a non-zero size
             self.assertGreater(os.path.getsize(output_file_path), 0)
 
+    def test_fake_backend(self):
+        t = TTS_Processor(backend=Backend.FAKE, backend_options={'seconds_per_char': 0.05})
+        t.initialize()
+
+        sample_rate = t.get_sample_rate()
+
+        short = t.synthesize_tts_item(TTS_Item('This is a test.'))
+        long = t.synthesize_tts_item(TTS_Item('This is a test.' * 4))
+
+        # Deterministic output
+        self.assertTrue((short == t.synthesize_tts_item(TTS_Item('This is a test.'))).all())
+
+        # Duration scales with text length (plus sentence silence)
+        self.assertAlmostEqual(len(long) - len(short), 45 * 0.05 * sample_rate, delta=10)
+
+        # Minimum length is padded
+        self.assertEqual(len(t.synthesize_tts_item(TTS_Item('a', length=2000))), 2 * sample_rate)
+
+    def test_preload(self):
+        with TemporaryDirectory() as temp_dir:
+            writer = TTS_Writer(TTS_Project.from_items([TTS_Item('Test')]), temp_dir, 'mp3', backend=Backend.FAKE)
+
+            # The model is only loaded when synthesizing, never for dry runs
+            writer.synthesize_and_write('preload', dry_run=True)
+
+            assert writer.tts_processor
+            self.assertFalse(writer.tts_processor.initialized)
+            self.assertIsNone(writer.tts_processor._initialize_thread)
+
+            writer.synthesize_and_write('preload')
+            self.assertTrue(writer.tts_processor.initialized)
+
+        # Errors while loading in the background are raised when waiting
+        t = TTS_Processor(backend=Backend.FAKE, backend_options={'unknown_option': 1})
+        t.initialize_async()
+
+        with self.assertRaises(TypeError):
+            t.wait_initialized()
+
+    def test_default_project(self):
+        writer = TTS_Writer(backend=Backend.FAKE, preload=False)
+        writer.project.tts_chapters.append(TTS_Chapter([TTS_Item('Test')]))
+
+        # Every writer gets its own project
+        self.assertEqual(TTS_Writer(backend=Backend.FAKE, preload=False).project.tts_chapters, [])
+
+    def test_warm_up(self):
+        t = TTS_Processor(backend=Backend.FAKE, backend_options={'latency_per_char': 0.0001})
+        t.initialize_async(warm_up=True)
+        t.wait_initialized()
+
+        self.assertGreater(t.warm_up_time, 0)
+
+    def test_thread_budget(self):
+        cores = available_cores()
+
+        budget = ThreadBudget.for_workers(2)
+        self.assertEqual(budget.intra_op, max(1, cores // 2))
+
+        # Never exceed the cores available per worker
+        self.assertEqual(ThreadBudget(cores * 4, 2).limited().intra_op, cores)
+        self.assertEqual(ThreadBudget(cores * 4, 2, workers=cores).limited().intra_op, 1)
+
+        # Backend defaults stay untouched for a single worker, but not when sharing the machine
+        self.assertEqual(ThreadBudget().limited().intra_op, 0)
+        self.assertEqual(ThreadBudget(workers=cores * 2).limited().intra_op, 1)
+
+    def test_max_chars(self):
+        text = 'It was a bright cold day in April, and the clocks were striking thirteen. Winston Smith slipped quickly through the glass doors, though not quickly enough.'
+
+        t = TTS_Processor(backend=Backend.FAKE, max_chars=80)
+        tts_items = [tts_item for tts_item in t.preprocess_items([TTS_Item(text, 0, 2000)]) if tts_item.text]
+
+        self.assertTrue(all(len(tts_item.text) <= 80 for tts_item in tts_items))
+        # Sentence boundaries are preferred over clause boundaries
+        self.assertEqual(tts_items[0].text, 'It was a bright cold day in April, and the clocks were striking thirteen.')
+        self.assertEqual(tts_items[1].text, 'Winston Smith slipped quickly through the glass doors,')
+        # Minimum length only applies to the last part
+        self.assertEqual([tts_item.length for tts_item in tts_items], [0, 0, 2000])
+
+        # Model limits take precedence over backend limits, 0 disables splitting
+        self.assertEqual(TTS_Processor('tts_models/de/thorsten/tacotron2-DDC').max_chars, 200)
+        # Coqui is served by Piper, with its limit
+        self.assertEqual(TTS_Processor(backend=Backend.COQUI).max_chars, TTS_Processor(backend=Backend.PIPER).max_chars)
+        self.assertEqual(len(TTS_Processor(backend=Backend.FAKE, max_chars=0).preprocess_items([TTS_Item(text * 20)])), 2)
+
+    def test_synthesis_worker(self):
+        t = TTS_Processor(backend=Backend.FAKE)
+        t.initialize()
+
+        worker = TTS_Synthesis_Worker(backend=Backend.FAKE, limits=WorkerLimits(max_items=2))
+        worker.initialize_async()
+
+        try:
+            tts_items = [TTS_Item(f'This is test number {i}.', i) for i in range(5)]
+
+            # Restarting between items doesn't change the output
+            for tts_item in tts_items:
+                self.assertTrue((worker.synthesize_tts_item(tts_item) == t.synthesize_tts_item(tts_item)).all())
+
+            self.assertEqual(worker.restarts, 2)
+            self.assertGreater(worker.rss_mb, 0)
+
+            # A dead worker is restarted transparently
+            assert worker._process
+            worker._process.kill()
+            worker._process.join()
+
+            self.assertEqual(len(worker.synthesize_tts_item(tts_items[0])), len(t.synthesize_tts_item(tts_items[0])))
+            self.assertEqual(worker.restarts, 3)
+        finally:
+            worker.close()
+
+    def test_synthesis_worker_closed(self):
+        project = TTS_Project([TTS_Chapter([TTS_Item('This is a test.')], 'Chapter 1')], 'Project title')
+
+        with TemporaryDirectory() as tmpdir:
+            for preload in (True, False):
+                writer = TTS_Writer(project, tmpdir, output_format='mp3', backend=Backend.FAKE, preload=preload, worker_limits=WorkerLimits())
+                writer.synthesize_and_write('project')
+
+                simple_writer = TTS_Simple_Writer([TTS_Item('This is a test.')], backend=Backend.FAKE, preload=preload, worker_limits=WorkerLimits())
+                simple_writer.synthesize_and_write(os.path.join(tmpdir, 'simple.mp3'))
+
+                # No worker process is left running after synthesizing
+                self.assertEqual([process for process in multiprocessing.active_children() if process.name == 'tts_synthesis_worker'], [])
+
+            # A preloaded worker is started again when synthesizing again
+            writer = TTS_Writer(project, tmpdir, output_format='mp3', backend=Backend.FAKE, worker_limits=WorkerLimits())
+            writer.synthesize_and_write('project')
+            writer.synthesize_and_write('project')
+
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'project.mp3')))
+            self.assertEqual([process for process in multiprocessing.active_children() if process.name == 'tts_synthesis_worker'], [])
+
+    def test_synthesis_worker_timeout(self):
+        text = 'one two three four five six seven eight nine ten'
+        # Hangs as a whole, but not in halves, so the timeout is the only thing ending the first attempt
+        backend_options = {'hang_above_chars': 30}
+        worker = TTS_Synthesis_Worker(backend=Backend.FAKE, backend_options=backend_options, limits=WorkerLimits(item_timeout=2, max_retries=1))
+
+        try:
+            audio = worker.synthesize_tts_item(TTS_Item(text, length=10000))
+            self.assertEqual(worker.restarts, 1)
+            self.assertEqual(len(audio), 10 * worker.get_sample_rate())
+        finally:
+            worker.close()
+
+        worker = TTS_Synthesis_Worker(backend=Backend.FAKE, backend_options=backend_options, limits=WorkerLimits(item_timeout=2, max_retries=0))
+
+        try:
+            with self.assertRaises(SynthesisError) as context:
+                worker.synthesize_tts_item(TTS_Item(text))
+            self.assertEqual(context.exception.attempts, 1)
+            self.assertEqual(context.exception.tts_item.text, text)
+        finally:
+            worker.close()
+
+    def test_resume(self):
+        with TemporaryDirectory() as temp_dir:
+            work_dir = os.path.join(temp_dir, 'work')
+            synthesized: list[TTS_Item] = []
+
+            TTS_Writer(new_project('Resume', 2), temp_dir, 'm4b', backend=Backend.FAKE).synthesize_and_write('resume', work_dir=work_dir)
+
+            with open(os.path.join(work_dir, 'manifest.json'), 'r') as manifest_file:
+                self.assertEqual(len(json.load(manifest_file)['chapters']), 2)
+
+            # Only the new chapter is synthesized
+            writer = TTS_Writer(new_project('Resume'), temp_dir, 'm4b', backend=Backend.FAKE)
+            writer.synthesize_and_write('resume', callback=lambda _, tts_item: synthesized.append(tts_item), work_dir=work_dir)
+
+            self.assertTrue(synthesized)
+            self.assertTrue(all('chapter 3' in tts_item.text or not 'chapter' in tts_item.text for tts_item in synthesized))
+            self.assertEqual(len(writer.temp_files), 3)
+            self.assertEqual(writer.project.tts_chapters[1].end_time, writer.project.tts_chapters[2].start_time)
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, 'resume.m4b')))
+
+    def test_chapter_cache(self):
+        with TemporaryDirectory() as temp_dir:
+            cache_dir = os.path.join(temp_dir, 'cache')
+            synthesized: list[TTS_Item] = []
+
+            writer = TTS_Writer(new_project('Cache'), temp_dir, 'm4b', backend=Backend.FAKE)
+            writer.synthesize_and_write('cache', cache_dir=cache_dir)
+            self.assertEqual(writer.reused_chapters, [])
+
+            # Only the changed chapter is synthesized, the others are reused
+            writer = TTS_Writer(new_project('Cache', fixed=True), temp_dir, 'm4b', backend=Backend.FAKE)
+            writer.synthesize_and_write('cache', callback=lambda _, tts_item: synthesized.append(tts_item), cache_dir=cache_dir)
+
+            self.assertEqual(writer.reused_chapters, [0, 2])
+            self.assertIn('A paragraph with a fix.', [tts_item.text for tts_item in synthesized])
+            self.assertNotIn('This is chapter 1.', [tts_item.text for tts_item in synthesized])
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, 'cache.m4b')))
+
+    def test_preview(self):
+        project = TTS_Project([TTS_Chapter([TTS_Item(f'Chapter {c + 1}, sentence number {i + 1}.') for i in range(20)], f'Chapter {c + 1}') for c in range(4)], 'Preview')
+
+        with TemporaryDirectory() as temp_dir:
+            synthesized: list[TTS_Item] = []
+
+            writer = TTS_Writer(project, temp_dir, 'm4b', backend=Backend.FAKE)
+            writer.synthesize_and_write('preview', callback=lambda _, tts_item: synthesized.append(tts_item), preview=Preview((1, 3), max_seconds=3))
+
+            # Only the first seconds of the selected chapters are synthesized
+            self.assertTrue(synthesized)
+            self.assertTrue(all(tts_item.text.startswith(('Chapter 2', 'Chapter 3')) for tts_item in synthesized if tts_item.text))
+            self.assertLess(len(synthesized), 10)
+            self.assertEqual(len(writer.temp_files), 2)
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, 'preview.preview.m4b')))
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'preview.m4b')))
+
+            # The project is left unchanged
+            self.assertEqual([len(chapter.tts_items) for chapter in project.tts_chapters], [20] * 4)
+
+    def test_chapter_stream(self):
+        read: list[int] = []
+
+        def chapters():
+            for c in range(3):
+                read.append(c)
+                yield TTS_Chapter([TTS_Item(f'Chapter {c + 1}, sentence number {i + 1}.') for i in range(3)], f'Chapter {c + 1}')
+
+        with TemporaryDirectory() as temp_dir:
+            project = TTS_Project(title='Stream')
+
+            writer = TTS_Writer(project, temp_dir, 'm4b', backend=Backend.FAKE)
+            stream = chapters()
+            writer.synthesize_and_write('stream', chapter_stream=stream)
+
+            # The stream is consumed while synthesizing, chapters are added to the project
+            self.assertEqual(read, [0, 1, 2])
+            self.assertEqual([chapter.title for chapter in project.tts_chapters], ['Chapter 1', 'Chapter 2', 'Chapter 3'])
+            self.assertEqual(len(writer.temp_files), 3)
+            self.assertGreater(project.tts_chapters[-1].end_time, project.tts_chapters[0].end_time)
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, 'stream.m4b')))
+
+    def test_chapter_stream_reader(self):
+        from ebooklib import epub  # type: ignore
+
+        with TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'stream.epub')
+
+            book = epub.EpubBook()
+            book.set_identifier('stream')
+            book.set_title('Stream')
+            book.add_author('Author')
+
+            documents = []
+
+            for c in range(2):
+                document = epub.EpubHtml(title=f'Chapter {c + 1}', file_name=f'chapter_{c + 1}.xhtml')
+                document.content = f'<html><body><h1>Chapter {c + 1}</h1><p>Text of chapter {c + 1}.</p></body></html>'
+                book.add_item(document)
+                documents.append(document)
+
+            book.add_item(epub.EpubNcx())
+            book.spine = documents
+            epub.write_epub(file_path, book)
+
+            # Metadata is available for the output filename before the stream is consumed
+            reader = TTS_EPUB_Reader()
+            stream = reader.iter_chapters(file_path)
+            project = reader.get_project()
+
+            writer = TTS_Writer(project, temp_dir, 'm4b', backend=Backend.FAKE)
+            writer.synthesize_and_write(project.author + ' - ' + project.title, chapter_stream=stream)
+
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, 'Author - Stream.m4b')))
+            self.assertEqual([chapter.title for chapter in project.tts_chapters], ['Chapter 1', 'Chapter 2'])
+
+    def test_estimate(self):
+        with TemporaryDirectory() as temp_dir:
+            timings = Timing_Store(os.path.join(temp_dir, 'timings.json'))
+
+            writer = TTS_Writer(new_project('Estimate', 2), temp_dir, 'm4b', backend=Backend.FAKE, backend_options={'seconds_per_char': 0.1}, preload=False, timings=timings)
+
+            estimate = writer.estimate()
+
+            self.assertEqual(len(estimate.chapters), 2)
+            self.assertEqual(estimate.chapters[0].items, 2)
+            self.assertGreaterEqual(estimate.chapters[0].pauses, 1)
+            self.assertEqual(list(estimate.chapters[0].speakers), ['Speaker 0', 'Speaker 1'])
+            self.assertEqual(sum(estimate.chapters[0].speakers.values()), estimate.chapters[0].chars)
+            self.assertEqual(estimate.uncalibrated_voices, ['fake:'])
+            self.assertIn('Chapter 2', estimate.report())
+
+            # Nothing is synthesized or written in a dry run
+            writer.synthesize_and_write('estimate', dry_run=True)
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'estimate.m4b')))
+            self.assertIsNone(writer.tts_processor)
+            self.assertEqual(len(writer.project.tts_chapters[0].tts_items), 3)
+
+            writer.synthesize_and_write('estimate')
+            duration = writer.project.tts_chapters[-1].end_time / 1e9
+
+            # Calibrated by the recorded timings of the previous run
+            writer = TTS_Writer(new_project('Estimate', 2), temp_dir, 'm4b', backend=Backend.FAKE, preload=False, timings=Timing_Store(timings.filename))
+            estimate = writer.estimate()
+
+            self.assertEqual(estimate.uncalibrated_voices, [])
+            self.assertAlmostEqual(estimate.duration, duration, delta=duration * 0.1)
+            self.assertLess(estimate.wall_time, estimate.duration)
+
+            # By default, timings are recorded to and read from the user's cache directory
+            with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': os.path.join(temp_dir, 'cache')}):
+                TTS_Writer(new_project('Estimate', 2), temp_dir, 'm4b', backend=Backend.FAKE, preload=False, record_timings=False).synthesize_and_write('estimate')
+                self.assertFalse(os.path.exists(default_timings_filename()))
+                self.assertEqual(TTS_Writer(new_project('Estimate', 2), backend=Backend.FAKE, preload=False).estimate().uncalibrated_voices, ['fake:'])
+
+                TTS_Writer(new_project('Estimate', 2), temp_dir, 'm4b', backend=Backend.FAKE, preload=False).synthesize_and_write('estimate')
+                self.assertTrue(os.path.exists(default_timings_filename()))
+                self.assertEqual(TTS_Writer(new_project('Estimate', 2), backend=Backend.FAKE, preload=False).estimate().uncalibrated_voices, [])
+
+    def test_patch(self):
+        with TemporaryDirectory() as temp_dir:
+            cache_dir = os.path.join(temp_dir, 'cache')
+            synthesized: list[str] = []
+
+            writer = TTS_Writer(new_project('Patch'), temp_dir, 'm4b', backend=Backend.FAKE)
+
+            with self.assertRaises(ValueError):
+                writer.patch('patch', cache_dir)
+
+            writer.synthesize_and_write('patch', cache_dir=cache_dir)
+            end_times = [chapter.end_time for chapter in writer.project.tts_chapters]
+
+            with open(os.path.join(temp_dir, 'patch.m4b.index.json'), 'r') as index_file:
+                index = json.load(index_file)
+            self.assertEqual(index['chapters'][0]['items'][0]['text'], 'This is chapter 1.')
+            self.assertEqual(index['chapters'][0]['items'][0]['start'], 1)
+
+            # Only the edited item is synthesized, following chapters are shifted
+            writer = TTS_Writer(new_project('Patch', fixed=True), temp_dir, 'm4b', backend=Backend.FAKE)
+            assert writer.tts_processor
+            synthesize_tts_item = writer.tts_processor.synthesize_tts_item
+            writer.tts_processor.synthesize_tts_item = lambda tts_item: synthesized.append(tts_item.text) or synthesize_tts_item(tts_item)  # type: ignore
+            writer.patch('patch', cache_dir)
+
+            self.assertEqual(synthesized, ['A paragraph with a fix.'])
+            self.assertEqual(writer.reused_chapters, [0, 2])
+            self.assertEqual(writer.project.tts_chapters[0].end_time, end_times[0])
+            self.assertGreater(writer.project.tts_chapters[1].end_time, end_times[1])
+            self.assertEqual(writer.project.tts_chapters[2].end_time - writer.project.tts_chapters[2].start_time, end_times[2] - end_times[1])
+
     def test_merge_items1(self):
         items = []
         items.append(TTS_Item('1 '))